@@ -0,0 +1,89 @@
+"""
+Benchmark de l'export Excel : pd.ExcelWriter (openpyxl, mode normal) vs
+query_executor.write_excel (openpyxl write-only, alimenté par lots).
+
+Chaque mesure tourne dans un processus séparé ; on relève le temps total et le
+pic de mémoire (RSS) du processus, données source comprises.
+
+Usage (depuis sql_query_app) :
+    python benchmarks/bench_excel_export.py --rows 200000
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAYS = ["France", "Maroc", "Belgique", "Suisse", "Canada"]
+
+
+def make_chunks(rows, chunk_rows):
+    """Lots synthétiques (mêmes types qu'un résultat SQL Server compacté)."""
+    import pandas as pd
+    base = datetime(2024, 1, 1)
+    for start in range(0, rows, chunk_rows):
+        ids = range(start, min(start + chunk_rows, rows))
+        yield pd.DataFrame({
+            "id": list(ids),
+            "client": [f"client_{i % 50000}" for i in ids],
+            "pays": [PAYS[i % len(PAYS)] for i in ids],
+            "montant": [Decimal(i % 10000) / 100 for i in ids],
+            "prix": [(i % 997) * 1.5 for i in ids],
+            "date_commande": [base + timedelta(minutes=i) for i in ids],
+        })
+
+
+def legacy_export_excel(chunks):
+    """Implémentation précédente : classeur complet en mémoire."""
+    import pandas as pd
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        startrow = 0
+        for i, chunk in enumerate(chunks):
+            chunk.to_excel(writer, index=False, header=(i == 0), startrow=startrow, sheet_name="Résultats")
+            startrow += len(chunk) + (1 if i == 0 else 0)
+    return output.getvalue()
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run(name, rows, chunk_rows, queue):
+    start = time.perf_counter()
+    if name == "ExcelWriter":
+        data = legacy_export_excel(make_chunks(rows, chunk_rows))
+    else:
+        from utils import query_executor
+        output = io.BytesIO()
+        query_executor.write_excel(make_chunks(rows, chunk_rows), output)
+        data = output.getvalue()
+    queue.put((name, time.perf_counter() - start, peak_rss_mb(), len(data) / 1024 / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} lignes, lots de {args.chunk_rows}")
+    print(f"{'export':<14}{'temps (s)':>12}{'pic RSS (Mo)':>16}{'fichier (Mo)':>16}")
+    queue = multiprocessing.Queue()
+    for name in ("ExcelWriter", "write-only"):
+        process = multiprocessing.Process(target=run, args=(name, args.rows, args.chunk_rows, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        print(f"{result[0]:<14}{result[1]:>12.2f}{result[2]:>16.1f}{result[3]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark des constructeurs de résultats (pandas from_records vs Arrow).
+
+Simule un curseur pyodbc renvoyant N lignes synthétiques par lots fetchmany et
+mesure, pour chaque constructeur, le temps total et le pic de mémoire (RSS) du
+processus. Chaque mesure tourne dans un processus séparé pour que les pics ne
+se mélangent pas.
+
+Usage (depuis sql_query_app) :
+    python benchmarks/bench_result_builder.py --rows 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COLUMNS = ["id", "client", "pays", "montant", "prix", "date_commande", "actif"]
+TYPE_CODES = [int, str, str, Decimal, float, datetime, bool]
+PAYS = ["France", "Maroc", "Belgique", "Suisse", "Canada"]
+
+
+class FakeCursor:
+    """Curseur minimal : description + fetchmany sur des tuples générés à la volée."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.position = 0
+        self.description = [(name, type_code) for name, type_code in zip(COLUMNS, TYPE_CODES)]
+        self.arraysize = 1
+
+    def fetchmany(self, size):
+        start = self.position
+        end = min(start + size, self.rows)
+        self.position = end
+        base = datetime(2024, 1, 1)
+        return [
+            (i, f"client_{i % 50000}", PAYS[i % len(PAYS)], Decimal(i % 10000) / 100,
+             (i % 997) * 1.5, base + timedelta(minutes=i), i % 3 == 0)
+            for i in range(start, end)
+        ]
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def run(builder, rows, arraysize, queue):
+    import pandas as pd
+    from utils import result_builder
+
+    cursor = FakeCursor(rows)
+    start = time.perf_counter()
+    chunks = []
+    while True:
+        batch = cursor.fetchmany(arraysize)
+        if not batch:
+            break
+        chunks.append(result_builder.build_chunk(batch, COLUMNS, TYPE_CODES, builder=builder))
+        del batch
+    df = pd.concat(chunks, ignore_index=True)
+    del chunks
+    elapsed = time.perf_counter() - start
+    memory = df.memory_usage(deep=True).sum() / 1024 / 1024
+    queue.put((builder, elapsed, peak_rss_mb(), memory))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--arraysize", type=int, default=5000)
+    args = parser.parse_args()
+
+    print(f"{args.rows} lignes, lots de {args.arraysize}")
+    print(f"{'constructeur':<14}{'temps (s)':>12}{'pic RSS (Mo)':>16}{'DataFrame (Mo)':>18}")
+    queue = multiprocessing.Queue()
+    for builder in ("pandas", "arrow"):
+        process = multiprocessing.Process(target=run, args=(builder, args.rows, args.arraysize, queue))
+        process.start()
+        name, elapsed, rss, memory = queue.get()
+        process.join()
+        print(f"{name:<14}{elapsed:>12.2f}{rss:>16.1f}{memory:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,10 @@ load_dotenv()
 
 load_session()
 
+# Worker des extractions planifiées (démarré une seule fois par processus)
+from utils import scheduler
+scheduler.ensure_started()
+
 st.set_page_config(initial_sidebar_state="expanded", page_title="Accueil")
 
 require_login()
@@ -1,25 +1,19 @@
 import streamlit as st
-import sqlite3
 import bcrypt
 import os
 import pickle
 import time
 import datetime
+from modules.metadata_store import get_connection
 
 SESSION_FILE = "session_state.pkl"
 TIMEOUT_MINUTES = 10  # Durée d'inactivité avant déconnexion automatique
 SESSION_EXPIRED_FLAG = "session_expired_flag.pkl"
 
-def get_db_conn():
-    DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'app.db')
-    return sqlite3.connect(DB_PATH)
-
 def authenticate(username, password):
-    conn = get_db_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT id, username, password, role, is_active FROM users WHERE username = ?", (username,))
     user = cur.fetchone()
-    conn.close()
 
     if user:
         user_id, username_db, password_hash, role, is_active = user
@@ -0,0 +1,89 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from modules.metadata_store import get_connection
+
+# ==========================
+# CACHE DES CATALOGUES
+# ==========================
+# Connexions, requêtes et utilisateurs sont relus à chaque rerun Streamlit alors
+# qu'ils ne changent que sur action d'un administrateur. Les lectures passent par
+# ce cache ; la table catalog_versions (incrémentée par trigger à chaque écriture,
+# cf. migrations.CATALOG_TABLES) indique si une entrée est encore à jour. La
+# vérification coûte une lecture par clé primaire au lieu d'un parcours de table,
+# et reste juste entre sessions comme entre processus.
+CATALOGS = ("connections", "queries", "users")
+
+
+class CatalogCache:
+    """
+    Cache en lecture seule de résultats de fonctions de lecture, par catalogue.
+
+    Une entrée est servie tant que la version du catalogue n'a pas changé ; au
+    premier changement constaté, toutes les entrées du catalogue sont oubliées.
+    Les valeurs sont partagées : l'appelant doit les copier avant de les modifier.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}                  # catalogue -> version des entrées
+        self._entries: Dict[str, Dict[Hashable, Any]] = {}   # catalogue -> clé -> valeur
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, catalog: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        # Version lue AVANT le chargement : une écriture concurrente laisse au pire
+        # une valeur récente sous une version ancienne, rechargée au prochain appel.
+        version = current_version(catalog)
+        with self._lock:
+            known = self._versions.get(catalog)
+            if known is None or version > known:
+                if known is not None:
+                    self._stats["invalidations"] += 1
+                self._versions[catalog] = version
+                self._entries[catalog] = {}
+            entries = self._entries[catalog]
+            if version == self._versions[catalog] and key in entries:
+                self._stats["hits"] += 1
+                return entries[key]
+            self._stats["misses"] += 1
+        value = loader()
+        with self._lock:
+            if self._versions.get(catalog) == version:
+                self._entries[catalog][key] = value
+        return value
+
+    def known_version(self, catalog: str) -> int:
+        """Dernière version constatée du catalogue, sans lecture SQLite (0 si jamais lue)."""
+        with self._lock:
+            return self._versions.get(catalog, 0)
+
+    def clear(self):
+        with self._lock:
+            self._versions.clear()
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+            stats["entries"] = sum(len(e) for e in self._entries.values())
+            return stats
+
+
+def current_version(catalog: str) -> int:
+    """Compteur de modifications du catalogue (0 si jamais modifié)."""
+    row = get_connection().execute("SELECT version FROM catalog_versions WHERE name = ?", (catalog,)).fetchone()
+    return row[0] if row else 0
+
+
+# Cache unique partagé par toutes les sessions Streamlit du processus
+_cache = CatalogCache()
+
+
+def get_cache() -> CatalogCache:
+    return _cache
+
+
+def cached(catalog: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+    return _cache.get(catalog, key, loader)
@@ -0,0 +1,282 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import pyodbc
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================
+# CONFIGURATION DU POOL
+# ==========================
+POOL_MAX_SIZE = int(os.getenv("POOL_MAX_SIZE", "5"))              # Connexions max par base
+POOL_IDLE_TIMEOUT = int(os.getenv("POOL_IDLE_TIMEOUT", "300"))    # Secondes avant éviction d'une connexion inactive
+POOL_PING_AFTER = int(os.getenv("POOL_PING_AFTER", "30"))         # Inactivité (s) au-delà de laquelle on vérifie la connexion
+POOL_WAIT_TIMEOUT = int(os.getenv("POOL_WAIT_TIMEOUT", "30"))     # Attente max (s) d'une connexion libre
+POOL_SWEEP_INTERVAL = int(os.getenv("POOL_SWEEP_INTERVAL", "60"))  # Passage (s) de fermeture des connexions inactives ; 0 = désactivé
+LOGIN_TIMEOUT = int(os.getenv("DB_LOGIN_TIMEOUT", "15"))          # Timeout de connexion pyodbc
+
+
+class PoolTimeoutError(Exception):
+    """Aucune connexion libre n'a pu être obtenue dans le délai imparti."""
+
+
+class _PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Pool de connexions pyodbc indexé par l'ID de la table db_connections.
+
+    Chaque base cible dispose au plus de `max_size` connexions ouvertes.
+    Les connexions inactives depuis plus de `idle_timeout` secondes sont fermées,
+    à l'emprunt comme par un thread de nettoyage (toutes les `sweep_interval`
+    secondes, y compris pour les bases qui ne sont plus interrogées), et une
+    connexion restée inactive est vérifiée (SELECT 1) avant d'être prêtée.
+    Les fermetures (réseau) ont toujours lieu hors du verrou du pool.
+    """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 ping_after=POOL_PING_AFTER, wait_timeout=POOL_WAIT_TIMEOUT,
+                 sweep_interval=POOL_SWEEP_INTERVAL):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.wait_timeout = wait_timeout
+        self.sweep_interval = sweep_interval
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._lock = threading.Condition()
+        self._idle = {}        # conn_id -> [ _PooledConnection ]
+        self._in_use = {}      # conn_id -> nombre de connexions prêtées
+        self._conn_str = {}    # conn_id -> chaîne de connexion utilisée par le pool
+        self._generation = {}  # conn_id -> génération (incrémentée à chaque invalidation)
+        self._borrowed = {}    # id(connexion) -> génération au moment de l'emprunt
+        self._stats = {"hits": 0, "misses": 0, "waits": 0, "wait_time": 0.0,
+                       "evicted": 0, "discarded": 0, "timeouts": 0}
+
+    # --------------------------
+    # Emprunt / restitution
+    # --------------------------
+    def acquire(self, conn_id, conn_str):
+        """Emprunte une connexion pour la base `conn_id` (ouvre si nécessaire)."""
+        self._start_sweeper()
+        deadline = time.monotonic() + self.wait_timeout
+        to_close = []
+        try:
+            with self._lock:
+                pooled, generation = self._reserve(conn_id, conn_str, deadline, to_close)
+        finally:
+            self._close_all(to_close)
+
+        # Vérification / ouverture hors verrou (opérations réseau)
+        try:
+            if pooled is not None and self._is_alive(pooled):
+                self._count("hits")
+                connection = pooled.connection
+            else:
+                if pooled is not None:
+                    self._safe_close(pooled.connection)
+                    self._count("discarded")
+                self._count("misses")
+                connection = pyodbc.connect(conn_str, timeout=LOGIN_TIMEOUT)
+        except Exception:
+            self._release_slot(conn_id)
+            raise
+
+        with self._lock:
+            self._borrowed[id(connection)] = generation
+        return connection
+
+    def _reserve(self, conn_id, conn_str, deadline, to_close):
+        """
+        Réserve une place (verrou tenu) : (connexion inactive ou None, génération).
+        Les connexions à fermer sont ajoutées à `to_close`.
+        """
+        waited = 0.0
+        # La chaîne a changé (connexion modifiée) : on repart d'un pool vide
+        if self._conn_str.get(conn_id) not in (None, conn_str):
+            to_close.extend(self._take_idle(conn_id))
+            self._generation[conn_id] = self._generation.get(conn_id, 0) + 1
+        self._conn_str[conn_id] = conn_str
+
+        while True:
+            to_close.extend(self._take_expired(conn_id))
+            idle = self._idle.setdefault(conn_id, [])
+            if idle:
+                pooled = idle.pop()
+                self._in_use[conn_id] = self._in_use.get(conn_id, 0) + 1
+                break
+            if self._in_use.get(conn_id, 0) < self.max_size:
+                pooled = None
+                self._in_use[conn_id] = self._in_use.get(conn_id, 0) + 1
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stats["timeouts"] += 1
+                raise PoolTimeoutError(
+                    f"Aucune connexion disponible pour la base {conn_id} après {self.wait_timeout}s"
+                )
+            start = time.monotonic()
+            self._lock.wait(remaining)
+            waited += time.monotonic() - start
+
+        if waited:
+            self._stats["waits"] += 1
+            self._stats["wait_time"] += waited
+        return pooled, self._generation.get(conn_id, 0)
+
+    def release(self, conn_id, connection, discard=False):
+        """Rend une connexion au pool (ou la ferme si elle est inutilisable)."""
+        if not discard:
+            try:
+                connection.rollback()  # Ne jamais rendre une transaction ouverte
+            except pyodbc.Error:
+                discard = True
+
+        with self._lock:
+            self._in_use[conn_id] = max(self._in_use.get(conn_id, 1) - 1, 0)
+            generation = self._borrowed.pop(id(connection), None)
+            stale = generation != self._generation.get(conn_id, 0)
+            if discard or stale:
+                self._stats["discarded"] += 1
+                self._lock.notify()
+            else:
+                self._idle.setdefault(conn_id, []).append(_PooledConnection(connection))
+                self._lock.notify()
+                return
+        self._safe_close(connection)
+
+    @contextmanager
+    def connection(self, conn_id, conn_str):
+        """Context manager : emprunte une connexion et la restitue à la sortie."""
+        connection = self.acquire(conn_id, conn_str)
+        discard = False
+        try:
+            yield connection
+        except BaseException:
+            discard = True  # État inconnu après une erreur : on ne la recycle pas
+            raise
+        finally:
+            self.release(conn_id, connection, discard=discard)
+
+    # --------------------------
+    # Maintenance
+    # --------------------------
+    def invalidate(self, conn_id):
+        """Ferme les connexions inactives d'une base (après modification/suppression)."""
+        with self._lock:
+            to_close = self._take_idle(conn_id)
+            self._conn_str.pop(conn_id, None)
+            self._generation[conn_id] = self._generation.get(conn_id, 0) + 1
+        self._close_all(to_close)
+
+    def close_all(self):
+        to_close = []
+        with self._lock:
+            for conn_id in list(self._idle):
+                to_close.extend(self._take_idle(conn_id))
+                self._generation[conn_id] = self._generation.get(conn_id, 0) + 1
+            self._conn_str.clear()
+        self._close_all(to_close)
+
+    def sweep(self) -> int:
+        """Ferme les connexions inactives depuis plus de `idle_timeout` s, toutes bases confondues."""
+        with self._lock:
+            to_close = [pooled for conn_id in list(self._idle) for pooled in self._take_expired(conn_id)]
+        self._close_all(to_close)
+        return len(to_close)
+
+    def stop(self):
+        """Arrête le thread de nettoyage (fin du processus, tests)."""
+        self._stop.set()
+
+    def get_stats(self):
+        """Compteurs du pool pour le dimensionnement (hits, misses, attente...)."""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+            stats["avg_wait"] = stats["wait_time"] / stats["waits"] if stats["waits"] else 0.0
+            stats["idle"] = {k: len(v) for k, v in self._idle.items() if v}
+            stats["in_use"] = {k: v for k, v in self._in_use.items() if v}
+            return stats
+
+    # --------------------------
+    # Outils internes
+    # --------------------------
+    def _is_alive(self, pooled):
+        if time.monotonic() - pooled.last_used < self.ping_after:
+            return True
+        try:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _start_sweeper(self):
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None and not self._stop.is_set():
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="pool-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            self.sweep()
+
+    def _take_expired(self, conn_id):
+        """Retire (verrou tenu) les connexions inactives expirées d'une base ; à fermer hors verrou."""
+        idle = self._idle.get(conn_id)
+        if not idle:
+            return []
+        now = time.monotonic()
+        expired = [pooled for pooled in idle if now - pooled.last_used > self.idle_timeout]
+        if expired:
+            self._idle[conn_id] = [pooled for pooled in idle if now - pooled.last_used <= self.idle_timeout]
+            self._stats["evicted"] += len(expired)
+        return expired
+
+    def _take_idle(self, conn_id):
+        """Retire (verrou tenu) toutes les connexions inactives d'une base ; à fermer hors verrou."""
+        idle = self._idle.pop(conn_id, [])
+        self._stats["evicted"] += len(idle)
+        return idle
+
+    def _close_all(self, pooled_connections):
+        for pooled in pooled_connections:
+            self._safe_close(pooled.connection)
+
+    def _release_slot(self, conn_id):
+        with self._lock:
+            self._in_use[conn_id] = max(self._in_use.get(conn_id, 1) - 1, 0)
+            self._lock.notify()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _safe_close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+# Pool unique partagé par toutes les sessions Streamlit du processus
+_pool = ConnectionPool()
+
+
+def get_pool() -> ConnectionPool:
+    return _pool
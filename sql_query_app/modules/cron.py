@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from typing import List, Set
+
+# ==========================
+# EXPRESSIONS CRON (5 champs)
+# ==========================
+# minute heure jour-du-mois mois jour-de-la-semaine ; "*", listes "1,15", plages "1-5",
+# pas "*/15" ou "8-18/2". Jour de la semaine : 0 ou 7 = dimanche.
+_FIELDS = [
+    ("minute", 0, 59),
+    ("heure", 0, 23),
+    ("jour du mois", 1, 31),
+    ("mois", 1, 12),
+    ("jour de la semaine", 0, 7),
+]
+_MAX_LOOKAHEAD_DAYS = 366 * 5  # Au-delà, l'expression est considérée comme impossible (30 février...)
+
+
+class CronExpression:
+    """Expression cron analysée : ensembles de valeurs autorisées pour chaque champ."""
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError("Une expression cron comporte 5 champs : minute heure jour mois jour-semaine")
+        self.expression = " ".join(parts)
+        values = [_parse_field(part, name, low, high) for part, (name, low, high) in zip(parts, _FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {d % 7 for d in weekdays}  # 7 = 0 = dimanche
+        # Règle cron : si jour du mois ET jour de semaine sont restreints, l'un OU l'autre suffit.
+        # Restreint = ne couvre pas toute la plage ("*/1", "1-31" ou "0-6" équivalent à "*")
+        self._any_day = self.days == set(range(1, 32))
+        self._any_weekday = self.weekdays == set(range(7))
+
+    def matches_day(self, day: datetime) -> bool:
+        weekday = (day.weekday() + 1) % 7  # cron : 0 = dimanche
+        if self._any_day or self._any_weekday:
+            return day.day in self.days and weekday in self.weekdays
+        return day.day in self.days or weekday in self.weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Première échéance strictement postérieure à `moment` (à la minute près)."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=_MAX_LOOKAHEAD_DAYS)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # Premier jour du mois suivant
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self.matches_day(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"L'expression cron '{self.expression}' ne se déclenche jamais")
+
+
+def _parse_field(text: str, name: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = _to_int(step_text, name)
+            if step <= 0:
+                raise ValueError(f"Pas invalide pour le champ {name} : {step_text}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = _to_int(start_text, name), _to_int(end_text, name)
+        else:
+            start = end = _to_int(part, name)
+            if step != 1:
+                end = high  # "5/15" : à partir de 5, tous les 15
+        if start < low or end > high or start > end:
+            raise ValueError(f"Valeur hors limites pour le champ {name} ({low}-{high}) : {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _to_int(text: str, name: str) -> int:
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"Valeur invalide pour le champ {name} : '{text}'")
+
+
+def validate(expression: str) -> bool:
+    try:
+        CronExpression(expression)
+        return True
+    except ValueError:
+        return False
+
+
+def next_runs(expression: str, after: datetime, count: int = 1) -> List[datetime]:
+    """Les `count` prochaines échéances après `after`."""
+    cron = CronExpression(expression)
+    runs = []
+    for _ in range(count):
+        after = cron.next_after(after)
+        runs.append(after)
+    return runs
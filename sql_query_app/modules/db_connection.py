@@ -1,22 +1,19 @@
 import pyodbc
-import sqlite3
 import os
 import re
+import threading
+import time
 import streamlit as st
+from contextlib import contextmanager
 from cryptography.fernet import Fernet, InvalidToken
 from dotenv import load_dotenv
-from pathlib import Path
+from modules import catalog_cache, connection_pool, result_cache
+from modules.metadata_store import DB_PATH, get_connection, reading, transaction
 
 # --- CHARGEMENT DES VARIABLES D'ENVIRONNEMENT ---
 load_dotenv()  # Charger les variables du fichier .env
 
 # --- CONFIGURATION ---
-# Chemin absolu vers le dossier db (sql_query_app/db)
-BASE_DIR = Path(__file__).resolve().parent.parent
-DB_DIR = BASE_DIR / "db"
-DB_DIR.mkdir(parents=True, exist_ok=True)  # Crée le dossier si nécessaire
-DB_PATH = str(DB_DIR / "app.db")
-
 FERNET_KEY = os.getenv("FERNET_KEY")  # Clé dans .env
 
 if not FERNET_KEY:
@@ -24,6 +21,8 @@ if not FERNET_KEY:
 
 fernet = Fernet(FERNET_KEY.encode())
 
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", "60"))  # Durée de vie (s) des identifiants déchiffrés ; 0 = désactivé
+
 # --- VALIDATIONS ---
 def validate_connection_name(name):
     if not (3 <= len(name) <= 50):
@@ -63,42 +62,110 @@ def encrypt_password(password: str) -> str:
 def decrypt_password(encrypted_password: str) -> str:
     return fernet.decrypt(encrypted_password.encode()).decode()
 
-# --- CRUD DB_CONNECTIONS ---
-def get_connection_info(conn_id: int):
-    """Récupère les infos de connexion avec mot de passe déchiffré et port en int"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# --- CACHE DES IDENTIFIANTS DÉCHIFFRÉS ---
+# Chaque exécution relisait la ligne db_connections, déchiffrait le mot de passe et
+# reconstruisait la chaîne ODBC. Le résultat est gardé en mémoire (jamais écrit sur
+# disque) pendant CREDENTIAL_CACHE_TTL secondes, effacé aussitôt par update_connection /
+# delete_connection, et ignoré dès que catalog_cache a constaté une modification du
+# catalogue des connexions plus récente que l'entrée (écriture d'un autre processus).
+class _CredentialEntry:
+    def __init__(self, conn_info, conn_str, version, expires_at):
+        self.conn_info = conn_info
+        self.conn_str = conn_str
+        self.version = version
+        self.expires_at = expires_at
+
+
+_credentials = {}  # conn_id -> _CredentialEntry
+_credentials_lock = threading.Lock()
+
+
+def _read_connection(conn_id: int):
+    """Ligne db_connections, port en int et mot de passe encore chiffré ; None si introuvable."""
+    cursor = get_connection().cursor()
     cursor.execute("""
         SELECT id, name, type, host, port, db_service, user, password 
         FROM db_connections WHERE id = ?
     """, (conn_id,))
     row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        try:
-            password = decrypt_password(row[7])
-        except InvalidToken:
-            password = ""
-            st.error("❌ Erreur de déchiffrement - Clé Fernet invalide ou données corrompues")
-        
-        # Conversion du port en int avec fallback sur 1433
-        try:
-            port_value = int(row[4]) if row[4] is not None else 1433
-        except (ValueError, TypeError):
-            port_value = 1433
-        
-        return {
-            "id": row[0],
-            "name": row[1],
-            "type": row[2],
-            "host": row[3],
-            "port": port_value,
-            "db_service": row[5],
-            "user": row[6],
-            "password": password
-        }
-    return None
+    if not row:
+        return None
+
+    # Conversion du port en int avec fallback sur 1433
+    try:
+        port_value = int(row[4]) if row[4] is not None else 1433
+    except (ValueError, TypeError):
+        port_value = 1433
+
+    return {
+        "id": row[0],
+        "name": row[1],
+        "type": row[2],
+        "host": row[3],
+        "port": port_value,
+        "db_service": row[5],
+        "user": row[6],
+        "password": row[7]
+    }
+
+
+def get_credentials(conn_id: int):
+    """
+    Infos de connexion avec mot de passe déchiffré (copie), servies par le cache ;
+    None si la connexion n'existe pas. Lève InvalidToken si le déchiffrement échoue.
+    """
+    now = time.monotonic()
+    with _credentials_lock:
+        entry = _credentials.get(conn_id)
+        if entry is not None:
+            if entry.expires_at > now and entry.version >= catalog_cache.get_cache().known_version("connections"):
+                return dict(entry.conn_info)
+            del _credentials[conn_id]
+
+    version = catalog_cache.current_version("connections")  # Lue avant la ligne (cf. CatalogCache.get)
+    conn_info = _read_connection(conn_id)
+    if conn_info is None:
+        return None
+    conn_info["password"] = decrypt_password(conn_info["password"])
+    if CREDENTIAL_CACHE_TTL <= 0:
+        return conn_info
+    try:
+        conn_str = build_connection_string(conn_info)
+    except ValueError:
+        conn_str = None  # Type non supporté : l'erreur sera levée à la connexion
+    with _credentials_lock:
+        _credentials[conn_id] = _CredentialEntry(dict(conn_info), conn_str, version, now + CREDENTIAL_CACHE_TTL)
+    return conn_info
+
+
+def _connection_string(conn_info):
+    """Chaîne ODBC mise en cache si `conn_info` correspond toujours à l'entrée de son ID."""
+    with _credentials_lock:
+        entry = _credentials.get(conn_info.get("id"))
+        if entry is not None and entry.conn_str is not None and entry.conn_info == conn_info:
+            return entry.conn_str
+    return build_connection_string(conn_info)
+
+
+def forget_credentials(conn_id: int = None):
+    """Efface les identifiants en cache d'une connexion (toutes si `conn_id` vaut None)."""
+    with _credentials_lock:
+        if conn_id is None:
+            _credentials.clear()
+        else:
+            _credentials.pop(conn_id, None)
+
+# --- CRUD DB_CONNECTIONS ---
+def get_connection_info(conn_id: int):
+    """Récupère les infos de connexion avec mot de passe déchiffré et port en int"""
+    try:
+        return get_credentials(conn_id)
+    except InvalidToken:
+        st.error("❌ Erreur de déchiffrement - Clé Fernet invalide ou données corrompues")
+        conn_info = _read_connection(conn_id)
+        if conn_info:
+            conn_info["password"] = ""
+        return conn_info
 def get_connection_by_id(connection_id: int):
     """
     Récupère les détails d'une connexion par son ID.
@@ -110,14 +177,12 @@ def get_connection_by_id(connection_id: int):
         Un dictionnaire contenant les détails de la connexion, ou None si non trouvé
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute(
             "SELECT id, name, type, host, port, db_service, user, password FROM db_connections WHERE id = ?",
             (connection_id,)
         )
         row = cursor.fetchone()
-        conn.close()
         
         if row:
             return {
@@ -150,36 +215,32 @@ def add_connection(data: dict):
         if not valid:
             return False, msg
     
-    # Vérifier l'unicité du nom
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM db_connections WHERE name = ?", (data["name"],))
-    if cursor.fetchone():
-        conn.close()
-        return False, "Ce nom de connexion existe déjà."
-    
     try:
         # Chiffrer le mot de passe
         encrypted_pwd = encrypt_password(data["password"])
-        
-        cursor.execute("""
-            INSERT INTO db_connections (name, type, host, port, db_service, user, password)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data["name"],
-            data["type"],
-            data["host"],
-            int(data["port"]),
-            data["db_service"],
-            data["user"],
-            encrypted_pwd
-        ))
-        conn.commit()
+
+        # Vérification d'unicité et insertion dans la même transaction
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM db_connections WHERE name = ?", (data["name"],))
+            if cursor.fetchone():
+                return False, "Ce nom de connexion existe déjà."
+
+            cursor.execute("""
+                INSERT INTO db_connections (name, type, host, port, db_service, user, password)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                data["name"],
+                data["type"],
+                data["host"],
+                int(data["port"]),
+                data["db_service"],
+                data["user"],
+                encrypted_pwd
+            ))
         return True, "Connexion ajoutée avec succès."
     except Exception as e:
         return False, f"Erreur lors de l'ajout: {str(e)}"
-    finally:
-        conn.close()
 
 def update_connection(conn_id: int, data: dict):
     """Met à jour une connexion existante"""
@@ -196,64 +257,64 @@ def update_connection(conn_id: int, data: dict):
         if not valid:
             return False, msg
     
-    # Vérifier l'unicité du nom (exclure l'actuel)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id FROM db_connections WHERE name = ? AND id != ?", 
-                  (data["name"], conn_id))
-    if cursor.fetchone():
-        conn.close()
-        return False, "Ce nom de connexion existe déjà."
-    
     try:
         # Chiffrer le mot de passe
         encrypted_pwd = encrypt_password(data["password"])
-        
-        cursor.execute("""
-            UPDATE db_connections
-            SET name=?, type=?, host=?, port=?, db_service=?, user=?, password=?
-            WHERE id=?
-        """, (
-            data["name"],
-            data["type"],
-            data["host"],
-            int(data["port"]),
-            data["db_service"],
-            data["user"],
-            encrypted_pwd,
-            conn_id
-        ))
-        conn.commit()
+
+        # Vérification d'unicité du nom (hors connexion actuelle) et mise à jour dans la même transaction
+        with transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM db_connections WHERE name = ? AND id != ?",
+                           (data["name"], conn_id))
+            if cursor.fetchone():
+                return False, "Ce nom de connexion existe déjà."
+
+            cursor.execute("""
+                UPDATE db_connections
+                SET name=?, type=?, host=?, port=?, db_service=?, user=?, password=?
+                WHERE id=?
+            """, (
+                data["name"],
+                data["type"],
+                data["host"],
+                int(data["port"]),
+                data["db_service"],
+                data["user"],
+                encrypted_pwd,
+                conn_id
+            ))
+        forget_credentials(conn_id)
+        connection_pool.get_pool().invalidate(conn_id)
+        result_cache.get_cache().invalidate_connection(conn_id)
         return True, "Connexion mise à jour avec succès."
     except Exception as e:
         return False, f"Erreur lors de la mise à jour: {str(e)}"
-    finally:
-        conn.close()
 
 def delete_connection(conn_id: int):
     """Supprime une connexion par son ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM db_connections WHERE id=?", (conn_id,))
-        conn.commit()
+        with transaction() as conn:
+            conn.execute("DELETE FROM db_connections WHERE id=?", (conn_id,))
+        forget_credentials(conn_id)
+        connection_pool.get_pool().invalidate(conn_id)
+        result_cache.get_cache().invalidate_connection(conn_id)
         return True, "Connexion supprimée avec succès."
     except Exception as e:
         return False, f"Erreur lors de la suppression: {str(e)}"
-    finally:
-        conn.close()
 
 def get_all_connections():
     """Récupère toutes les connexions (sans les mots de passe) et convertit port en int"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    # Tuples immuables : la liste mise en cache est copiée, pas son contenu
+    return list(catalog_cache.cached("connections", "all", _load_all_connections))
+
+def _load_all_connections():
+    cursor = get_connection().cursor()
     cursor.execute("""
         SELECT id, name, type, host, port, db_service, user
         FROM db_connections
         ORDER BY name
     """)
     rows = cursor.fetchall()
-    conn.close()
 
     # Conversion du port en int pour chaque ligne
     corrected_rows = []
@@ -289,28 +350,16 @@ def test_connection(conn_id: int):
 def test_sql_server_connection(conn_info):
     """Teste la connexion à SQL Server avec messages d'erreurs plus clairs."""
     try:
-        if conn_info["user"] == "" and conn_info["password"] == "":
-            # Authentification Windows
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={conn_info['host']},{conn_info['port']};"
-                f"DATABASE={conn_info['db_service']};"
-                f"Trusted_Connection=yes;"
-            )
-        else:
-            # Authentification SQL Server
-            conn_str = (
-                f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                f"SERVER={conn_info['host']},{conn_info['port']};"
-                f"DATABASE={conn_info['db_service']};"
-                f"UID={conn_info['user']};"
-                f"PWD={conn_info['password']};"
-            )
-
-        conn = pyodbc.connect(conn_str, timeout=5)  # timeout pour éviter attente infinie
-        conn.close()
+        # Emprunt via le pool : un test réussi laisse une connexion prête à l'emploi
+        with borrow_connection(conn_info) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
         return True, "✅ Connexion réussie !"
 
+    except connection_pool.PoolTimeoutError as e:
+        return False, f"⏳ {str(e)}"
     except pyodbc.InterfaceError as e:
         return False, "❌ Impossible d'atteindre le serveur. Vérifiez l'adresse et le port."
     except pyodbc.OperationalError as e:
@@ -323,32 +372,48 @@ def test_sql_server_connection(conn_info):
             return False, f"❌ Erreur opérationnelle : {msg}"
     except Exception as e:
         return False, f"❌ Erreur inconnue : {str(e)}"
-        
+
+def build_connection_string(conn_info):
+    """Construit la chaîne ODBC d'une connexion SQL Server"""
+    if conn_info["type"].lower() != "sqlserver":
+        raise ValueError("Seul SQL Server est supporté")
+
+    if conn_info["user"] == "" and conn_info["password"] == "":
+        # Authentification Windows
+        return (
+            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+            f"SERVER={conn_info['host']},{conn_info['port']};"
+            f"DATABASE={conn_info['db_service']};"
+            f"Trusted_Connection=yes;"
+        )
+    # Authentification SQL Server
+    return (
+        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+        f"SERVER={conn_info['host']},{conn_info['port']};"
+        f"DATABASE={conn_info['db_service']};"
+        f"UID={conn_info['user']};"
+        f"PWD={conn_info['password']};"
+    )
+
+@contextmanager
+def borrow_connection(conn_info):
+    """
+    Emprunte une connexion pyodbc au pool partagé pour la base `conn_info["id"]`.
+    La connexion est rendue au pool à la sortie du bloc (fermée en cas d'erreur).
+    """
+    conn_str = _connection_string(conn_info)
+    with connection_pool.get_pool().connection(conn_info["id"], conn_str) as conn:
+        yield conn
+
+def get_pool_stats():
+    """Compteurs du pool de connexions (hits, misses, temps d'attente)"""
+    return connection_pool.get_pool().get_stats()
+
 class DatabaseConnection:
     def __init__(self, conn_info):
         try:
-            if conn_info["type"].lower() == "sqlserver":
-                if conn_info["user"] == "" and conn_info["password"] == "":
-                    # Authentification Windows
-                    conn_str = (
-                        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                        f"SERVER={conn_info['host']},{conn_info['port']};"
-                        f"DATABASE={conn_info['db_service']};"
-                        f"Trusted_Connection=yes;"
-                    )
-                else:
-                    # Authentification SQL Server
-                    conn_str = (
-                        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-                        f"SERVER={conn_info['host']},{conn_info['port']};"
-                        f"DATABASE={conn_info['db_service']};"
-                        f"UID={conn_info['user']};"
-                        f"PWD={conn_info['password']};"
-                    )
-            else:
-                raise ValueError("Seul SQL Server est supporté")
-
-            self._connection = pyodbc.connect(conn_str)
+            conn_str = _connection_string(conn_info)
+            self._connection = pyodbc.connect(conn_str, timeout=connection_pool.LOGIN_TIMEOUT)
         except Exception as e:
             self._connection = None
             print("❌ Erreur de connexion :", e)
@@ -360,46 +425,21 @@ class DatabaseConnection:
         if self._connection:
             self._connection.close()
 
-# --- INITIALISATION DE LA BASE ---
-def init_db():
-    """Initialise la base de données si elle n'existe pas"""
-    if not os.path.exists(DB_PATH):
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS db_connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                type TEXT NOT NULL,
-                host TEXT NOT NULL,
-                port INTEGER NOT NULL,
-                db_service TEXT NOT NULL,
-                user TEXT NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-        conn.commit()
-        conn.close()
-        print(f"Base de données initialisée: {DB_PATH}")
-
 # --- FONCTION UTILITAIRE POUR LES TESTS ---
 def cleanup_test_connections(base_name: str):
     """Nettoie les connexions de test existantes"""
-    with sqlite3.connect(DB_PATH) as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "DELETE FROM db_connections WHERE name LIKE ? || '%'", 
             (base_name,)
         )
         deleted_count = cursor.rowcount
-        conn.commit()
+    forget_credentials()
     print(f"{deleted_count} anciennes connexions nettoyées")
 
 # --- TEST ---
 if __name__ == "__main__":
-    # Initialiser la base de données
-    init_db()
-    
     print(f"Chemin DB: {DB_PATH}")
     print(f"DB existe: {os.path.exists(DB_PATH)}")
     
@@ -425,7 +465,7 @@ if __name__ == "__main__":
     # Tester la connexion
     if success:
         # Récupérer l'ID de la connexion par son nom
-        with sqlite3.connect(DB_PATH) as conn:
+        with reading() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT id FROM db_connections WHERE name = ?", (BASE_TEST_NAME,))
             result = cursor.fetchone()
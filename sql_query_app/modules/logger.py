@@ -1,76 +1,183 @@
 # modules/database_logger.py
-import sqlite3
+import atexit
 import os
+import queue
+import threading
 import pandas as pd
 from datetime import datetime
 import streamlit as st
+from dotenv import load_dotenv
+from modules.metadata_store import get_connection, transaction
 
-# Chemin absolu pour éviter les problèmes de chemins relatifs
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "db", "app.db")
+load_dotenv()
 
-def init_db():
-    """Initialise la base de données et crée la table logs si elle n'existe pas"""
-    try:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT,
-                query_id INTEGER,
-                timestamp DATETIME,
-                status TEXT,
-                message TEXT
-            )
-        """)
-        conn.commit()
-        conn.close()
+# ==========================
+# CONFIGURATION DU JOURNAL
+# ==========================
+LOG_ASYNC = os.getenv("LOG_ASYNC", "1") == "1"                         # 0 = écriture synchrone (mode de repli)
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))             # Événements en attente au maximum
+LOG_FLUSH_INTERVAL_MS = int(os.getenv("LOG_FLUSH_INTERVAL_MS", "500"))  # Écriture au plus tard après ce délai
+LOG_FLUSH_BATCH = int(os.getenv("LOG_FLUSH_BATCH", "200"))             # ... ou dès que ce nombre d'événements attend
+
+INSERT_SQL = """
+    INSERT INTO logs (username, query_id, timestamp, status, message)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def _insert(events):
+    """Une transaction pour tout le lot."""
+    with transaction() as conn:
+        conn.executemany(INSERT_SQL, events)
+
+
+class AuditWriter:
+    """
+    Écriture différée du journal : log_action dépose l'événement (horodaté à
+    l'appel) dans une file bornée, un thread l'écrit par lots avec executemany.
+    L'exécution d'une requête n'attend donc plus ni verrou SQLite ni commit.
+
+    File pleine : l'événement est écrit tout de suite par l'appelant (rien n'est
+    perdu). Lot en échec : conservé et retenté au passage suivant. Les événements
+    en attente sont écrits à l'arrêt du processus (atexit) et par flush().
+    """
+
+    def __init__(self, queue_size=LOG_QUEUE_SIZE, flush_interval_ms=LOG_FLUSH_INTERVAL_MS,
+                 batch_size=LOG_FLUSH_BATCH):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._drain_lock = threading.Lock()  # Un seul écrivain à la fois : l'ordre des lots est conservé
+        self._failed = None                  # Lot à retenter
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "sync_writes": 0, "errors": 0}
+
+    def submit(self, event) -> bool:
+        if self._stop.is_set():  # Processus en cours d'arrêt : plus de thread pour écrire
+            return self._write_now(event)
+        self._start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            return self._write_now(event)
+        with self._lock:
+            self._stats["queued"] += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
         return True
-    except Exception as e:
-        st.error(f"Erreur lors de l'initialisation de la base de données: {str(e)}")
-        return False
+
+    def flush(self) -> bool:
+        """Écrit immédiatement les événements en attente ; False si l'écriture a échoué."""
+        return self._drain()
+
+    def stop(self, timeout=5.0):
+        """Arrête le thread après avoir écrit tout ce qui attend (hook atexit)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if not self._drain():
+            lost = self._queue.qsize() + len(self._failed or [])
+            print(f"Journal : {lost} événement(s) non écrit(s) à l'arrêt")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["pending"] = self._queue.qsize() + len(self._failed or [])
+        return stats
+
+    # --------------------------
+    # Outils internes
+    # --------------------------
+    def _write_now(self, event) -> bool:
+        _insert([event])
+        with self._lock:
+            self._stats["sync_writes"] += 1
+        return True
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None and not self._stop.is_set():
+                self._thread = threading.Thread(target=self._loop, name="audit-log", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def _drain(self) -> bool:
+        with self._drain_lock:
+            while True:
+                batch = self._failed or []
+                self._failed = None
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return True
+                try:
+                    _insert(batch)
+                except Exception as e:
+                    self._failed = batch
+                    with self._lock:
+                        self._stats["errors"] += 1
+                    print(f"Erreur de journalisation ({len(batch)} événement(s) en attente): {str(e)}")
+                    return False
+                with self._lock:
+                    self._stats["written"] += len(batch)
+                    self._stats["batches"] += 1
+
+
+# Écrivain unique partagé par toutes les sessions Streamlit du processus
+_writer = AuditWriter()
+atexit.register(_writer.stop)
+
+
+def get_writer() -> AuditWriter:
+    return _writer
+
 
 def log_action(username: str, query_id: int, status: str, message: str):
     """
-    Enregistre une action dans la table logs
+    Enregistre une action dans la table logs (différée, cf. AuditWriter ; immédiate si LOG_ASYNC=0)
     """
+    event = (username, query_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), status, message)
     try:
-        # Initialiser la base si elle n'existe pas
-        init_db()
-            
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO logs (username, query_id, timestamp, status, message)
-            VALUES (?, ?, ?, ?, ?)
-        """, (username, query_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), status, message))
-        conn.commit()
-        conn.close()
+        if LOG_ASYNC:
+            return _writer.submit(event)
+        _insert([event])
         return True
-        
+
     except Exception as e:
         st.error(f"Erreur de journalisation: {str(e)}")
         print(f"Erreur de journalisation: {str(e)}")
         return False
 
+def flush():
+    """Écrit les événements en attente (avant une lecture du journal)."""
+    return _writer.flush()
+
 def get_logs_simple():
     """
     Version simplifiée pour récupérer les logs - sans filtres
     """
     try:
-        init_db()
-        conn = sqlite3.connect(DB_PATH)
-        
+        flush()
         query = "SELECT id, username, query_id, timestamp, status, message FROM logs ORDER BY timestamp DESC LIMIT 100"
         
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        df = pd.read_sql_query(query, get_connection())
         
         return df
         
     except Exception as e:
         st.error(f"Erreur lors de la récupération des logs: {str(e)}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from modules import migrations
+
+# ==========================
+# CONFIGURATION
+# ==========================
+# Base SQLite des métadonnées du portail (connexions, requêtes, utilisateurs, journal...)
+BASE_DIR = Path(__file__).resolve().parent.parent
+DB_DIR = BASE_DIR / "db"
+DB_DIR.mkdir(parents=True, exist_ok=True)  # Crée le dossier si nécessaire
+DB_PATH = str(DB_DIR / "app.db")
+
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000"))  # Attente max (ms) d'un verrou d'écriture
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "16"))            # Cache de pages par connexion
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "64"))              # Lecture du fichier par mmap ; 0 = désactivé
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False  # Migrations vérifiées une fois par processus
+MIGRATION_USERNAME = "migrations"  # Utilisateur inscrit dans les logs pour une mise à jour du schéma
+
+
+def _open() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT / 1000)
+    # WAL : les lectures ne bloquent plus les écritures (et inversement) ; le mode est
+    # persistant dans le fichier, les autres PRAGMA valent pour la connexion.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # Sûr en WAL : seul le dernier commit peut être perdu sur coupure
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT}")
+    conn.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_MB * 1024}")  # Négatif = en Kio
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> list:
+    """Applique les migrations manquantes à la première connexion du processus ; retourne les versions appliquées."""
+    global _schema_ready
+    if _schema_ready:
+        return []
+    with _schema_lock:
+        if _schema_ready:
+            return []
+        applied = migrations.migrate(conn)
+        _schema_ready = True
+        return applied
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Connexion du thread courant, ouverte au premier appel puis réutilisée.
+
+    Le schéma est mis à jour (migrations) avant la première connexion rendue.
+    Ne pas la fermer. Lectures : `with reading() as conn:` ; écritures : `with
+    transaction() as conn:`. Pour un accès par nom de colonne, positionner
+    `row_factory` sur le curseur, pas sur la connexion.
+    """
+    conn = getattr(_local, "connection", None)
+    if conn is None:
+        conn = _open()
+        applied = _ensure_schema(conn)
+        _local.connection = conn
+        _local.depth = 0
+        if applied:
+            # Après l'enregistrement de la connexion : le journal l'emprunte pour écrire
+            from modules.logger import log_action
+            log_action(MIGRATION_USERNAME, None, "success",
+                       f"Schéma de {DB_PATH} migré : version(s) {', '.join(map(str, applied))}")
+    return conn
+
+
+@contextmanager
+def reading():
+    """
+    Connexion du thread courant pour des lectures. Contrairement à `with
+    get_connection()`, la sortie du bloc ne valide ni n'annule rien : utilisée
+    dans une transaction(), elle la laisse intacte.
+    """
+    yield get_connection()
+
+
+@contextmanager
+def transaction():
+    """
+    Transaction d'écriture : verrou pris dès le début (BEGIN IMMEDIATE, pas
+    d'échec « database is locked » en cours de route), validée en sortie de bloc,
+    annulée sur exception.
+
+    Réentrante : imbriquée, elle devient un SAVEPOINT de la transaction englobante.
+    Un échec n'annule alors que ses propres écritures ; l'exception remonte et la
+    transaction englobante décide de la suite. Seule la plus externe valide.
+    """
+    conn = get_connection()
+    depth = _local.depth
+    if depth == 0 and conn.in_transaction:
+        # Transaction implicite ouverte hors de transaction() : la rejoindre ferait valider
+        # (ou annuler) des écritures qui ne sont pas les nôtres
+        raise RuntimeError("Transaction SQLite déjà ouverte hors de transaction() sur cette connexion")
+    savepoint = f"sp_{depth}"
+    conn.execute(f"SAVEPOINT {savepoint}" if depth else "BEGIN IMMEDIATE")
+    _local.depth = depth + 1
+    try:
+        yield conn
+    except BaseException:
+        if depth:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            conn.rollback()
+        raise
+    else:
+        if depth:
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            try:
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+    finally:
+        _local.depth = depth
+
+
+def close_connection():
+    """Ferme la connexion du thread courant (fin d'un worker, tests)."""
+    conn = getattr(_local, "connection", None)
+    if conn is not None:
+        _local.connection = None
+        conn.close()
@@ -0,0 +1,284 @@
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Set, Tuple
+
+# ==========================
+# MIGRATIONS DU SCHÉMA
+# ==========================
+# Étapes ordonnées et idempotentes : chacune vérifie l'état réel de la base avant
+# d'agir, une base créée par les anciens scripts de db/ est donc reprise telle quelle.
+# La table schema_version garde la trace des étapes appliquées ; une étape n'est
+# jamais modifiée une fois livrée, tout changement de schéma ajoute une étape.
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Même format que la table logs
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> Set[str]:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: List[Tuple[str, str]]):
+    existing = _columns(conn, table)
+    for column, declaration in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+def _initial_schema(conn: sqlite3.Connection):
+    """Tables d'origine (ex-db/init_sqlite.py, query_manager.init_db, logger.init_db)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT NOT NULL,
+            is_active INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS db_connections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            type TEXT NOT NULL,
+            host TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            db_service TEXT NOT NULL,
+            user TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS queries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            sql_text TEXT NOT NULL,
+            parameters TEXT,
+            roles TEXT,
+            db_id INTEGER
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            query_id INTEGER,
+            timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            status TEXT,
+            message TEXT
+        )
+    """)
+
+
+def _rename_db_to_db_service(conn: sqlite3.Connection):
+    """Ex-db/migrate_column_table_db_connections.py : colonne `db` renommée en `db_service`."""
+    columns = _columns(conn, "db_connections")
+    if "db_service" in columns or "db" not in columns:
+        return
+    conn.execute("ALTER TABLE db_connections RENAME TO db_connections_old")
+    conn.execute("""
+        CREATE TABLE db_connections (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            type TEXT,
+            host TEXT,
+            port TEXT,
+            db_service TEXT,
+            user TEXT,
+            password TEXT
+        )
+    """)
+    # Le script d'origine copiait la chaîne littérale "db/service" : on reprend la vraie valeur
+    conn.execute("""
+        INSERT INTO db_connections (id, name, type, host, port, db_service, user, password)
+        SELECT id, name, type, host, port, db, user, password FROM db_connections_old
+    """)
+    conn.execute("DROP TABLE db_connections_old")
+
+
+def _add_user_email(conn: sqlite3.Connection):
+    """Ex-db/migration_add_email.py."""
+    _add_columns(conn, "users", [("email", "TEXT")])
+
+
+def _add_query_options(conn: sqlite3.Connection):
+    """Options par requête (ex-query_manager.ensure_query_columns)."""
+    _add_columns(conn, "queries", [
+        ("cache_ttl", "INTEGER"),
+        ("timeout_seconds", "INTEGER"),
+        ("page_key", "TEXT"),
+        ("watermark_column", "TEXT"),
+    ])
+
+
+def _schedules(conn: sqlite3.Connection):
+    """Extractions planifiées et historique de leurs exécutions (ex-schedule_manager.init_db)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            query_id INTEGER NOT NULL,
+            cron TEXT NOT NULL,
+            parameters TEXT,
+            output_format TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1,
+            created_by TEXT,
+            next_run_at TEXT,
+            last_run_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schedule_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            schedule_id INTEGER NOT NULL,
+            query_id INTEGER,
+            scheduled_for TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            duration REAL,
+            status TEXT,
+            row_count INTEGER,
+            file_path TEXT,
+            message TEXT
+        )
+    """)
+
+
+def _watermarks(conn: sqlite3.Connection):
+    """Points de reprise des extractions incrémentales (ex-watermark_manager.init_db)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watermarks (
+            query_id INTEGER NOT NULL,
+            scope TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            value TEXT NOT NULL,
+            value_type TEXT NOT NULL,
+            updated_at TEXT,
+            PRIMARY KEY (query_id, scope)
+        )
+    """)
+
+
+def _lookup_indexes(conn: sqlite3.Connection):
+    """Index des recherches fréquentes (journal filtré et trié par date, requêtes d'une base...)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_username_timestamp ON logs(username, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_status_timestamp ON logs(status, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_queries_db_id ON queries(db_id)")
+    # Peut déjà exister en UNIQUE sur les bases historiques : elle est alors conservée
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedules_due ON schedules(enabled, next_run_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_schedule_runs_schedule ON schedule_runs(schedule_id)")
+
+
+def _query_roles(conn: sqlite3.Connection):
+    """
+    Rôles autorisés d'une requête en table (une ligne par rôle), repris de la colonne
+    queries.roles ("Admin,Analyste"). La colonne reste une copie lisible, écrite avec la table.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS query_roles (
+            role TEXT NOT NULL COLLATE NOCASE,
+            query_id INTEGER NOT NULL,
+            PRIMARY KEY (role, query_id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_query_roles_query ON query_roles(query_id)")
+    for query_id, roles in conn.execute("SELECT id, roles FROM queries").fetchall():
+        for role in (roles or "").split(","):
+            if role.strip():
+                conn.execute("INSERT OR IGNORE INTO query_roles (role, query_id) VALUES (?, ?)",
+                             (role.strip(), query_id))
+
+
+# Compteur de modifications par catalogue : chaque écriture sur ces tables (depuis
+# n'importe quel module, script ou processus) l'incrémente dans sa propre transaction.
+CATALOG_TABLES = {
+    "connections": ["db_connections"],
+    "queries": ["queries", "query_roles"],
+    "users": ["users"],
+}
+
+
+def _catalog_versions(conn: sqlite3.Connection):
+    """Compteurs de version des catalogues (invalidation du cache catalog_cache)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for name, tables in CATALOG_TABLES.items():
+        conn.execute("INSERT OR IGNORE INTO catalog_versions (name, version) VALUES (?, 0)", (name,))
+        for table in tables:
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE catalog_versions SET version = version + 1 WHERE name = '{name}';
+                    END
+                """)
+
+
+# (version, description, étape) — versions croissantes, jamais renumérotées
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "Schéma initial", _initial_schema),
+    (2, "Colonne db_connections.db renommée en db_service", _rename_db_to_db_service),
+    (3, "Colonne users.email", _add_user_email),
+    (4, "Options des requêtes (cache, délai, pagination, reprise)", _add_query_options),
+    (5, "Extractions planifiées", _schedules),
+    (6, "Points de reprise des extractions incrémentales", _watermarks),
+    (7, "Index des recherches fréquentes", _lookup_indexes),
+    (8, "Table query_roles (rôles autorisés par requête)", _query_roles),
+    (9, "Compteurs de version des catalogues", _catalog_versions),
+]
+
+
+def _applied(conn: sqlite3.Connection) -> Set[int]:
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version")}
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    applied = _applied(conn)
+    return max(applied) if applied else 0
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """
+    Applique les étapes manquantes, chacune dans sa propre transaction (BEGIN
+    IMMEDIATE : deux processus qui démarrent ensemble ne l'appliquent qu'une fois).
+    Retourne les versions appliquées par cet appel.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT
+        )
+    """)
+    conn.commit()
+    done = []
+    applied = _applied(conn)
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version not in _applied(conn):  # Un autre processus a pu l'appliquer entre-temps
+                step(conn)
+                conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                             (version, description, datetime.now().strftime(TIME_FORMAT)))
+                done.append(version)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    return done
+
+
+if __name__ == "__main__":
+    # Mise à jour manuelle du schéma : python -m modules.migrations
+    from modules import metadata_store
+    conn = metadata_store.get_connection()  # Les migrations manquantes sont appliquées à l'ouverture
+    print(f"Base : {metadata_store.DB_PATH}")
+    print(f"Version du schéma : {current_version(conn)} / {MIGRATIONS[-1][0]}")
@@ -0,0 +1,469 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+# ==========================
+# CONFIGURATION
+# ==========================
+COMPILED_CACHE_SIZE = 512  # Nombre max de requêtes compilées gardées en mémoire
+
+# Début d'une zone à ne pas réécrire (littéral, identifiant délimité, commentaire) ou d'un paramètre
+_SPECIAL = re.compile(r"['\"\[:]|--|/\*")
+_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_ORDER_BY = re.compile(r"ORDER\s+BY\b", re.IGNORECASE)
+# Élément d'ORDER BY repris tel quel hors d'une table dérivée : colonne (éventuellement
+# préfixée par sa table) ou numéro de colonne, suivi du sens de tri
+_IDENTIFIER = r'\[(?:[^\]]|\]\])+\]|"(?:[^"]|"")+"|[A-Za-z_@#][A-Za-z0-9_@#$]*'
+_ORDER_ITEM = re.compile(
+    rf"\s*(?:(?P<ordinal>\d+)|(?:(?:{_IDENTIFIER})\s*\.\s*)*(?P<column>{_IDENTIFIER}))"
+    rf"(?:\s+(?P<direction>ASC|DESC))?\s*(?:,|$)", re.IGNORECASE)
+
+
+class CompiledQuery:
+    """
+    Forme exécutable d'une requête prédéfinie, calculée une fois par version.
+
+    - `sql` : le SQL où chaque `:nom` déclaré est remplacé par `?`
+    - `slots` : le nom du paramètre lié à chaque `?`, dans l'ordre (répétitions comprises)
+    - `param_names` / `param_types` : paramètres déclarés et leurs types
+    """
+
+    def __init__(self, sql: str, slots: List[str], param_names: List[str], param_types: Dict[str, str]):
+        self.sql = sql
+        self.slots = slots
+        self.param_names = param_names
+        self.param_types = param_types
+
+    def bind(self, params: dict) -> List[Any]:
+        """
+        Valeurs à passer à cursor.execute, une par `?`, converties au type déclaré.
+        Lève ValueError (paramètre manquant ou valeur non convertible).
+        """
+        coerced = {}
+        for name in self.slots:
+            if name not in params:
+                raise ValueError(f"Paramètre manquant: {name}")
+            if name not in coerced:
+                coerced[name] = coerce_value(name, params[name], self.param_types.get(name, "string"))
+        return [coerced[name] for name in self.slots]
+
+    def slot_types(self) -> List[str]:
+        """Type déclaré de chaque `?`."""
+        return [self.param_types.get(name, "string") for name in self.slots]
+
+# ==========================
+# CONVERSION DES VALEURS
+# ==========================
+_TRUE = {"1", "true", "vrai", "oui", "yes", "o", "y"}
+_FALSE = {"0", "false", "faux", "non", "no", "n"}
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y")
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (float, Decimal)):
+        if value != int(value):
+            raise ValueError
+        return int(value)
+    text = str(value).strip().replace(" ", "")
+    try:
+        return int(text)
+    except ValueError:
+        number = Decimal(text)
+        if number != number.to_integral_value():
+            raise ValueError
+        return int(number)
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    return float(str(value).strip().replace(" ", "").replace(",", "."))
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return datetime.fromisoformat(text).date()
+
+
+def _to_string(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+_CONVERTERS = {
+    "int": _to_int,
+    "float": _to_float,
+    "bool": _to_bool,
+    "date": _to_date,
+    "string": _to_string,
+}
+
+
+def coerce_value(name: str, value: Any, ptype: str) -> Any:
+    """Convertit `value` au type déclaré ; None reste None (NULL)."""
+    if value is None:
+        return None
+    converter = _CONVERTERS.get(ptype, _to_string)
+    try:
+        return converter(value)
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError(f"Paramètre '{name}' : la valeur '{value}' n'est pas un {ptype} valide")
+
+
+def parse_parameters(parameters: Optional[str]):
+    """
+    "start_date:date,end_date:date" → (["start_date", "end_date"], {"start_date": "date", ...})
+    Un paramètre sans type est considéré comme une chaîne.
+    """
+    names, types = [], {}
+    if not parameters or not parameters.strip():
+        return names, types
+    for part in parameters.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            name, ptype = part.split(":", 1)
+            name, ptype = name.strip(), ptype.strip().lower()
+        else:
+            name, ptype = part, "string"
+        if name not in types:
+            names.append(name)
+        types[name] = ptype
+    return names, types
+
+
+def rewrite_placeholders(sql: str, declared) -> Tuple[str, List[str]]:
+    """
+    Remplace les `:nom` déclarés par `?` en ignorant les littéraux ('...', N'...'),
+    les identifiants délimités ("...", [...]) et les commentaires (--, /* */).
+    Retourne le SQL réécrit et la liste ordonnée des paramètres liés.
+    """
+    out, slots = [], []
+    i, n = 0, len(sql)
+    while i < n:
+        match = _SPECIAL.search(sql, i)
+        if not match:
+            out.append(sql[i:])
+            break
+        start = match.start()
+        out.append(sql[i:start])
+        token = match.group()
+
+        if token in ("'", '"'):
+            end = _skip_quoted(sql, start, token)
+        elif token == "[":
+            end = _skip_quoted(sql, start, "]")
+        elif token == "--":
+            end = sql.find("\n", start)
+            end = n if end == -1 else end
+        elif token == "/*":
+            end = _skip_block_comment(sql, start)
+        else:  # ":"
+            name = _NAME.match(sql, start + 1)
+            prev_colon = start > 0 and sql[start - 1] == ":"
+            if name and not prev_colon and name.group() in declared:
+                out.append("?")
+                slots.append(name.group())
+                i = name.end()
+            else:
+                out.append(":")
+                i = start + 1
+            continue
+
+        out.append(sql[start:end])
+        i = end
+    return "".join(out), slots
+
+
+def _skip_quoted(sql: str, start: int, closing: str) -> int:
+    """Fin d'une zone délimitée ; le délimiteur doublé ('' ou ]]) est un échappement."""
+    i = start + 1
+    n = len(sql)
+    while i < n:
+        if sql[i] == closing:
+            if i + 1 < n and sql[i + 1] == closing:
+                i += 2
+                continue
+            return i + 1
+        i += 1
+    return n
+
+
+def _skip_block_comment(sql: str, start: int) -> int:
+    """Fin d'un commentaire /* */ (T-SQL autorise l'imbrication)."""
+    depth, i, n = 0, start, len(sql)
+    while i < n:
+        if sql.startswith("/*", i):
+            depth += 1
+            i += 2
+        elif sql.startswith("*/", i):
+            depth -= 1
+            i += 2
+            if depth == 0:
+                return i
+        else:
+            i += 1
+    return n
+
+
+def leading_keyword(sql: str) -> str:
+    """Premier mot-clé de l'instruction, commentaires et espaces ignorés (en majuscules)."""
+    i, n = 0, len(sql)
+    while i < n:
+        if sql[i].isspace():
+            i += 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end
+        elif sql.startswith("/*", i):
+            i = _skip_block_comment(sql, i)
+        else:
+            word = _NAME.match(sql, i)
+            return word.group().upper() if word else ""
+    return ""
+
+
+def _top_level_words(sql: str):
+    """(position, MOT) des mots hors parenthèses, littéraux, identifiants délimités et commentaires."""
+    depth, i, n = 0, 0, len(sql)
+    while i < n:
+        char = sql[i]
+        if char in ("'", '"'):
+            i = _skip_quoted(sql, i, char)
+        elif char == "[":
+            i = _skip_quoted(sql, i, "]")
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end
+        elif sql.startswith("/*", i):
+            i = _skip_block_comment(sql, i)
+        elif char == "(":
+            depth += 1
+            i += 1
+        elif char == ")":
+            depth -= 1
+            i += 1
+        else:
+            word = _NAME.match(sql, i)
+            if not word:
+                i += 1
+                continue
+            if depth == 0:
+                yield i, word.group().upper()
+            i = word.end()
+
+
+def split_order_by(sql: str) -> Tuple[str, Optional[str]]:
+    """
+    Sépare la clause ORDER BY finale (hors parenthèses, littéraux et commentaires)
+    du reste de l'instruction ; le point-virgule final est retiré.
+    "SELECT a FROM t ORDER BY a" → ("SELECT a FROM t", "ORDER BY a")
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    order_at = None
+    for i, word in _top_level_words(sql):
+        if word == "ORDER" and _ORDER_BY.match(sql, i):
+            order_at = i
+    if order_at is None:
+        return sql, None
+    return sql[:order_at].rstrip(), sql[order_at:].strip()
+
+
+def quote_identifier(name: str) -> str:
+    """Nom de colonne délimité pour SQL Server : [nom], les ] doublés."""
+    return "[" + name.replace("]", "]]") + "]"
+
+
+def has_top(sql: str) -> bool:
+    """Vrai si le SELECT principal (celui qui suit une éventuelle CTE) est limité par TOP."""
+    words = (word for _, word in _top_level_words(sql))
+    for word in words:
+        if word == "SELECT":
+            break
+    for word in words:
+        if word not in ("DISTINCT", "ALL"):
+            return word == "TOP"
+    return False
+
+
+def _is_limited(body: str, order_by: Optional[str]) -> bool:
+    """
+    Vrai si l'ORDER BY de la requête choisit ses lignes (TOP, ou OFFSET/FETCH) et
+    pas seulement leur ordre : il ne peut alors être ni retiré ni complété.
+    """
+    if has_top(body):
+        return True
+    return bool(order_by) and any(word == "OFFSET" for _, word in _top_level_words(order_by))
+
+
+def _unquote(identifier: str) -> str:
+    if identifier[0] == "[":
+        return identifier[1:-1].replace("]]", "]")
+    if identifier[0] == '"':
+        return identifier[1:-1].replace('""', '"')
+    return identifier
+
+
+def outer_order_by(order_by: str) -> str:
+    """
+    ORDER BY équivalent, applicable aux colonnes d'une table dérivée construite sur la
+    requête : "ORDER BY t.d DESC, 2" → "ORDER BY [d] DESC, 2". Une éventuelle clause
+    OFFSET/FETCH est ignorée. Lève ValueError si un élément n'est pas une colonne
+    (expression, COLLATE...) : il ne peut pas être repris à l'extérieur.
+    """
+    items = order_by[_ORDER_BY.match(order_by).end():]
+    for i, word in _top_level_words(items):
+        if word == "OFFSET":
+            items = items[:i]
+            break
+    items, position, columns = items.strip(), 0, []
+    while position < len(items):
+        item = _ORDER_ITEM.match(items, position)
+        if not item or item.end() == position:
+            raise ValueError(f"Tri non reproductible hors de la requête : {order_by} "
+                             "(seuls des noms ou numéros de colonnes sont acceptés)")
+        column = item.group("ordinal") or quote_identifier(_unquote(item.group("column")))
+        direction = item.group("direction")
+        columns.append(f"{column} {direction.upper()}" if direction else column)
+        position = item.end()
+    if not columns:
+        raise ValueError(f"ORDER BY vide : {order_by}")
+    return "ORDER BY " + ", ".join(columns)
+
+
+def paginate_offset(sql: str) -> str:
+    """
+    Instruction paginée par OFFSET/FETCH ; ses deux derniers `?` reçoivent le
+    décalage et le nombre de lignes. L'ordre de la requête est conservé s'il
+    existe, sinon l'ordre du serveur est utilisé (stable en pratique, non garanti).
+    La clause est ajoutée directement à la requête, qui n'est pas réécrite.
+
+    Seule une requête limitée (TOP, OFFSET) est placée, ORDER BY compris, dans une
+    table dérivée ; son ORDER BY est repris à l'extérieur (cf. outer_order_by) pour
+    que les pages suivent l'ordre de la requête. Ses colonnes doivent alors toutes
+    être nommées, sans doublon. Lève ValueError si elle commence par une CTE, qui ne
+    peut pas être encapsulée, ou si son tri ne peut pas être repris.
+    """
+    body, order_by = split_order_by(sql)
+    if _is_limited(body, order_by):
+        if leading_keyword(body) == "WITH":
+            raise ValueError("Pagination impossible sur une requête en CTE (WITH) limitée par TOP ou OFFSET")
+        if not order_by:  # TOP sans ORDER BY : lignes et ordre laissés au serveur
+            return (f"SELECT * FROM (\n{body}\n) AS _page\n"
+                    f"ORDER BY (SELECT NULL)\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+        return (f"SELECT * FROM (\n{body}\n{order_by}\n) AS _page\n"
+                f"{outer_order_by(order_by)}\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+    return f"{body}\n{order_by or 'ORDER BY (SELECT NULL)'}\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+
+def paginate_keyset(sql: str, key_column: str, after_key: bool) -> str:
+    """
+    Instruction paginée par clé : `TOP (?)` lignes triées sur `key_column`, après la
+    dernière clé de la page précédente (dernier `?`) quand `after_key` est vrai.
+    Le premier `?` reçoit le nombre de lignes.
+
+    L'ordre de la requête est remplacé par celui de la clé, sauf s'il choisit les
+    lignes (TOP, OFFSET) : il reste alors dans la table dérivée, dont les colonnes
+    doivent toutes être nommées, sans doublon. Lève ValueError pour une requête en
+    CTE, qui ne peut pas être encapsulée.
+    """
+    body, order_by = split_order_by(sql)
+    if leading_keyword(body) == "WITH":
+        raise ValueError("Navigation par clé impossible sur une requête commençant par WITH (CTE)")
+    inner = f"{body}\n{order_by}" if _is_limited(body, order_by) else body
+    key = quote_identifier(key_column)
+    where = f"\nWHERE {key} > ?" if after_key else ""
+    return f"SELECT TOP (?) * FROM (\n{inner}\n) AS _page{where}\nORDER BY {key}"
+
+
+def incremental_sql(sql: str, watermark_column: str) -> str:
+    """
+    Instruction ne retournant que les lignes postérieures au dernier point de
+    reprise (dernier `?`), triées sur `watermark_column`. Lève ValueError pour une
+    requête en CTE, qui ne peut pas être placée dans une table dérivée.
+
+    L'ordre de la requête est remplacé par celui du point de reprise, sauf s'il
+    choisit les lignes (TOP, OFFSET) : il reste alors dans la table dérivée, sans
+    quoi le filtre porterait sur d'autres lignes que celles de la requête.
+    """
+    body, order_by = split_order_by(sql)
+    if leading_keyword(body) == "WITH":
+        raise ValueError("Extraction incrémentale impossible sur une requête commençant par WITH (CTE)")
+    inner = f"{body}\n{order_by}" if _is_limited(body, order_by) else body
+    column = quote_identifier(watermark_column)
+    return f"SELECT * FROM (\n{inner}\n) AS _delta\nWHERE {column} > ?\nORDER BY {column}"
+
+
+def compile_sql(sql_text: str, parameters: Optional[str]) -> CompiledQuery:
+    names, types = parse_parameters(parameters)
+    sql, slots = rewrite_placeholders(sql_text, set(names))
+    return CompiledQuery(sql, slots, names, types)
+
+# ==========================
+# CACHE DES REQUÊTES COMPILÉES
+# ==========================
+_lock = threading.Lock()
+_compiled = OrderedDict()  # (query_id, hash du contenu) -> CompiledQuery
+
+
+def content_hash(query: dict) -> str:
+    data = f"{query['sql_text']}\0{query.get('parameters') or ''}"
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def compile_query(query: dict) -> CompiledQuery:
+    """Requête compilée, recalculée seulement quand le SQL ou les paramètres changent."""
+    key = (query.get("id"), content_hash(query))
+    with _lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+
+    compiled = compile_sql(query["sql_text"], query.get("parameters"))
+    with _lock:
+        _compiled[key] = compiled
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+def invalidate(query_id: int):
+    """Oublie les versions compilées d'une requête (après update_query/delete_query)."""
+    with _lock:
+        for key in [k for k in _compiled if k[0] == query_id]:
+            del _compiled[key]
@@ -2,71 +2,67 @@ import sqlite3
 from typing import List, Dict, Any, Optional
 import os
 import re
-from pathlib import Path
+from modules import catalog_cache, result_cache, query_compiler, watermark_manager
+from modules.metadata_store import DB_PATH, reading, transaction
 
 # ==========================
-# CONFIGURATION BASE DE DONNÉES
+# COLONNES DE LA TABLE QUERIES
 # ==========================
-# Chemin absolu vers la base SQLite
-BASE_DIR = Path(__file__).resolve().parent.parent
-DB_DIR = BASE_DIR / "db"
-DB_DIR.mkdir(parents=True, exist_ok=True)  # Crée le dossier si nécessaire
-DB_PATH = str(DB_DIR / "app.db")
+# Schéma créé et mis à jour par modules/migrations.py ; colonnes optionnelles ajoutées après coup
+QUERY_EXTRA_COLUMNS = {
+    "cache_ttl": "INTEGER",        # Durée de vie du cache de résultats (s) ; NULL = défaut global, 0 = désactivé
+    "timeout_seconds": "INTEGER",  # Délai max d'exécution (s) ; NULL = défaut global, 0 = aucun
+    "page_key": "TEXT",            # Colonne clé de la navigation paginée ; NULL = OFFSET/FETCH
+    "watermark_column": "TEXT",    # Colonne croissante des extractions incrémentales ; NULL = toujours complet
+}
 
-# ==========================
-# INITIALISATION DE LA BASE
-# ==========================
-def init_db():
-    """Initialise la base de données avec les tables nécessaires"""
-    with sqlite3.connect(DB_PATH) as conn:
-        cursor = conn.cursor()
-        
-        # Table db_connections
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS db_connections (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                type TEXT NOT NULL,
-                host TEXT NOT NULL,
-                port INTEGER NOT NULL,
-                db_service TEXT NOT NULL,
-                user TEXT NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-        
-        # Table queries
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS queries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                sql_text TEXT NOT NULL,
-                parameters TEXT,
-                roles TEXT,
-                db_id INTEGER
-            )
-        """)
-        conn.commit()
-    print(f"Base de données initialisée: {DB_PATH}")
-
-# Initialiser la base au premier chargement
-if not os.path.exists(DB_PATH):
-    init_db()
+QUERY_FIELDS = ["id", "name", "sql_text", "parameters", "roles", "db_id"] + list(QUERY_EXTRA_COLUMNS)
+QUERY_COLUMNS = ", ".join(QUERY_FIELDS)
+
+def _row_to_query(row) -> Dict[str, Any]:
+    """Convertit une ligne lue avec QUERY_COLUMNS en dictionnaire."""
+    return dict(zip(QUERY_FIELDS, row))
+
+
+def _copy(queries):
+    """Les lectures sont servies par catalog_cache : l'appelant reçoit ses propres dictionnaires."""
+    if queries is None:
+        return None
+    if isinstance(queries, dict):
+        return dict(queries)
+    return [dict(q) for q in queries]
 
 # ==========================
-# CONNEXION SQLITE
+# RÔLES AUTORISÉS
 # ==========================
-def get_connection():
-    """Retourne un objet connexion SQLite vers la base locale."""
-    return sqlite3.connect(DB_PATH)
+# Table query_roles : une ligne par (rôle, requête), source du filtrage par rôle.
+# La colonne queries.roles en garde une copie lisible, écrite dans la même transaction.
+def split_roles(roles: str) -> List[str]:
+    """ "Admin, Analyste" → ["Admin", "Analyste"] (sans doublon ni vide)."""
+    result = []
+    for role in (roles or "").split(","):
+        role = role.strip()
+        if role and role.lower() not in (r.lower() for r in result):
+            result.append(role)
+    return result
+
+
+def _write_roles(conn, query_id: int, roles: str):
+    conn.execute("DELETE FROM query_roles WHERE query_id = ?", (query_id,))
+    conn.executemany("INSERT INTO query_roles (role, query_id) VALUES (?, ?)",
+                     [(role, query_id) for role in split_roles(roles)])
 
 # ==========================
 # OUTILS POUR DB_CONNECTIONS
 # ==========================
 def get_all_db_connections() -> List[Dict[str, Any]]:
-    with get_connection() as conn:
-        conn.row_factory = sqlite3.Row  # Active l'accès par nom de colonne
+    return _copy(catalog_cache.cached("connections", "db_choices", _load_db_connections))
+
+
+def _load_db_connections() -> List[Dict[str, Any]]:
+    with reading() as conn:
         cur = conn.cursor()
+        cur.row_factory = sqlite3.Row  # Accès par nom de colonne (connexion partagée : curseur seulement)
         cur.execute("SELECT id, name, type as db_type FROM db_connections ORDER BY name ASC")
         return [dict(row) for row in cur.fetchall()]  # Conversion explicite
 
@@ -155,7 +151,10 @@ def validate_parameters(parameters: str) -> bool:
 # ==========================
 # CREATE
 # ==========================
-def add_query(name: str, sql_text: str, parameters: str, roles: str, db_id: int) -> bool:
+def add_query(name: str, sql_text: str, parameters: str, roles: str, db_id: int,
+              cache_ttl: Optional[int] = None, timeout_seconds: Optional[int] = None,
+              page_key: Optional[str] = None,
+              watermark_column: Optional[str] = None) -> bool:
     """
     Ajoute une nouvelle requête dans la table queries.
     """
@@ -169,14 +168,18 @@ def add_query(name: str, sql_text: str, parameters: str, roles: str, db_id: int)
         raise ValueError("Format des paramètres invalide. Utilisez: 'nom:type,nom2:type2' avec types: string, int, float, bool, date.")
     if not roles.strip():
         raise ValueError("Les rôles autorisés sont obligatoires.")
+    if (watermark_column or "").strip() and query_compiler.leading_keyword(sql_text) != "SELECT":
+        raise ValueError("L'extraction incrémentale nécessite une requête SELECT (sans CTE).")
 
-    with get_connection() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            INSERT INTO queries (name, sql_text, parameters, roles, db_id)
-            VALUES (?, ?, ?, ?, ?)
-        """, (name.strip(), sql_text.strip(), parameters.strip(), roles.strip(), db_id))
-        conn.commit()
+            INSERT INTO queries (name, sql_text, parameters, roles, db_id, cache_ttl, timeout_seconds, page_key,
+                                 watermark_column)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (name.strip(), sql_text.strip(), parameters.strip(), ",".join(split_roles(roles)), db_id, cache_ttl,
+              timeout_seconds, (page_key or "").strip() or None, (watermark_column or "").strip() or None))
+        _write_roles(conn, cursor.lastrowid, roles)
     return True
 
 # ==========================
@@ -186,21 +189,15 @@ def get_all_queries() -> List[Dict[str, Any]]:
     """
     Retourne la liste de toutes les requêtes enregistrées.
     """
-    with get_connection() as conn:
+    return _copy(catalog_cache.cached("queries", "all", _load_all_queries))
+
+
+def _load_all_queries() -> List[Dict[str, Any]]:
+    with reading() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id, name, sql_text, parameters, roles, db_id FROM queries")
+        cursor.execute(f"SELECT {QUERY_COLUMNS} FROM queries")
         rows = cursor.fetchall()
-        return [
-            {
-                "id": r[0],
-                "name": r[1],
-                "sql_text": r[2],
-                "parameters": r[3],
-                "roles": r[4],
-                "db_id": r[5]
-            }
-            for r in rows
-        ]
+        return [_row_to_query(r) for r in rows]
 
 # ==========================
 # READ - Récupère une requête par ID
@@ -209,29 +206,29 @@ def get_query_by_id(query_id: int) -> Optional[Dict[str, Any]]:
     """
     Retourne une requête spécifique en fonction de son ID.
     """
-    with get_connection() as conn:
+    return _copy(catalog_cache.cached("queries", ("id", query_id), lambda: _load_query(query_id)))
+
+
+def _load_query(query_id: int) -> Optional[Dict[str, Any]]:
+    with reading() as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, name, sql_text, parameters, roles, db_id
+        cursor.execute(f"""
+            SELECT {QUERY_COLUMNS}
             FROM queries
             WHERE id = ?
         """, (query_id,))
         row = cursor.fetchone()
         if row:
-            return {
-                "id": row[0],
-                "name": row[1],
-                "sql_text": row[2],
-                "parameters": row[3],
-                "roles": row[4],
-                "db_id": row[5]
-            }
+            return _row_to_query(row)
         return None
 
 # ==========================
 # UPDATE
 # ==========================
-def update_query(query_id: int, name: str, sql_text: str, parameters: str, roles: str, db_id: int) -> bool:
+def update_query(query_id: int, name: str, sql_text: str, parameters: str, roles: str, db_id: int,
+                 cache_ttl: Optional[int] = None, timeout_seconds: Optional[int] = None,
+                 page_key: Optional[str] = None,
+                 watermark_column: Optional[str] = None) -> bool:
     """
     Met à jour une requête existante.
     """
@@ -245,15 +242,23 @@ def update_query(query_id: int, name: str, sql_text: str, parameters: str, roles
         raise ValueError("Format des paramètres invalide. Utilisez: 'nom:type,nom2:type2' avec types: string, int, float, bool, date.")
     if not roles.strip():
         raise ValueError("Les rôles autorisés sont obligatoires.")
+    if (watermark_column or "").strip() and query_compiler.leading_keyword(sql_text) != "SELECT":
+        raise ValueError("L'extraction incrémentale nécessite une requête SELECT (sans CTE).")
 
-    with get_connection() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             UPDATE queries
-            SET name = ?, sql_text = ?, parameters = ?, roles = ?, db_id = ?
+            SET name = ?, sql_text = ?, parameters = ?, roles = ?, db_id = ?, cache_ttl = ?, timeout_seconds = ?,
+                page_key = ?, watermark_column = ?
             WHERE id = ?
-        """, (name.strip(), sql_text.strip(), parameters.strip(), roles.strip(), db_id, query_id))
-        conn.commit()
+        """, (name.strip(), sql_text.strip(), parameters.strip(), ",".join(split_roles(roles)), db_id, cache_ttl,
+              timeout_seconds, (page_key or "").strip() or None, (watermark_column or "").strip() or None,
+              query_id))
+        if cursor.rowcount > 0:
+            _write_roles(conn, query_id, roles)
+    result_cache.get_cache().invalidate_query(query_id)
+    query_compiler.invalidate(query_id)
     return cursor.rowcount > 0
 
 # ==========================
@@ -263,10 +268,13 @@ def delete_query(query_id: int) -> bool:
     """
     Supprime une requête en fonction de son ID.
     """
-    with get_connection() as conn:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute("DELETE FROM queries WHERE id = ?", (query_id,))
-        conn.commit()
+        conn.execute("DELETE FROM query_roles WHERE query_id = ?", (query_id,))
+    result_cache.get_cache().invalidate_query(query_id)
+    query_compiler.invalidate(query_id)
+    watermark_manager.delete_for_query(query_id)
     return cursor.rowcount > 0
 # ==========================
 # READ - Récupère les requêtes par ID de base de données
@@ -275,21 +283,42 @@ def get_queries_by_db_id(db_id: int) -> List[Dict[str, Any]]:
     """
     Retourne la liste des requêtes pour une base de données spécifique.
     """
-    with get_connection() as conn:
+    return _copy(catalog_cache.cached("queries", ("db", db_id), lambda: _load_queries_by_db(db_id)))
+
+
+def _load_queries_by_db(db_id: int) -> List[Dict[str, Any]]:
+    with reading() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id, name, sql_text, parameters, roles, db_id FROM queries WHERE db_id = ?", (db_id,))
+        cursor.execute(f"SELECT {QUERY_COLUMNS} FROM queries WHERE db_id = ?", (db_id,))
         rows = cursor.fetchall()
-        return [
-            {
-                "id": r[0],
-                "name": r[1],
-                "sql_text": r[2],
-                "parameters": r[3],
-                "roles": r[4],
-                "db_id": r[5]
-            }
-            for r in rows
-        ]
+        return [_row_to_query(r) for r in rows]
+
+# ==========================
+# READ - Liste légère des requêtes d'une base pour un rôle
+# ==========================
+def list_queries_for_role(db_id: int, role: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Identifiant et nom des requêtes d'une base accessibles au rôle (toutes si `role`
+    vaut None), triées par nom. Le SQL et les options ne sont pas lus : la requête
+    choisie est chargée ensuite avec get_query_by_id.
+    """
+    key = ("choices", db_id, role.lower() if role else None)  # Rôles comparés sans casse (COLLATE NOCASE)
+    return _copy(catalog_cache.cached("queries", key, lambda: _load_query_choices(db_id, role)))
+
+
+def _load_query_choices(db_id: int, role: Optional[str]) -> List[Dict[str, Any]]:
+    with reading() as conn:
+        if role is None:
+            rows = conn.execute("SELECT id, name FROM queries WHERE db_id = ? ORDER BY name", (db_id,)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT q.id, q.name
+                FROM query_roles r
+                JOIN queries q ON q.id = r.query_id
+                WHERE r.role = ? AND q.db_id = ?
+                ORDER BY q.name
+            """, (role, db_id)).fetchall()
+    return [{"id": r[0], "name": r[1]} for r in rows]
 # ==========================
 # TEST
 # ==========================
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================
+# CONFIGURATION DU CACHE
+# ==========================
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "0"))                            # Durée de vie par défaut (s), 0 = cache sur demande (cache_ttl de la requête)
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024   # Budget mémoire global
+
+
+class _CacheEntry:
+    def __init__(self, df, size, expires_at, query_id, conn_id):
+        self.df = df
+        self.size = size
+        self.expires_at = expires_at
+        self.query_id = query_id
+        self.conn_id = conn_id
+
+
+def _normalize_value(value):
+    """Représentation stable d'une valeur de paramètre (1 == 1.0, dates en ISO...)."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    return repr(value)
+
+
+def make_key(query: dict, params: dict):
+    """Clé : ID de requête, hash du SQL, ID de connexion et paramètres normalisés."""
+    sql_hash = hashlib.sha256(query["sql_text"].encode("utf-8")).hexdigest()
+    normalized = tuple(sorted((name, _normalize_value(v)) for name, v in (params or {}).items()))
+    return (query.get("id"), sql_hash, query["db_id"], normalized)
+
+
+class ResultCache:
+    """
+    Cache LRU de résultats (DataFrames) des requêtes prédéfinies.
+
+    Chaque entrée expire après la durée de vie de sa requête ; la taille totale
+    (memory_usage profond) est bornée par `max_bytes`, les entrées les moins
+    récemment utilisées étant évincées en premier.
+    """
+
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, default_ttl=RESULT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> _CacheEntry (ordre = récence d'utilisation)
+        self._size = 0
+        self._stats = {"hits": 0, "misses": 0, "evicted": 0, "expired": 0}
+
+    def ttl_for(self, query: dict) -> int:
+        """Durée de vie de la requête (colonne cache_ttl), ou valeur globale par défaut."""
+        ttl = query.get("cache_ttl")
+        return self.default_ttl if ttl is None else int(ttl)
+
+    # --------------------------
+    # Lecture / écriture
+    # --------------------------
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            # Copie superficielle : les attrs/colonnes de l'appelant n'altèrent pas l'entrée
+            return entry.df.copy(deep=False)
+
+    def put(self, key, df, ttl):
+        if ttl <= 0:
+            return False
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return False  # Résultat plus gros que le budget entier : inutile de vider le cache
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self._size + size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evicted"] += 1
+            self._entries[key] = _CacheEntry(df, size, time.monotonic() + ttl, key[0], key[2])
+            self._size += size
+        return True
+
+    # --------------------------
+    # Invalidation
+    # --------------------------
+    def invalidate_query(self, query_id):
+        """Après update_query/delete_query."""
+        self._invalidate(lambda entry: entry.query_id == query_id)
+
+    def invalidate_connection(self, conn_id):
+        """Après update_connection/delete_connection."""
+        self._invalidate(lambda entry: entry.conn_id == conn_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._size
+            return stats
+
+    # --------------------------
+    # Outils internes
+    # --------------------------
+    def _invalidate(self, predicate):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if predicate(entry)]:
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+
+# Cache unique partagé par toutes les sessions Streamlit du processus
+_cache = ResultCache()
+
+
+def get_cache() -> ResultCache:
+    return _cache
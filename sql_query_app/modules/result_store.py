@@ -0,0 +1,368 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as pq
+except ImportError:  # Sans pyarrow, les résultats restent en mémoire
+    pa = None
+    pq = None
+
+load_dotenv()
+
+# ==========================
+# CONFIGURATION DU DÉBORDEMENT SUR DISQUE
+# ==========================
+RESULT_SPILL_BYTES = int(os.getenv("RESULT_SPILL_MB", "200")) * 1024 * 1024          # Au-delà, le résultat part sur disque (0 = jamais)
+RESULT_SPILL_DIR = os.getenv("RESULT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "sql_query_app_results"))
+RESULT_SPILL_FORMAT = os.getenv("RESULT_SPILL_FORMAT", "arrow").lower()             # "arrow" (IPC, mmap) ou "parquet"
+RESULT_SPILL_TTL = int(os.getenv("RESULT_SPILL_TTL", os.getenv("JOB_RESULT_TTL", "1800")))  # Conservation (s) d'un fichier
+SESSION_SPILL_QUOTA = int(os.getenv("SESSION_SPILL_QUOTA_MB", "2048")) * 1024 * 1024  # Disque max par session
+SPILL_JANITOR_INTERVAL = int(os.getenv("SPILL_JANITOR_INTERVAL", "300"))           # Période (s) du nettoyage
+
+_EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+class SpillQuotaError(Exception):
+    """Le quota disque de la session ne permet pas de conserver le résultat."""
+
+
+class SpilledResult:
+    """
+    Résultat conservé dans un fichier Arrow IPC ou Parquet, relu en mémoire mappée.
+
+    S'utilise comme un flux de lots (`for chunk in result`) pour les exports, et
+    expose `head(n)` pour l'affichage ; `to_dataframe()` recharge tout en mémoire.
+    """
+
+    def __init__(self, path: str, fmt: str, owner: str, columns: List[str], row_count: int,
+                 attrs: Optional[dict] = None):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.format = fmt
+        self.owner = owner
+        self.columns = columns
+        self.row_count = row_count
+        self.attrs = dict(attrs or {})
+        self.size_bytes = os.path.getsize(path)
+        self.created_at = time.time()
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    @property
+    def empty(self) -> bool:
+        return self.row_count == 0
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(self.path)
+
+    @property
+    def arrow_types(self) -> List:
+        """Type Arrow de chaque colonne, lu dans le schéma du fichier (exports)."""
+        if self.format == "parquet":
+            return list(pq.read_schema(self.path).types)
+        with pa.memory_map(self.path, "r") as source:
+            return list(pa.ipc.open_file(source).schema.types)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        if self.format == "parquet":
+            parquet_file = pq.ParquetFile(self.path, memory_map=True)
+            for batch in parquet_file.iter_batches():
+                yield self._to_frame(batch)
+            return
+        with pa.memory_map(self.path, "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield self._to_frame(reader.get_batch(i))
+
+    def head(self, n: int) -> pd.DataFrame:
+        """Les `n` premières lignes, sans lire le reste du fichier."""
+        frames, count = [], 0
+        for chunk in self:
+            frames.append(chunk.head(n - count))
+            count += len(frames[-1])
+            if count >= n:
+                break
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        frames = list(self)
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df.attrs.update(self.attrs)
+        return df
+
+    def release(self):
+        """Supprime le fichier et libère le quota de la session."""
+        get_store().release(self.id)
+
+    def _to_frame(self, batch) -> pd.DataFrame:
+        df = batch.to_pandas()
+        df.columns = self.columns
+        return df
+
+
+class SpillWriter:
+    """
+    Reçoit les lots d'un résultat : ils restent en mémoire tant que leur taille
+    cumulée ne dépasse pas le seuil, puis tout est écrit sur disque au fil de l'eau.
+    """
+
+    def __init__(self, store: "ResultStore", owner: str, columns: List[str], arrow_types: Optional[List] = None):
+        self.store = store
+        self.owner = owner
+        self.columns = columns
+        self.arrow_types = arrow_types or [None] * len(columns)
+        self.row_count = 0
+        self.path = None
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._schema = None
+        self._writer = None
+        self._spillable = len(set(columns)) == len(columns)  # Noms en double : pas de fichier
+
+    def add(self, chunk: pd.DataFrame):
+        self.row_count += len(chunk)
+        if self._writer is not None:
+            self._write(chunk)
+            return
+        self._buffer.append(chunk)
+        self._buffered_bytes += int(chunk.memory_usage(deep=True).sum())
+        if self._spillable and self.store.threshold and self._buffered_bytes > self.store.threshold:
+            self._open()
+            buffered, self._buffer = self._buffer, []
+            for part in buffered:
+                self._write(part)
+
+    def finish(self, attrs: Optional[dict] = None):
+        """DataFrame si le seuil n'a pas été atteint, SpilledResult sinon."""
+        if self._writer is None:
+            if not self._buffer:
+                df = pd.DataFrame(columns=self.columns)
+            else:
+                df = pd.concat(self._buffer, ignore_index=True) if len(self._buffer) > 1 else self._buffer[0]
+            self._buffer = []
+            df.attrs.update(attrs or {})
+            return df
+        self._writer.close()
+        self._writer = None
+        attrs = dict(attrs or {})
+        attrs["spilled"] = True
+        result = SpilledResult(self.path, self.store.format, self.owner, self.columns, self.row_count, attrs)
+        self.store.register(result)
+        return result
+
+    def abort(self):
+        """Abandon (erreur, annulation) : le fichier partiel est supprimé."""
+        self._buffer = []
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.store.unreserve(self)
+
+    # --------------------------
+    # Outils internes
+    # --------------------------
+    def _open(self):
+        first = self._buffer[0]
+        schema = pa.Schema.from_pandas(first, preserve_index=False)
+        for i, arrow_type in enumerate(self.arrow_types):
+            if arrow_type is not None:
+                schema = schema.set(i, pa.field(self.columns[i], arrow_type))
+            elif schema.field(i).type == pa.null():
+                # Colonne vide dans le premier lot : type inconnu, conservée en texte
+                schema = schema.set(i, pa.field(self.columns[i], pa.string()))
+        self._schema = schema.remove_metadata()
+        self.path = self.store.new_path()
+        if self.store.format == "parquet":
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(self.path, self._schema)
+        self.store.reserve(self)
+
+    def _write(self, chunk: pd.DataFrame):
+        table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False, safe=False)
+        self._writer.write_table(table)
+        self.store.check_quota(self)
+
+
+class ResultStore:
+    """
+    Fichiers de résultats débordés sur disque, avec un quota par session et un
+    nettoyage périodique (thread « janitor ») des fichiers expirés.
+    """
+
+    def __init__(self, directory=RESULT_SPILL_DIR, fmt=RESULT_SPILL_FORMAT, threshold=RESULT_SPILL_BYTES,
+                 session_quota=SESSION_SPILL_QUOTA, ttl=RESULT_SPILL_TTL, janitor_interval=SPILL_JANITOR_INTERVAL):
+        self.directory = directory
+        self.format = fmt if fmt in _EXTENSIONS else "arrow"
+        self.threshold = threshold
+        self.session_quota = session_quota
+        self.ttl = ttl
+        self.janitor_interval = janitor_interval
+        self._lock = threading.Lock()
+        self._results: Dict[str, SpilledResult] = {}
+        self._writing: Dict[int, SpillWriter] = {}  # Écritures en cours (comptées dans le quota)
+        self._janitor = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return pa is not None and self.threshold > 0
+
+    def open_writer(self, owner: str, columns: List[str], arrow_types: Optional[List] = None) -> SpillWriter:
+        self._start_janitor()
+        return SpillWriter(self, owner, columns, arrow_types)
+
+    def new_path(self) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f"{uuid.uuid4().hex}{_EXTENSIONS[self.format]}")
+
+    # --------------------------
+    # Quotas
+    # --------------------------
+    def usage(self, owner: str) -> int:
+        """Octets occupés sur disque par une session (résultats et écritures en cours)."""
+        with self._lock:
+            done = sum(r.size_bytes for r in self._results.values() if r.owner == owner)
+            writing = [w.path for w in self._writing.values() if w.owner == owner]
+        return done + sum(_file_size(path) for path in writing)
+
+    def reserve(self, writer: SpillWriter):
+        with self._lock:
+            self._writing[id(writer)] = writer
+
+    def unreserve(self, writer: SpillWriter):
+        with self._lock:
+            self._writing.pop(id(writer), None)
+
+    def check_quota(self, writer: SpillWriter):
+        """Libère les plus anciens résultats de la session, puis refuse si le quota reste dépassé."""
+        if not self.session_quota:
+            return
+        while self.usage(writer.owner) > self.session_quota:
+            with self._lock:
+                own = sorted((r for r in self._results.values() if r.owner == writer.owner),
+                             key=lambda r: r.created_at)
+            if not own:
+                writer.abort()
+                raise SpillQuotaError(
+                    f"Résultat trop volumineux : quota disque de la session dépassé "
+                    f"({self.session_quota // (1024 * 1024)} Mo)")
+            self.release(own[0].id)
+
+    # --------------------------
+    # Résultats enregistrés
+    # --------------------------
+    def register(self, result: SpilledResult):
+        with self._lock:
+            self._writing = {k: w for k, w in self._writing.items() if w.path != result.path}
+            self._results[result.id] = result
+
+    def get(self, result_id: str) -> Optional[SpilledResult]:
+        with self._lock:
+            return self._results.get(result_id)
+
+    def release(self, result_id: str):
+        with self._lock:
+            result = self._results.pop(result_id, None)
+        if result is not None:
+            _remove(result.path)
+
+    def release_owner(self, owner: str):
+        with self._lock:
+            ids = [r.id for r in self._results.values() if r.owner == owner]
+        for result_id in ids:
+            self.release(result_id)
+
+    def purge_expired(self) -> int:
+        """Supprime les résultats expirés et les fichiers orphelins (processus précédents)."""
+        now = time.time()
+        with self._lock:
+            expired = [r.id for r in self._results.values() if now - r.created_at > self.ttl]
+            known = {r.path for r in self._results.values()} | {w.path for w in self._writing.values()}
+        for result_id in expired:
+            self.release(result_id)
+        removed = len(expired)
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if path not in known and now - _file_mtime(path) > self.ttl:
+                    _remove(path)
+                    removed += 1
+        return removed
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            results = list(self._results.values())
+        return {
+            "results": len(results),
+            "size_mb": round(sum(r.size_bytes for r in results) / (1024 * 1024), 2),
+            "sessions": len({r.owner for r in results}),
+            "format": self.format,
+            "directory": self.directory,
+        }
+
+    # --------------------------
+    # Nettoyage périodique
+    # --------------------------
+    def _start_janitor(self):
+        with self._lock:
+            if self._janitor is not None:
+                return
+            self._janitor = threading.Thread(target=self._janitor_loop, name="result-janitor", daemon=True)
+        self._janitor.start()
+
+    def _janitor_loop(self):
+        while not self._stop.wait(self.janitor_interval):
+            try:
+                self.purge_expired()
+            except OSError:
+                pass  # Fichier verrouillé ou déjà supprimé : nouvel essai au prochain passage
+
+
+def _file_size(path: Optional[str]) -> int:
+    try:
+        return os.path.getsize(path) if path else 0
+    except OSError:
+        return 0
+
+
+def _file_mtime(path: str) -> float:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return time.time()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Sous Windows, un fichier encore mappé sera supprimé au prochain passage
+
+
+# Magasin unique partagé par toutes les sessions Streamlit du processus
+_store = ResultStore()
+
+
+def get_store() -> ResultStore:
+    return _store
@@ -0,0 +1,188 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from modules import cron
+from modules.metadata_store import reading, transaction
+
+# ==========================
+# CONFIGURATION
+# ==========================
+SCHEDULE_JITTER = int(os.getenv("SCHEDULE_JITTER", "300"))  # Décalage aléatoire max (s) ajouté à chaque échéance
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"                            # Même format que la table logs
+
+RUN_RUNNING = "running"
+RUN_SUCCESS = "success"
+RUN_ERROR = "error"
+
+SCHEDULE_FIELDS = ["id", "query_id", "cron", "parameters", "output_format", "destination",
+                   "enabled", "created_by", "next_run_at", "last_run_at"]
+SCHEDULE_COLUMNS = ", ".join(SCHEDULE_FIELDS)
+
+
+def _row_to_schedule(row) -> Dict[str, Any]:
+    schedule = dict(zip(SCHEDULE_FIELDS, row))
+    schedule["parameters"] = json.loads(schedule["parameters"] or "{}")
+    return schedule
+
+# ==========================
+# ÉCHÉANCES
+# ==========================
+def compute_next_run(expression: str, after: Optional[datetime] = None, jitter: int = SCHEDULE_JITTER) -> str:
+    """
+    Prochaine échéance cron après `after`, décalée d'un délai aléatoire dans
+    [0, jitter] secondes : les extractions prévues à la même heure sont étalées.
+    """
+    moment = cron.CronExpression(expression).next_after(after or datetime.now())
+    if jitter > 0:
+        moment += timedelta(seconds=random.randint(0, jitter))
+    return moment.strftime(TIME_FORMAT)
+
+
+def _validate(query_id, expression: str, output_format: str, destination: str, formats: List[str]):
+    if not query_id:
+        raise ValueError("La requête est obligatoire.")
+    if not cron.validate(expression):
+        raise ValueError("Expression cron invalide (5 champs : minute heure jour mois jour-semaine).")
+    if output_format not in formats:
+        raise ValueError(f"Format de sortie inconnu : {output_format}")
+    if not destination.strip():
+        raise ValueError("Le dossier de destination est obligatoire.")
+
+# ==========================
+# CRUD
+# ==========================
+def add_schedule(query_id: int, expression: str, parameters: dict, output_format: str, destination: str,
+                 formats: List[str], created_by: str, enabled: bool = True) -> int:
+    _validate(query_id, expression, output_format, destination, formats)
+    with transaction() as conn:
+        cursor = conn.execute("""
+            INSERT INTO schedules (query_id, cron, parameters, output_format, destination, enabled,
+                                   created_by, next_run_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (query_id, expression.strip(), json.dumps(parameters or {}, default=str), output_format,
+              destination.strip(), int(enabled), created_by, compute_next_run(expression)))
+        return cursor.lastrowid
+
+
+def update_schedule(schedule_id: int, query_id: int, expression: str, parameters: dict, output_format: str,
+                    destination: str, formats: List[str], enabled: bool = True) -> bool:
+    _validate(query_id, expression, output_format, destination, formats)
+    with transaction() as conn:
+        cursor = conn.execute("""
+            UPDATE schedules
+            SET query_id = ?, cron = ?, parameters = ?, output_format = ?, destination = ?, enabled = ?,
+                next_run_at = ?
+            WHERE id = ?
+        """, (query_id, expression.strip(), json.dumps(parameters or {}, default=str), output_format,
+              destination.strip(), int(enabled), compute_next_run(expression), schedule_id))
+        return cursor.rowcount > 0
+
+
+def set_enabled(schedule_id: int, enabled: bool) -> bool:
+    with transaction() as conn:
+        row = conn.execute("SELECT cron FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+        if not row:
+            return False
+        # Réactivation : l'échéance repart de maintenant (pas de rattrapage des exécutions manquées)
+        conn.execute("UPDATE schedules SET enabled = ?, next_run_at = ? WHERE id = ?",
+                     (int(enabled), compute_next_run(row[0]), schedule_id))
+        return True
+
+
+def run_now(schedule_id: int) -> bool:
+    """Avance l'échéance à maintenant : le worker la prendra à son prochain passage."""
+    with transaction() as conn:
+        cursor = conn.execute("UPDATE schedules SET next_run_at = ? WHERE id = ?",
+                              (datetime.now().strftime(TIME_FORMAT), schedule_id))
+        return cursor.rowcount > 0
+
+
+def delete_schedule(schedule_id: int) -> bool:
+    with transaction() as conn:
+        cursor = conn.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
+        return cursor.rowcount > 0
+
+
+def get_all_schedules() -> List[Dict[str, Any]]:
+    with reading() as conn:
+        rows = conn.execute(f"SELECT {SCHEDULE_COLUMNS} FROM schedules ORDER BY next_run_at").fetchall()
+    return [_row_to_schedule(r) for r in rows]
+
+
+def get_schedule_by_id(schedule_id: int) -> Optional[Dict[str, Any]]:
+    with reading() as conn:
+        row = conn.execute(f"SELECT {SCHEDULE_COLUMNS} FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+    return _row_to_schedule(row) if row else None
+
+# ==========================
+# PRISE EN CHARGE PAR LE WORKER
+# ==========================
+def claim_due_schedules(now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Échéances atteintes, réservées atomiquement : la prochaine échéance n'est avancée
+    que si elle n'a pas changé entre-temps, un même créneau n'est donc exécuté qu'une
+    fois même si plusieurs processus font tourner le planificateur.
+    """
+    now = now or datetime.now()
+    now_text = now.strftime(TIME_FORMAT)
+    with transaction() as conn:
+        rows = conn.execute(f"""
+            SELECT {SCHEDULE_COLUMNS} FROM schedules
+            WHERE enabled = 1 AND next_run_at IS NOT NULL AND next_run_at <= ?
+            ORDER BY next_run_at
+        """, (now_text,)).fetchall()
+        claimed = []
+        for row in rows:
+            schedule = _row_to_schedule(row)
+            try:
+                next_run = compute_next_run(schedule["cron"], now)
+            except ValueError:
+                next_run = None  # Expression devenue impossible : la planification s'arrête
+            cursor = conn.execute("""
+                UPDATE schedules SET next_run_at = ?, last_run_at = ?
+                WHERE id = ? AND next_run_at = ?
+            """, (next_run, now_text, schedule["id"], schedule["next_run_at"]))
+            if cursor.rowcount == 1:
+                claimed.append(schedule)
+    return claimed
+
+# ==========================
+# HISTORIQUE DES EXÉCUTIONS
+# ==========================
+def start_run(schedule: Dict[str, Any]) -> int:
+    with transaction() as conn:
+        cursor = conn.execute("""
+            INSERT INTO schedule_runs (schedule_id, query_id, scheduled_for, started_at, status)
+            VALUES (?, ?, ?, ?, ?)
+        """, (schedule["id"], schedule["query_id"], schedule["next_run_at"],
+              datetime.now().strftime(TIME_FORMAT), RUN_RUNNING))
+        return cursor.lastrowid
+
+
+def finish_run(run_id: int, status: str, duration: float, row_count: Optional[int] = None,
+               file_path: Optional[str] = None, message: str = ""):
+    with transaction() as conn:
+        conn.execute("""
+            UPDATE schedule_runs
+            SET finished_at = ?, duration = ?, status = ?, row_count = ?, file_path = ?, message = ?
+            WHERE id = ?
+        """, (datetime.now().strftime(TIME_FORMAT), round(duration, 2), status, row_count, file_path,
+              message, run_id))
+
+
+def get_runs(schedule_id: Optional[int] = None, limit: int = 200) -> List[Dict[str, Any]]:
+    fields = ["id", "schedule_id", "query_id", "scheduled_for", "started_at", "finished_at",
+              "duration", "status", "row_count", "file_path", "message"]
+    sql = f"SELECT {', '.join(fields)} FROM schedule_runs"
+    params: list = []
+    if schedule_id is not None:
+        sql += " WHERE schedule_id = ?"
+        params.append(schedule_id)
+    sql += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with reading() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(zip(fields, r)) for r in rows]
@@ -1,9 +1,8 @@
 import sqlite3
 import re
 import bcrypt
-import os
-
-DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'app.db')
+from modules import catalog_cache
+from modules.metadata_store import get_connection, transaction
 
 ROLES = {"Admin", "Analyste", "Utilisateur"}
 ACTIVE_STATES = {"is_active": 1, "not_active": 0}
@@ -38,34 +37,34 @@ def validate_is_active(is_active):
         return False, "Le statut doit être Actif (1) ou Inactif (0)."
     return True, ""
 
-# --- DB UTILS ---
-def get_db_conn():
-    return sqlite3.connect(DB_PATH)
-
 # --- CRUD ---
+# Lectures de la liste servies par catalog_cache (tuples immuables, liste copiée)
 def get_all_users():
-    conn = get_db_conn()
-    cur = conn.cursor()
+    return list(catalog_cache.cached("users", "all", _load_all_users))
+
+def _load_all_users():
+    cur = get_connection().cursor()
     cur.execute("SELECT id, username, role, is_active, email FROM users ORDER BY id ASC")
-    users = cur.fetchall()
-    conn.close()
-    return users
+    return cur.fetchall()
+
+def get_user_by_id(user_id):
+    """Même colonnes que get_all_users (sans le mot de passe) ; None si introuvable."""
+    return catalog_cache.cached("users", ("id", user_id), lambda: _load_user(user_id))
+
+def _load_user(user_id):
+    cur = get_connection().cursor()
+    cur.execute("SELECT id, username, role, is_active, email FROM users WHERE id = ?", (user_id,))
+    return cur.fetchone()
 
 def get_user_by_username(username):
-    conn = get_db_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT * FROM users WHERE username = ?", (username,))
-    user = cur.fetchone()
-    conn.close()
-    return user
+    return cur.fetchone()
 
 def get_user_by_email(email):
-    conn = get_db_conn()
-    cur = conn.cursor()
+    cur = get_connection().cursor()
     cur.execute("SELECT * FROM users WHERE email = ?", (email,))
-    user = cur.fetchone()
-    conn.close()
-    return user
+    return cur.fetchone()
 
 def add_user(username, password, role, is_active, email):
     # Vérifier que tous les champs sont fournis
@@ -104,14 +103,11 @@ def add_user(username, password, role, is_active, email):
     hashed_password = bcrypt.hashpw(password.encode(), salt)  # Garder en bytes
     
     try:
-        conn = get_db_conn()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO users (username, password, role, is_active, email)
-            VALUES (?, ?, ?, ?, ?)
-        """, (username, hashed_password, role, is_active, email))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute("""
+                INSERT INTO users (username, password, role, is_active, email)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, hashed_password, role, is_active, email))
         return True, "Utilisateur ajouté avec succès."
     except sqlite3.IntegrityError:
         return False, "Erreur d'intégrité : doublon ou contrainte non respectée."
@@ -128,28 +124,22 @@ def update_user(user_id, fields_to_update):
         ok, msg = validate_username(fields_to_update["username"])
         if not ok:
             return False, msg
-        conn = get_db_conn()
-        cur = conn.cursor()
+        cur = get_connection().cursor()
         cur.execute("SELECT id FROM users WHERE username = ? AND id != ?", 
                    (fields_to_update["username"], user_id))
         if cur.fetchone():
-            conn.close()
             return False, "Ce nom d'utilisateur existe déjà."
-        conn.close()
 
     # Validation email si modifié
     if "email" in fields_to_update:
         ok, msg = validate_email(fields_to_update["email"])
         if not ok:
             return False, msg
-        conn = get_db_conn()
-        cur = conn.cursor()
+        cur = get_connection().cursor()
         cur.execute("SELECT id FROM users WHERE email = ? AND id != ?", 
                    (fields_to_update["email"], user_id))
         if cur.fetchone():
-            conn.close()
             return False, "Cette adresse email est déjà utilisée."
-        conn.close()
 
     # Hachage password si modifié
     if "password" in fields_to_update and fields_to_update["password"]:
@@ -191,11 +181,8 @@ def update_user(user_id, fields_to_update):
     values.append(user_id)
 
     try:
-        conn = get_db_conn()
-        cur = conn.cursor()
-        cur.execute(f"UPDATE users SET {', '.join(sets)} WHERE id = ?", tuple(values))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute(f"UPDATE users SET {', '.join(sets)} WHERE id = ?", tuple(values))
         return True, "Utilisateur modifié avec succès."
     except sqlite3.IntegrityError:
         return False, "Erreur d'intégrité : doublon ou contrainte non respectée."
@@ -206,11 +193,8 @@ def delete_user(user_id, current_admin_id):
     if user_id == current_admin_id:
         return False, "Vous ne pouvez pas supprimer votre propre compte."
     try:
-        conn = get_db_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
         return True, "Utilisateur supprimé avec succès."
     except Exception as e:
         return False, f"Erreur lors de la suppression : {str(e)}"
\ No newline at end of file
@@ -0,0 +1,114 @@
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from modules.metadata_store import reading, transaction
+
+# ==========================
+# CONFIGURATION
+# ==========================
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # Même format que la table logs
+
+# ==========================
+# PORTÉES
+# ==========================
+# Un point de reprise est propre à une requête ET à un consommateur : deux utilisateurs
+# (ou un utilisateur et une planification) ne se volent pas leurs nouvelles lignes.
+def user_scope(username: str) -> str:
+    return f"user:{username}"
+
+
+def schedule_scope(schedule_id: int) -> str:
+    return f"schedule:{schedule_id}"
+
+# ==========================
+# SÉRIALISATION DES VALEURS
+# ==========================
+# La valeur est relue avec son type d'origine : elle est liée telle quelle à la
+# requête (comparaison native côté serveur, pas de conversion implicite).
+def _serialize(value: Any):
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()  # Scalaire numpy → Python
+    if isinstance(value, bool):
+        return str(int(value)), "int"
+    if isinstance(value, int):
+        return str(value), "int"
+    if isinstance(value, Decimal):
+        return str(value), "decimal"
+    if isinstance(value, float):
+        return repr(value), "float"
+    if isinstance(value, datetime):
+        return value.isoformat(), "datetime"
+    if isinstance(value, date):
+        return value.isoformat(), "date"
+    return str(value), "string"
+
+
+def _deserialize(text: str, value_type: str) -> Any:
+    if value_type == "int":
+        return int(text)
+    if value_type == "decimal":
+        return Decimal(text)
+    if value_type == "float":
+        return float(text)
+    if value_type == "datetime":
+        return datetime.fromisoformat(text)
+    if value_type == "date":
+        return date.fromisoformat(text)
+    return text
+
+# ==========================
+# LECTURE / ÉCRITURE
+# ==========================
+def get_watermark(query_id: int, scope: str, column: str) -> Optional[Any]:
+    """
+    Dernière valeur de `column` extraite pour ce consommateur ; None si aucune
+    extraction n'a encore eu lieu ou si la colonne de la requête a changé depuis.
+    """
+    with reading() as conn:
+        row = conn.execute("""
+            SELECT value, value_type FROM watermarks
+            WHERE query_id = ? AND scope = ? AND column_name = ?
+        """, (query_id, scope, column)).fetchone()
+    return _deserialize(*row) if row else None
+
+
+def set_watermark(query_id: int, scope: str, column: str, value: Any):
+    text, value_type = _serialize(value)
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO watermarks (query_id, scope, column_name, value, value_type, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (query_id, scope) DO UPDATE SET
+                column_name = excluded.column_name, value = excluded.value,
+                value_type = excluded.value_type, updated_at = excluded.updated_at
+        """, (query_id, scope, column, text, value_type, datetime.now().strftime(TIME_FORMAT)))
+
+
+def reset_watermark(query_id: int, scope: str) -> bool:
+    """Oublie le point de reprise : la prochaine extraction repart de zéro."""
+    with transaction() as conn:
+        cursor = conn.execute("DELETE FROM watermarks WHERE query_id = ? AND scope = ?", (query_id, scope))
+        return cursor.rowcount > 0
+
+
+def delete_for_query(query_id: int):
+    with transaction() as conn:
+        conn.execute("DELETE FROM watermarks WHERE query_id = ?", (query_id,))
+
+
+def get_watermarks(query_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    fields = ["query_id", "scope", "column_name", "value", "value_type", "updated_at"]
+    sql = f"SELECT {', '.join(fields)} FROM watermarks"
+    params: list = []
+    if query_id is not None:
+        sql += " WHERE query_id = ?"
+        params.append(query_id)
+    sql += " ORDER BY query_id, scope"
+    with reading() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(zip(fields, r)) for r in rows]
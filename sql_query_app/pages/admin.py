@@ -31,7 +31,7 @@ if st.session_state.user_mode in ("add", "edit"):
     # Valeurs par défaut
     if is_edit:
         user_id = st.session_state.edit_user_id
-        user = next((u for u in user_manager.get_all_users() if u[0] == user_id), None)
+        user = user_manager.get_user_by_id(user_id)
         if not user:
             st.error("Utilisateur introuvable.")
             st.session_state.user_mode = None
@@ -3,7 +3,7 @@ import pandas as pd
 from modules.auth import require_login
 from modules.db_connection import (
     add_connection, update_connection, delete_connection,
-    get_all_connections, get_connection_info, test_connection
+    get_all_connections, get_connection_info, test_connection, get_pool_stats
 )
 
 # Configuration de la page
@@ -190,4 +190,18 @@ if st.session_state.connection_mode is None:
                     else:
                         st.error(msg)
                 
-                st.divider()
\ No newline at end of file
+                st.divider()
+
+# --- STATISTIQUES DU POOL DE CONNEXIONS ---
+if st.session_state.connection_mode is None:
+    with st.expander("📈 Statistiques du pool de connexions"):
+        stats = get_pool_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Hits", stats["hits"])
+        col2.metric("Misses", stats["misses"])
+        col3.metric("Taux de réutilisation", f"{stats['hit_ratio'] * 100:.1f} %")
+        col4.metric("Attente moyenne", f"{stats['avg_wait'] * 1000:.0f} ms")
+        st.write(f"**Attentes:** {stats['waits']} – **Délais dépassés:** {stats['timeouts']} – "
+                 f"**Évictions:** {stats['evicted']} – **Rejetées:** {stats['discarded']}")
+        st.write("**Connexions inactives par base:**", stats["idle"])
+        st.write("**Connexions empruntées par base:**", stats["in_use"])
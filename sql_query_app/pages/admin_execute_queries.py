@@ -1,6 +1,6 @@
 import streamlit as st
-from utils import query_executor
-from modules import db_connection
+from utils import query_executor, result_view
+from modules import db_connection, result_cache, result_store
 import pandas as pd
 from datetime import datetime
 
@@ -49,9 +49,10 @@ if not queries:
 # Sélection de la requête
 # ==============================
 st.header("2. Sélection de la requête")
-query_names = {q["name"]: q for q in queries}
-selected_name = st.selectbox("Choisissez une requête à exécuter :", list(query_names.keys()))
-selected_query = query_names[selected_name]
+# Liste légère (id, nom) ; le SQL n'est chargé que pour la requête choisie
+query_names = {q["id"]: q["name"] for q in queries}
+selected_id = st.selectbox("Choisissez une requête à exécuter :", list(query_names.keys()), format_func=query_names.get)
+selected_query = query_executor.load_query(selected_id)
 
 # Affichage des détails de la requête
 with st.expander("📋 Détails de la requête sélectionnée"):
@@ -95,53 +96,40 @@ else:
 # ==============================
 st.header("3. Exécution et résultats")
 if st.button("🚀 Exécuter la requête", type="primary", use_container_width=True):
-    with st.spinner("Exécution en cours..."):
-        df = query_executor.execute_query(selected_query, params)
-        
-        if df is not None:
-            if not df.empty:
-                st.success(f"✅ Requête exécutée avec succès! {len(df)} ligne(s) retournée(s).")
-                
-                # Affichage des résultats
-                st.dataframe(df, use_container_width=True)
-                
-                # Métriques rapides
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Lignes retournées", len(df))
-                with col2:
-                    st.metric("Colonnes", len(df.columns))
-                with col3:
-                    st.metric("Taille", f"{df.memory_usage(deep=True).sum() / 1024:.2f} Ko")
-                
-                # Options d'export
-                st.header("4. Export des résultats")
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename_base = f"{selected_name.replace(' ', '_')}_{timestamp}"
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    csv_data = query_executor.export_csv(df)
-                    st.download_button(
-                        label="💾 Télécharger en CSV",
-                        data=csv_data,
-                        file_name=f"{filename_base}.csv",
-                        mime="text/csv",
-                        use_container_width=True
-                    )
-                with col2:
-                    excel_data = query_executor.export_excel(df)
-                    st.download_button(
-                        label="📊 Télécharger en Excel",
-                        data=excel_data,
-                        file_name=f"{filename_base}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-            else:
-                st.warning("⚠️ La requête s'est exécutée mais n'a retourné aucun résultat.")
-        else:
-            st.error("❌ Erreur lors de l'exécution de la requête. Veuillez vérifier les logs pour plus de détails.")
+    result_view.submit_job("admin_job", selected_query, params)
+
+# Mode lot : mêmes paramètres, plusieurs valeurs
+result_view.render_batch_form("admin_job", selected_query, param_list)
+
+# Exécution multi-bases : même requête, plusieurs connexions
+result_view.render_fanout_form("admin_job", selected_query, params, connection_map)
+
+# Suivi de l'exécution en arrière-plan (progression, annulation, résultat)
+result_view.render_job("admin_job", show_size=True)
+
+# ==============================
+# Statistiques du cache de résultats
+# ==============================
+with st.expander("♻️ Cache des résultats"):
+    cache_stats = result_cache.get_cache().get_stats()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hits", cache_stats["hits"])
+    col2.metric("Misses", cache_stats["misses"])
+    col3.metric("Taux de succès", f"{cache_stats['hit_ratio'] * 100:.1f} %")
+    col4.metric("Mémoire utilisée", f"{cache_stats['bytes'] / (1024 * 1024):.1f} Mo")
+    st.write(f"**Entrées:** {cache_stats['entries']} – **Évictions:** {cache_stats['evicted']} – "
+             f"**Expirations:** {cache_stats['expired']}")
+
+# ==============================
+# Résultats conservés sur disque
+# ==============================
+with st.expander("💽 Résultats débordés sur disque"):
+    store_stats = result_store.get_store().get_stats()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Résultats", store_stats["results"])
+    col2.metric("Espace utilisé", f"{store_stats['size_mb']:.1f} Mo")
+    col3.metric("Sessions", store_stats["sessions"])
+    st.write(f"**Format:** {store_stats['format']} – **Répertoire:** `{store_stats['directory']}`")
 
 # ==============================
 # Informations de débogage (pour admin)
@@ -75,12 +75,20 @@ if st.session_state.query_mode in ("add", "edit"):
         default_params = query["parameters"]
         default_roles = query["roles"].split(",") if query["roles"] else []
         default_db_id = query["db_id"]
+        default_cache_ttl = query.get("cache_ttl")
+        default_timeout = query.get("timeout_seconds")
+        default_page_key = query.get("page_key") or ""
+        default_watermark = query.get("watermark_column") or ""
     else:
         default_name = ""
         default_sql = ""
         default_params = ""
         default_roles = []
         default_db_id = None
+        default_cache_ttl = None
+        default_timeout = None
+        default_page_key = ""
+        default_watermark = ""
 
     with st.form("query_form", clear_on_submit=False):
         name = st.text_input("Nom de la requête*", value=default_name)
@@ -91,6 +99,30 @@ if st.session_state.query_mode in ("add", "edit"):
             ["Admin", "Analyste", "Utilisateur"],
             default=default_roles
         )
+        cache_ttl = st.number_input(
+            "Durée de cache des résultats (secondes)",
+            min_value=0, step=60, value=default_cache_ttl,
+            help="Vide = durée par défaut (RESULT_CACHE_TTL, 0 sauf configuration), 0 = jamais mis en cache. "
+                 "Les écritures (INSERT, UPDATE, DELETE, MERGE) ne sont jamais mises en cache."
+        )
+        timeout_seconds = st.number_input(
+            "Délai maximal d'exécution (secondes)",
+            min_value=0, step=30, value=default_timeout,
+            help="Vide = délai par défaut, 0 = aucune limite. Au-delà, la requête est annulée sur le serveur."
+        )
+        page_key = st.text_input(
+            "Colonne clé pour la navigation page par page",
+            value=default_page_key,
+            help="Colonne unique et triable du résultat (ex : id). Vide = pagination OFFSET/FETCH."
+        )
+        watermark_column = st.text_input(
+            "Colonne de reprise pour l'extraction incrémentale",
+            value=default_watermark,
+            help="Colonne croissante du résultat (ex : id d'identité, date de création) d'une table en ajout seul. "
+                 "Chaque utilisateur ou planification ne lit alors que les lignes apparues depuis sa dernière "
+                 "extraction. Préférez une colonne strictement croissante : les lignes insérées plus tard avec "
+                 "une valeur égale au dernier point de reprise ne seraient pas relues. Vide = toujours complet."
+        )
 
         # Préparation de la liste des bases
         db_map = {db[1]: db[0] for db in db_list}  # Index 1=name, 0=id
@@ -129,7 +161,9 @@ if st.session_state.query_mode in ("add", "edit"):
                 else:
                     if is_edit:
                         success = query_manager.update_query(
-                            st.session_state.edit_query_id, name, sql_text, parameters, ",".join(roles), db_map[db_name_selected]
+                            st.session_state.edit_query_id, name, sql_text, parameters, ",".join(roles), db_map[db_name_selected],
+                            cache_ttl=cache_ttl, timeout_seconds=timeout_seconds, page_key=page_key,
+                            watermark_column=watermark_column
                         )
                         if success:
                             st.success("Requête mise à jour avec succès ✅")
@@ -137,7 +171,9 @@ if st.session_state.query_mode in ("add", "edit"):
                             st.error("Erreur lors de la mise à jour.")
                     else:
                         query_manager.add_query(
-                            name, sql_text, parameters, ",".join(roles), db_map[db_name_selected]
+                            name, sql_text, parameters, ",".join(roles), db_map[db_name_selected],
+                            cache_ttl=cache_ttl, timeout_seconds=timeout_seconds, page_key=page_key,
+                            watermark_column=watermark_column
                         )
                         st.success("Requête ajoutée avec succès ✅")
                     
@@ -0,0 +1,142 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+from modules import query_manager, schedule_manager, cron, watermark_manager
+from utils import query_executor, scheduler
+
+# ==========================
+# Vérification des droits
+# ==========================
+if "role" not in st.session_state or st.session_state.role != "Admin":
+    st.error("Accès refusé. Réservé aux administrateurs.")
+    st.stop()
+
+st.title("⏰ Administration - Extractions planifiées")
+
+scheduler.ensure_started()
+if scheduler.get_scheduler().is_running:
+    st.caption(f"🟢 Planificateur actif : vérification des échéances toutes les "
+               f"{scheduler.SCHEDULER_POLL_INTERVAL} s, {scheduler.SCHEDULER_MAX_WORKERS} extraction(s) simultanée(s), "
+               f"départs étalés de 0 à {schedule_manager.SCHEDULE_JITTER} s.")
+else:
+    st.warning("⚠️ Planificateur désactivé (SCHEDULER_ENABLED=0) : les extractions ne seront pas lancées "
+               "par cette instance.")
+
+# ==========================
+# Chargement des données
+# ==========================
+queries = query_manager.get_all_queries()
+query_by_id = {q["id"]: q for q in queries}
+formats = query_executor.get_export_formats()
+
+if not queries:
+    st.info("Aucune requête prédéfinie. Créez d'abord une requête.")
+    st.stop()
+
+# ==========================
+# Nouvelle planification
+# ==========================
+with st.expander("➕ Planifier une extraction", expanded=False):
+    selected_id = st.selectbox("Requête*", list(query_by_id), format_func=lambda i: query_by_id[i]["name"])
+    param_list = query_executor.get_query_parameters(query_by_id[selected_id])
+
+    with st.form("schedule_form", clear_on_submit=False):
+        expression = st.text_input("Expression cron*", value="0 7 * * 1-5",
+                                   help="minute heure jour-du-mois mois jour-de-la-semaine (0 = dimanche). "
+                                        "Ex : '0 7 * * 1-5' = 7h du lundi au vendredi.")
+        params = {p: st.text_input(f"📝 {p}") for p in param_list}
+        output_format = st.selectbox("Format de sortie*", formats,
+                                     format_func=lambda f: query_executor.EXPORT_FORMATS[f]["label"])
+        destination = st.text_input("Dossier de destination*", placeholder="/srv/extractions/ventes")
+        enabled = st.checkbox("Active", value=True)
+        submitted = st.form_submit_button("💾 Enregistrer")
+
+    if expression and cron.validate(expression):
+        upcoming = cron.next_runs(expression, datetime.now(), 3)
+        st.caption("Prochaines échéances : " + ", ".join(d.strftime("%d/%m/%Y %H:%M") for d in upcoming))
+
+    if submitted:
+        try:
+            if param_list and not all(params.values()):
+                st.error("Veuillez renseigner tous les paramètres de la requête.")
+            else:
+                schedule_manager.add_schedule(selected_id, expression, params, output_format, destination,
+                                              formats, st.session_state.get("username", "unknown"), enabled)
+                st.success("Extraction planifiée ✅")
+                st.rerun()
+        except ValueError as e:
+            st.error(f"Erreur : {e}")
+
+# ==========================
+# Planifications et prochaines exécutions
+# ==========================
+st.subheader("📅 Prochaines exécutions")
+schedules = schedule_manager.get_all_schedules()
+
+if not schedules:
+    st.info("Aucune extraction planifiée.")
+else:
+    st.dataframe(pd.DataFrame([{
+        "ID": s["id"],
+        "Requête": query_by_id.get(s["query_id"], {}).get("name", f"#{s['query_id']} (supprimée)"),
+        "Cron": s["cron"],
+        "Prochaine exécution": s["next_run_at"] if s["enabled"] else "—",
+        "Dernière exécution": s["last_run_at"] or "—",
+        "Format": query_executor.EXPORT_FORMATS.get(s["output_format"], {}).get("label", s["output_format"]),
+        "Destination": s["destination"],
+        "Active": "✅" if s["enabled"] else "⏸️",
+    } for s in schedules]), use_container_width=True, hide_index=True)
+
+    schedule_ids = [s["id"] for s in schedules]
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    target = col1.selectbox("Planification", schedule_ids, label_visibility="collapsed",
+                            format_func=lambda i: f"#{i}")
+    current = next(s for s in schedules if s["id"] == target)
+    if col2.button("▶️ Exécuter maintenant", use_container_width=True):
+        schedule_manager.run_now(target)
+        st.success(f"Extraction #{target} lancée au prochain passage du planificateur.")
+        st.rerun()
+    if col3.button("⏸️ Désactiver" if current["enabled"] else "✅ Activer", use_container_width=True):
+        schedule_manager.set_enabled(target, not current["enabled"])
+        st.rerun()
+    if col4.button("🗑️ Supprimer", use_container_width=True):
+        schedule_manager.delete_schedule(target)
+        watermark_manager.reset_watermark(current["query_id"], watermark_manager.schedule_scope(target))
+        st.rerun()
+
+    # Extraction incrémentale : chaque exécution ne lit que les lignes apparues depuis la précédente
+    column = (query_by_id.get(current["query_id"], {}).get("watermark_column") or "").strip()
+    if column:
+        scope = watermark_manager.schedule_scope(target)
+        mark = watermark_manager.get_watermark(current["query_id"], scope, column)
+        col1, col2 = st.columns([3, 1])
+        col1.caption(f"🆕 Extraction incrémentale sur {column} : "
+                     + (f"prochaine exécution à partir de {column} > {mark}" if mark is not None
+                        else "la prochaine exécution lira tout l'historique"))
+        if col2.button("🔄 Réinitialiser le point de reprise", disabled=mark is None, use_container_width=True):
+            watermark_manager.reset_watermark(current["query_id"], scope)
+            st.rerun()
+
+# ==========================
+# Historique des exécutions
+# ==========================
+st.subheader("📜 Exécutions passées")
+runs = schedule_manager.get_runs()
+if not runs:
+    st.info("Aucune exécution pour le moment.")
+else:
+    runs_df = pd.DataFrame(runs).rename(columns={
+        "schedule_id": "Planification", "scheduled_for": "Prévue à", "started_at": "Début",
+        "finished_at": "Fin", "duration": "Durée (s)", "status": "Statut", "row_count": "Lignes",
+        "file_path": "Fichier", "message": "Erreur",
+    })
+    runs_df.insert(1, "Requête", runs_df.pop("query_id").map(
+        lambda i: query_by_id.get(i, {}).get("name", f"#{i}")))
+    st.dataframe(runs_df.drop(columns=["id"]), use_container_width=True, hide_index=True)
+
+    durations = runs_df["Durée (s)"].dropna()
+    if not durations.empty:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Exécutions", len(runs_df))
+        col2.metric("Durée moyenne", f"{durations.mean():.1f} s")
+        col3.metric("Échecs", int((runs_df["Statut"] == schedule_manager.RUN_ERROR).sum()))
@@ -1,6 +1,6 @@
 import streamlit as st
 from modules import auth, db_connection
-from utils import query_executor
+from utils import query_executor, result_view
 import pandas as pd
 from datetime import datetime
 
@@ -50,10 +50,10 @@ if not queries:
     st.info("Aucune requête disponible pour cette base de données. Contactez un administrateur pour plus d'informations.")
     st.stop()
 
-# Mapping nom → requête
-query_names = {q["name"]: q for q in queries}
-selected_name = st.selectbox("📌 Choisir une requête à exécuter :", list(query_names.keys()))
-selected_query = query_names[selected_name]
+# Liste légère (id, nom) ; le SQL n'est chargé que pour la requête choisie
+query_names = {q["id"]: q["name"] for q in queries}
+selected_id = st.selectbox("📌 Choisir une requête à exécuter :", list(query_names.keys()), format_func=query_names.get)
+selected_query = query_executor.load_query(selected_id)
 
 # Affichage des détails de la requête
 with st.expander("📋 Détails de la requête sélectionnée"):
@@ -94,56 +94,30 @@ else:
 # Exécution de la requête
 # ==============================
 st.subheader("🚀 Exécution")
+watermark_options = result_view.render_watermark_choice("analyst_job", selected_query)
 if st.button("▶️ Exécuter la requête", type="primary", use_container_width=True):
     # Validation des paramètres requis
     if param_list and not all(params.values()):
         st.error("Veuillez renseigner tous les paramètres requis avant d'exécuter la requête.")
     else:
-        with st.spinner("Exécution de la requête en cours..."):
-            df = query_executor.execute_query(selected_query, params)
-            
-            if df is not None:
-                if not df.empty:
-                    st.success(f"✅ Requête exécutée avec succès! {len(df)} ligne(s) retournée(s).")
-                    
-                    # Affichage des résultats
-                    st.dataframe(df, use_container_width=True)
-                    
-                    # Métriques
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("Lignes retournées", len(df))
-                    with col2:
-                        st.metric("Colonnes", len(df.columns))
-                    
-                    # Options d'export
-                    st.subheader("💾 Export des résultats")
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    filename_base = f"{selected_name.replace(' ', '_')}_{timestamp}"
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        csv_data = query_executor.export_csv(df)
-                        st.download_button(
-                            label="Télécharger en CSV",
-                            data=csv_data,
-                            file_name=f"{filename_base}.csv",
-                            mime="text/csv",
-                            use_container_width=True
-                        )
-                    with col2:
-                        excel_data = query_executor.export_excel(df)
-                        st.download_button(
-                            label="Télécharger en Excel",
-                            data=excel_data,
-                            file_name=f"{filename_base}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True
-                        )
-                else:
-                    st.warning("⚠️ La requête s'est exécutée mais n'a retourné aucun résultat.")
-            else:
-                st.error("❌ Erreur lors de l'exécution de la requête. Veuillez vérifier les paramètres et réessayer.")
+        result_view.submit_job("analyst_job", selected_query, params, **watermark_options)
+
+# Navigation page par page : seules les lignes affichées sont lues
+if st.button("🔎 Parcourir page par page", use_container_width=True):
+    if param_list and not all(params.values()):
+        st.error("Veuillez renseigner tous les paramètres requis avant d'exécuter la requête.")
+    else:
+        result_view.start_browser("analyst_job", selected_query, params)
+
+# Mode lot : mêmes paramètres, plusieurs valeurs
+result_view.render_batch_form("analyst_job", selected_query, param_list)
+
+# Exécution multi-bases : même requête, plusieurs connexions
+result_view.render_fanout_form("analyst_job", selected_query, params, connection_map,
+                               params_ready=not (param_list and not all(params.values())))
+
+# Suivi de l'exécution en arrière-plan (progression, annulation, résultat)
+result_view.render_job("analyst_job")
 
 # ==============================
 # Section d'aide
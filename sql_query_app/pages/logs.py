@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-import os
 from datetime import datetime, timedelta
+from modules import logger
+from modules.metadata_store import get_connection, transaction
 
 # ==========================
 # Vérification des droits
@@ -13,20 +13,12 @@ if "role" not in st.session_state or st.session_state.role != "Admin":
 
 st.title("📜 Journal des activités")
 
-# ==========================
-# Configuration
-# ==========================
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_PATH = os.path.join(BASE_DIR, "db", "app.db")
-
 # ==========================
 # Fonctions utilitaires
 # ==========================
 def get_logs(filter_user=None, filter_status=None, limit=1000):
     """Récupère les logs depuis la base de données"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
         # Modification : ne plus sélectionner la colonne 'id'
         query = """
             SELECT username, query_id, timestamp, status, message 
@@ -46,8 +38,8 @@ def get_logs(filter_user=None, filter_status=None, limit=1000):
         query += " ORDER BY timestamp DESC LIMIT ?"
         params.append(limit)
 
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
+        logger.flush()  # Événements encore en file d'écriture
+        df = pd.read_sql_query(query, get_connection(), params=params)
         return df
         
     except Exception as e:
@@ -58,12 +50,9 @@ def get_logs(filter_user=None, filter_status=None, limit=1000):
 def delete_old_logs(days=30):
     """Supprime les logs de plus de X jours"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
         cutoff_date = datetime.now() - timedelta(days=days)
-        cursor.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff_date,))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute("DELETE FROM logs WHERE timestamp < ?", (cutoff_date,))
         return True
     except Exception as e:
         st.error(f"Erreur lors de la suppression: {str(e)}")
@@ -102,7 +91,7 @@ col1, col2 = st.columns(2)
 with col1:
     user_filter = st.text_input("🔎 Filtrer par utilisateur", "")
 with col2:
-    status_filter = st.selectbox("Statut", ["Tous", "success", "error"])
+    status_filter = st.selectbox("Statut", ["Tous", "success", "error", "timeout", "cache_hit", "cancelled", "watermark"])
 
 # Bouton pour actualiser
 if st.button("🔄 Actualiser"):
@@ -0,0 +1,10 @@
+import base64
+import os
+import sys
+from pathlib import Path
+
+# Les modules de l'application s'importent depuis sql_query_app/ (from modules import ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# db_connection exige une clé Fernet à l'import : clé jetable pour les tests
+os.environ.setdefault("FERNET_KEY", base64.urlsafe_b64encode(os.urandom(32)).decode())
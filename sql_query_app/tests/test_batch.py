@@ -0,0 +1,109 @@
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+import pyodbc
+import pytest
+
+from modules import query_compiler
+from utils import query_executor
+
+
+# ==========================
+# insert_marker_column
+# ==========================
+def test_marker_column_added_first():
+    df = pd.DataFrame({"a": [1, 2]})
+    assert query_executor.insert_marker_column(df, "_ligne", 3) == "_ligne"
+    assert list(df.columns) == ["_ligne", "a"]
+    assert df["_ligne"].tolist() == [3, 3]
+
+
+def test_marker_column_name_collision():
+    df = pd.DataFrame({"_ligne": ["x"], "_ligne_2": ["y"]})
+    assert query_executor.insert_marker_column(df, "_ligne", 7) == "_ligne_3"
+    assert list(df.columns) == ["_ligne_3", "_ligne", "_ligne_2"]
+    assert df["_ligne"].tolist() == ["x"]
+
+
+# ==========================
+# Écriture par lot : délai
+# ==========================
+class _BlockingCursor:
+    """executemany bloqué jusqu'à cursor.cancel(), qui le fait échouer comme le pilote."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.fast_executemany = False
+        self.rowcount = -1
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def executemany(self, sql, rows):
+        if not self.cancelled.wait(5):
+            raise AssertionError("executemany jamais annulé")
+        raise pyodbc.Error("HY008", "Operation canceled")
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def close(self):
+        pass
+
+
+class _Connection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.committed = False
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+
+def test_batch_write_cancelled_by_watchdog(monkeypatch):
+    conn = _Connection(_BlockingCursor())
+
+    @contextmanager
+    def borrow(db_info):
+        yield conn
+
+    monkeypatch.setattr(query_executor.db_connection, "borrow_connection", borrow)
+    query = {"sql_text": "UPDATE t SET a = :a", "parameters": "a:int"}
+    compiled = query_compiler.compile_sql(query["sql_text"], query["parameters"])
+    bound = [[1], [2]]
+    progress = query_executor.BatchProgress(len(bound))
+
+    with pytest.raises(query_executor.QueryTimeoutError):
+        query_executor._run_batch_write(query, compiled, bound, {"id": 1}, progress,
+                                        None, None, None, timeout=0.05)
+    assert not conn.committed
+    assert progress.completed == 0
+
+
+# ==========================
+# Exécution multi-bases
+# ==========================
+@pytest.fixture
+def fanout_env(monkeypatch):
+    monkeypatch.setattr(query_executor.db_connection, "get_all_connections", lambda: [(1, "paris"), (2, "lyon")])
+    monkeypatch.setattr(query_executor, "get_target_connection_info", lambda conn_id: {"id": conn_id})
+    monkeypatch.setattr(query_executor, "log_action", lambda *args: True)
+    return {"id": 1, "sql_text": "SELECT _base, a FROM t", "parameters": None, "db_id": 1}
+
+
+def test_fanout_without_rows_keeps_report_and_columns(monkeypatch, fanout_env):
+    def fetch(query, *args):
+        if query["db_id"] == 2:
+            raise query_executor.QueryExecutionError("base indisponible")
+        return pd.DataFrame({"_base": pd.Series([], dtype=object), "a": pd.Series([], dtype=int)})
+
+    monkeypatch.setattr(query_executor, "_fetch_dataframe", fetch)
+    df = query_executor.run_fanout(fanout_env, {}, "alice", [1, 2])
+
+    assert df.empty
+    assert list(df.columns) == ["_base_2", "_base", "a"]
+    assert [(r["Base"], r["Statut"]) for r in df.attrs["fanout_report"]] == [("paris", "success"), ("lyon", "error")]
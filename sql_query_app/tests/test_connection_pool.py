@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from modules import connection_pool
+
+
+class _Connection:
+    def __init__(self, pool=None):
+        self.pool = pool
+        self.closed = False
+        self.closed_with_lock_held = None
+
+    def cursor(self):
+        raise AssertionError("Pas de vérification attendue")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        # Fermeture hors verrou : un autre thread peut prendre le verrou du pool
+        if self.pool is not None:
+            acquired = []
+
+            def try_lock():
+                acquired.append(self.pool._lock.acquire(timeout=1))
+                if acquired[0]:
+                    self.pool._lock.release()
+
+            thread = threading.Thread(target=try_lock)
+            thread.start()
+            thread.join()
+            self.closed_with_lock_held = not acquired[0]
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = connection_pool.ConnectionPool(max_size=2, idle_timeout=60, ping_after=3600, wait_timeout=1,
+                                          sweep_interval=0)
+    monkeypatch.setattr(connection_pool.pyodbc, "connect", lambda conn_str, timeout: _Connection(pool),
+                        raising=False)
+    yield pool
+    pool.stop()
+
+
+def _age(pool, conn_id, seconds):
+    for pooled in pool._idle[conn_id]:
+        pooled.last_used -= seconds
+
+
+def test_sweep_closes_expired_connections_of_every_database(pool):
+    first = pool.acquire(1, "dsn=a")
+    second = pool.acquire(2, "dsn=b")
+    pool.release(1, first)
+    pool.release(2, second)
+    _age(pool, 1, 120)
+
+    assert pool.sweep() == 1
+    assert first.closed and not second.closed
+    assert first.closed_with_lock_held is False
+    assert pool.get_stats()["idle"] == {2: 1}
+
+
+def test_expired_connection_closed_outside_lock_on_acquire(pool):
+    connection = pool.acquire(1, "dsn=a")
+    pool.release(1, connection)
+    _age(pool, 1, 120)
+
+    replacement = pool.acquire(1, "dsn=a")
+    assert replacement is not connection
+    assert connection.closed and connection.closed_with_lock_held is False
+
+
+def test_invalidate_closes_outside_lock(pool):
+    connection = pool.acquire(1, "dsn=a")
+    pool.release(1, connection)
+    pool.invalidate(1)
+    assert connection.closed and connection.closed_with_lock_held is False
+
+
+def test_sweeper_thread(monkeypatch):
+    pool = connection_pool.ConnectionPool(idle_timeout=0, ping_after=3600, sweep_interval=0.05)
+    monkeypatch.setattr(connection_pool.pyodbc, "connect", lambda conn_str, timeout: _Connection(),
+                        raising=False)
+    try:
+        connection = pool.acquire(1, "dsn=a")
+        pool.release(1, connection)
+        deadline = time.monotonic() + 2
+        while not connection.closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert connection.closed
+    finally:
+        pool.stop()
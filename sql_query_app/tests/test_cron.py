@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+
+from modules import cron
+
+# Vendredi 13 juin 2025, 12:00
+FRIDAY_13 = datetime(2025, 6, 13, 12, 0)
+
+
+@pytest.mark.parametrize("weekdays", ["*", "*/1", "0-6", "0-7", "1-7"])
+def test_full_weekday_range_is_unrestricted(weekdays):
+    # Jour du mois seul restreint : le 1er du mois uniquement
+    assert cron.next_runs(f"0 0 1 * {weekdays}", FRIDAY_13) == [datetime(2025, 7, 1)]
+
+
+@pytest.mark.parametrize("days", ["*", "*/1", "1-31"])
+def test_full_day_range_is_unrestricted(days):
+    # Jour de semaine seul restreint : le lundi uniquement
+    assert cron.next_runs(f"0 0 {days} * 1", FRIDAY_13) == [datetime(2025, 6, 16)]
+
+
+def test_both_restricted_match_either():
+    # Le 1er du mois OU le lundi
+    assert cron.next_runs("0 0 1 * 1", FRIDAY_13, count=3) == [
+        datetime(2025, 6, 16), datetime(2025, 6, 23), datetime(2025, 6, 30)]
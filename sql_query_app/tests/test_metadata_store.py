@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from modules import logger, metadata_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """Base de métadonnées vierge : migrations appliquées à la première connexion."""
+    monkeypatch.setattr(metadata_store, "DB_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(metadata_store, "_local", threading.local())
+    monkeypatch.setattr(metadata_store, "_schema_ready", False)
+    monkeypatch.setattr(logger, "LOG_ASYNC", False)  # Journal écrit tout de suite, dans cette base
+    yield metadata_store
+    metadata_store.close_connection()
+
+
+def _names(conn):
+    return [r[0] for r in conn.execute("SELECT name FROM items ORDER BY name")]
+
+
+@pytest.fixture
+def conn(store):
+    with store.transaction() as conn:
+        conn.execute("CREATE TABLE items (name TEXT)")
+    return conn
+
+
+def test_migrations_logged(store):
+    conn = store.get_connection()
+    rows = conn.execute("SELECT username, status, message FROM logs").fetchall()
+    assert rows and rows[0][0] == store.MIGRATION_USERNAME
+    assert "migré" in rows[0][2]
+
+
+def test_reading_leaves_outer_transaction_open(store, conn):
+    with store.transaction():
+        conn.execute("INSERT INTO items VALUES ('a')")
+        with store.reading() as reader:
+            reader.execute("SELECT COUNT(*) FROM items").fetchone()
+        assert conn.in_transaction
+        conn.execute("INSERT INTO items VALUES ('b')")
+    assert _names(conn) == ["a", "b"]
+
+
+def test_nested_failure_rolls_back_inner_only(store, conn):
+    with store.transaction():
+        conn.execute("INSERT INTO items VALUES ('outer')")
+        with pytest.raises(ValueError):
+            with store.transaction():
+                conn.execute("INSERT INTO items VALUES ('inner')")
+                raise ValueError("échec")
+        assert conn.in_transaction
+    assert _names(conn) == ["outer"]
+
+
+def test_outer_failure_rolls_back_nested(store, conn):
+    with pytest.raises(ValueError):
+        with store.transaction():
+            with store.transaction():
+                conn.execute("INSERT INTO items VALUES ('inner')")
+            raise ValueError("échec")
+    assert _names(conn) == []
+    assert not conn.in_transaction
+
+
+def test_stray_transaction_detected(store, conn):
+    conn.execute("INSERT INTO items VALUES ('implicite')")  # Transaction implicite du module sqlite3
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            pass
+    conn.rollback()
@@ -0,0 +1,51 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from utils import query_executor
+
+
+class _Stream:
+    """Flux de lots, avec ou sans types annoncés (comme ResultStream / SpilledResult)."""
+
+    def __init__(self, chunks, arrow_types=None):
+        self.chunks = chunks
+        self.arrow_types = arrow_types
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def _read(stream) -> pd.DataFrame:
+    output = io.BytesIO()
+    rows = query_executor.write_parquet(stream, output)
+    output.seek(0)
+    table = pq.read_table(output)
+    assert table.num_rows == rows
+    return table
+
+
+def _chunks():
+    return [
+        pd.DataFrame({"id": [1, 2], "amount": [None, None], "at": [None, None]}),
+        pd.DataFrame({"id": [3, 4], "amount": [1.5, None], "at": [datetime(2024, 1, 2), None]}),
+    ]
+
+
+def test_streamed_null_first_chunk_uses_declared_types():
+    table = _read(_Stream(_chunks(), [pa.int64(), pa.float64(), pa.timestamp("us")]))
+    assert table.schema.field("amount").type == pa.float64()
+    assert table.schema.field("at").type == pa.timestamp("us")
+    assert table.column("amount").to_pylist() == [None, None, 1.5, None]
+
+
+def test_streamed_null_first_chunk_without_types_falls_back_to_text():
+    table = _read(_Stream(_chunks()))
+    assert table.schema.field("amount").type == pa.string()
+    assert table.column("amount").to_pylist() == [None, None, "1.5", None]
+    assert table.column("at").to_pylist()[2].startswith("2024-01-02")
@@ -0,0 +1,133 @@
+import pytest
+
+from modules import query_compiler
+
+
+# ==========================
+# has_top
+# ==========================
+@pytest.mark.parametrize("sql", [
+    "SELECT TOP 100 a FROM t ORDER BY a DESC",
+    "select distinct top (10) a from t",
+    "/* dernier lot */ SELECT TOP(5) * FROM t",
+    "WITH c AS (SELECT a FROM t) SELECT TOP 3 a FROM c ORDER BY a",
+])
+def test_has_top(sql):
+    assert query_compiler.has_top(sql)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT a FROM t ORDER BY a",
+    "SELECT a FROM (SELECT TOP 5 a FROM t ORDER BY a) AS s",
+    "WITH c AS (SELECT TOP 3 a FROM t ORDER BY a) SELECT a FROM c",
+    "SELECT 'TOP' AS top_label FROM t",
+])
+def test_has_no_top(sql):
+    assert not query_compiler.has_top(sql)
+
+
+# ==========================
+# paginate_offset
+# ==========================
+def test_paginate_offset_keeps_order():
+    sql = query_compiler.paginate_offset("SELECT a FROM t ORDER BY a")
+    assert sql == "SELECT a FROM t\nORDER BY a\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+
+def test_paginate_offset_plain_select_not_wrapped():
+    sql = query_compiler.paginate_offset("SELECT a, COUNT(*) FROM t GROUP BY a;")
+    assert sql == "SELECT a, COUNT(*) FROM t GROUP BY a\nORDER BY (SELECT NULL)\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+
+
+def test_paginate_offset_top_wrapped_with_its_order():
+    sql = query_compiler.paginate_offset("SELECT TOP 100 a, d FROM t ORDER BY d DESC;")
+    assert sql == ("SELECT * FROM (\nSELECT TOP 100 a, d FROM t\nORDER BY d DESC\n) AS _page\n"
+                   "ORDER BY [d] DESC\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+    assert sql.count("OFFSET") == 1
+
+
+def test_paginate_offset_top_without_order():
+    sql = query_compiler.paginate_offset("SELECT TOP 10 a FROM t")
+    assert sql.endswith(") AS _page\nORDER BY (SELECT NULL)\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+
+
+def test_paginate_offset_existing_offset_wrapped():
+    sql = query_compiler.paginate_offset("SELECT a FROM t ORDER BY a OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY")
+    assert sql.startswith("SELECT * FROM (\nSELECT a FROM t\nORDER BY a OFFSET 10 ROWS")
+    assert sql.endswith(") AS _page\nORDER BY [a]\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+
+
+def test_paginate_offset_top_order_by_expression_refused():
+    with pytest.raises(ValueError, match="Tri non reproductible"):
+        query_compiler.paginate_offset("SELECT TOP 5 a FROM t ORDER BY LEN(a), a")
+
+
+# ==========================
+# outer_order_by
+# ==========================
+@pytest.mark.parametrize("order_by, expected", [
+    ("ORDER BY a", "ORDER BY [a]"),
+    ("order by t.d desc, 2 ASC", "ORDER BY [d] DESC, 2 ASC"),
+    ("ORDER BY [dbo].[t].[Date de commande] DESC", "ORDER BY [Date de commande] DESC"),
+    ('ORDER BY "a""b", x OFFSET 5 ROWS', 'ORDER BY [a"b], [x]'),
+])
+def test_outer_order_by(order_by, expected):
+    assert query_compiler.outer_order_by(order_by) == expected
+
+
+@pytest.mark.parametrize("order_by", [
+    "ORDER BY a + b",
+    "ORDER BY CASE WHEN a = 1 THEN 0 ELSE 1 END",
+    "ORDER BY a COLLATE French_CI_AS",
+])
+def test_outer_order_by_refuses_expressions(order_by):
+    with pytest.raises(ValueError):
+        query_compiler.outer_order_by(order_by)
+
+
+def test_paginate_offset_cte_without_top():
+    sql = query_compiler.paginate_offset("WITH c AS (SELECT a FROM t) SELECT a FROM c")
+    assert sql.endswith("ORDER BY (SELECT NULL)\nOFFSET ? ROWS FETCH NEXT ? ROWS ONLY")
+
+
+def test_paginate_offset_cte_with_top_refused():
+    with pytest.raises(ValueError, match="CTE"):
+        query_compiler.paginate_offset("WITH c AS (SELECT a FROM t) SELECT TOP 5 a FROM c ORDER BY a")
+
+
+# ==========================
+# paginate_keyset
+# ==========================
+def test_paginate_keyset_replaces_order():
+    sql = query_compiler.paginate_keyset("SELECT id, a FROM t ORDER BY a", "id", after_key=True)
+    assert sql == "SELECT TOP (?) * FROM (\nSELECT id, a FROM t\n) AS _page\nWHERE [id] > ?\nORDER BY [id]"
+
+
+def test_paginate_keyset_top_keeps_inner_order():
+    sql = query_compiler.paginate_keyset("SELECT TOP 100 id, d FROM t ORDER BY d DESC", "id", after_key=False)
+    assert sql == ("SELECT TOP (?) * FROM (\nSELECT TOP 100 id, d FROM t\nORDER BY d DESC\n) AS _page\n"
+                   "ORDER BY [id]")
+
+
+def test_paginate_keyset_cte_refused():
+    with pytest.raises(ValueError, match="CTE"):
+        query_compiler.paginate_keyset("WITH c AS (SELECT id FROM t) SELECT id FROM c", "id", after_key=False)
+
+
+# ==========================
+# incremental_sql
+# ==========================
+def test_incremental_sql_replaces_order():
+    sql = query_compiler.incremental_sql("SELECT id, d FROM t ORDER BY id DESC", "d")
+    assert sql == "SELECT * FROM (\nSELECT id, d FROM t\n) AS _delta\nWHERE [d] > ?\nORDER BY [d]"
+
+
+def test_incremental_sql_top_keeps_inner_order():
+    sql = query_compiler.incremental_sql("SELECT TOP 100 id, d FROM t ORDER BY d DESC", "d")
+    assert sql == ("SELECT * FROM (\nSELECT TOP 100 id, d FROM t\nORDER BY d DESC\n) AS _delta\n"
+                   "WHERE [d] > ?\nORDER BY [d]")
+
+
+def test_incremental_sql_cte_refused():
+    with pytest.raises(ValueError, match="CTE"):
+        query_compiler.incremental_sql("WITH c AS (SELECT d FROM t) SELECT d FROM c", "d")
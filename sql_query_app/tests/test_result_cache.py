@@ -0,0 +1,65 @@
+import os
+from contextlib import contextmanager
+
+import pandas as pd
+import pytest
+
+from modules import result_cache
+from utils import query_executor
+
+
+class _Stream:
+    """ResultStream minimal : un résultat de deux lignes, non tronqué."""
+    has_rows = True
+    truncated = False
+    row_count = 2
+
+    def collect(self, on_chunk=None, spill_owner=None):
+        return pd.DataFrame({"id": [1, 2]})
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    executions = []
+
+    @contextmanager
+    def open_stream(query, params, **kwargs):
+        executions.append(query["sql_text"])
+        yield _Stream()
+
+    cache = result_cache.ResultCache(max_bytes=1024 * 1024, default_ttl=0)
+    monkeypatch.setattr(query_executor, "open_result_stream", open_stream)
+    monkeypatch.setattr(query_executor, "log_action", lambda *args: True)
+    monkeypatch.setattr(result_cache, "get_cache", lambda: cache)
+    cache.executions = executions
+    return cache
+
+
+@pytest.mark.skipif("RESULT_CACHE_TTL" in os.environ, reason="RESULT_CACHE_TTL configuré")
+def test_cache_disabled_by_default():
+    assert result_cache.RESULT_CACHE_TTL == 0
+
+
+def test_default_ttl_does_not_cache(cache):
+    query = {"id": 1, "sql_text": "SELECT id FROM t", "parameters": "", "db_id": 1, "cache_ttl": None}
+    query_executor.run_query(query, {}, "alice")
+    query_executor.run_query(query, {}, "alice")
+    assert len(cache.executions) == 2
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_read_query_cached_when_opted_in(cache):
+    query = {"id": 1, "sql_text": "SELECT id FROM t", "parameters": "", "db_id": 1, "cache_ttl": 60}
+    query_executor.run_query(query, {}, "alice")
+    df = query_executor.run_query(query, {}, "alice")
+    assert len(cache.executions) == 1
+    assert df.attrs["from_cache"]
+
+
+def test_write_query_never_cached(cache):
+    query = {"id": 2, "sql_text": "INSERT INTO t (a) OUTPUT inserted.id VALUES (1)", "parameters": "",
+             "db_id": 1, "cache_ttl": 60}
+    query_executor.run_query(query, {}, "alice")
+    query_executor.run_query(query, {}, "alice")
+    assert len(cache.executions) == 2
+    assert cache.get_stats()["entries"] == 0
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import pyodbc
+from dotenv import load_dotenv
+
+from modules import result_store
+from utils import query_executor
+
+load_dotenv()
+
+# ==============================
+# Configuration des exécutions en arrière-plan
+# ==============================
+JOB_MAX_WORKERS = int(os.getenv("JOB_MAX_WORKERS", "4"))      # Requêtes exécutées simultanément
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "1800"))     # Conservation (s) d'un job terminé
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+FINISHED_STATES = {DONE, ERROR, CANCELLED}
+
+
+class Job:
+    """Exécution d'une requête prédéfinie dans le pool de threads."""
+
+    def __init__(self, query: dict, params, username: str, runner=None, **options):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.params = params            # dict, ou liste de dicts pour un lot
+        self.username = username
+        self.runner = runner or query_executor.run_query
+        self.options = options          # Arguments supplémentaires du runner
+        self.status = PENDING
+        self.rows_fetched = 0
+        self.batch_progress = None      # (exécutions terminées, total) pour un lot
+        self.partial_frames = []        # Résultats déjà reçus d'une exécution multi-bases
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._cursors = []              # Un lot exécute plusieurs curseurs en parallèle
+        self._exports = {}              # (format, séparateur) -> chemin du fichier, supprimé avec le résultat
+        self._export_lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        """Durée d'exécution (s), en cours ou terminée."""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        """Demande l'annulation ; l'instruction en cours est annulée côté serveur."""
+        self._cancel_event.set()
+        for cursor in list(self._cursors):
+            try:
+                cursor.cancel()
+            except pyodbc.Error:
+                pass
+
+    def has_export(self, fmt: str, delimiter: Optional[str] = None) -> bool:
+        path = self._exports.get((fmt, delimiter))
+        return path is not None and os.path.exists(path)
+
+    def get_export(self, fmt: str, delimiter: Optional[str] = None) -> str:
+        """Chemin du fichier d'export du résultat, généré à la première demande puis réutilisé."""
+        key = (fmt, delimiter)
+        with self._export_lock:  # Deux clics simultanés : une seule génération
+            if not self.has_export(fmt, delimiter):
+                self._exports[key] = query_executor.export_result_file(self.result, fmt, delimiter=delimiter)
+            return self._exports[key]
+
+    def release_exports(self):
+        """Supprime les fichiers d'export générés."""
+        with self._export_lock:
+            paths, self._exports = list(self._exports.values()), {}
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Rappels fournis à run_query
+    def _attach_cursor(self, cursor):
+        self._cursors.append(cursor)
+
+    def _progress(self, stream):
+        self.rows_fetched = stream.row_count
+        if hasattr(stream, "completed"):
+            self.batch_progress = (stream.completed, stream.total)
+        if hasattr(stream, "frames"):
+            self.partial_frames = list(stream.frames)
+
+
+class JobManager:
+    """
+    Pool borné de threads exécutant les requêtes hors du script Streamlit.
+
+    Une session soumet une requête, conserve l'identifiant du job et relit son
+    état à chaque rerun ; les jobs terminés sont oubliés après `result_ttl` secondes.
+    """
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, result_ttl=JOB_RESULT_TTL):
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query-job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(self, query: dict, params, username: str, runner=None, **options) -> str:
+        """
+        Planifie l'exécution et retourne l'identifiant du job.
+        `runner` vaut run_query par défaut (run_batch pour un lot).
+        """
+        self._purge_expired()
+        job = Job(query, params, username, runner=runner, **options)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._purge_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return False
+        job.cancel()
+        return True
+
+    def forget(self, job_id: str):
+        """Libère immédiatement le résultat d'un job (annulé s'il tourne encore)."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None and not job.is_finished:
+            job.cancel()
+        if job is not None:
+            _release_result(job)
+
+    def list_jobs(self, username: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if username is not None:
+            jobs = [j for j in jobs if j.username == username]
+        return sorted(jobs, key=lambda j: j.submitted_at, reverse=True)
+
+    # --------------------------
+    # Outils internes
+    # --------------------------
+    def _run(self, job: Job):
+        if job._cancel_event.is_set():
+            job.finished_at = time.time()
+            job.status = CANCELLED
+            return
+
+        job.started_at = time.time()
+        job.status = RUNNING
+        try:
+            job.result = job.runner(
+                job.query, job.params, job.username,
+                on_cursor=job._attach_cursor,
+                on_chunk=job._progress,
+                cancel_event=job._cancel_event,
+                **job.options,
+            )
+            job.rows_fetched = len(job.result)
+            status = DONE
+        except query_executor.QueryCancelledError:
+            status = CANCELLED
+        except query_executor.QueryExecutionError as e:
+            job.error = str(e)
+            status = ERROR
+        except Exception as e:
+            job.error = f"Erreur inattendue: {str(e)}"
+            status = ERROR
+        job._cursors = []
+        # finished_at avant le statut : un job "terminé" a toujours une date de fin
+        job.finished_at = time.time()
+        job.status = status
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.is_finished and now - job.finished_at > self.result_ttl]
+            expired_jobs = [self._jobs.pop(job_id) for job_id in expired]
+        for job in expired_jobs:
+            _release_result(job)
+
+
+def _release_result(job: Job):
+    """Le résultat (fichier débordé compris) et ses exports sont libérés avec le job."""
+    if isinstance(job.result, result_store.SpilledResult):
+        job.result.release()
+    job.result = None
+    job.release_exports()
+
+
+# Gestionnaire unique partagé par toutes les sessions Streamlit du processus
+_manager = JobManager()
+
+
+def get_manager() -> JobManager:
+    return _manager
@@ -1,28 +1,73 @@
 import pyodbc
 import pandas as pd
 import streamlit as st
-from modules import query_manager, db_connection 
-import re
-from typing import List, Dict, Any, Optional
+from modules import query_manager, db_connection, result_cache, query_compiler, result_store, watermark_manager
+import io
+import os
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union, Callable
 from modules.logger import log_action
+from utils import result_builder, result_compactor
+from modules import connection_pool
+from modules.connection_pool import PoolTimeoutError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openpyxl import Workbook
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Export Parquet indisponible sans pyarrow
+    pa = None
+    pq = None
+try:
+    import zstandard
+except ImportError:  # CSV zstd indisponible sans zstandard
+    zstandard = None
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+# ==============================
+# Configuration de la lecture par lots
+# ==============================
+FETCH_ARRAYSIZE = int(os.getenv("FETCH_ARRAYSIZE", "5000"))                  # Lignes par appel fetchmany
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "0"))                     # 0 = pas de plafond
+MAX_RESULT_BYTES = int(os.getenv("MAX_RESULT_MB", "0")) * 1024 * 1024        # 0 = pas de plafond
+QUERY_TIMEOUT = int(os.getenv("QUERY_TIMEOUT", "600"))                       # Délai max par défaut (s), 0 = aucun
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))                 # Exécutions simultanées d'un lot
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "1000"))                    # Jeux de paramètres max par lot
+BATCH_ROW_COLUMN = "_ligne"                                                  # Colonne de rattachement à la ligne d'entrée
+FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", "8"))              # Bases interrogées simultanément
+FANOUT_SOURCE_COLUMN = "_base"                                               # Colonne indiquant la base d'origine
+BROWSE_PAGE_SIZE = int(os.getenv("BROWSE_PAGE_SIZE", "200"))                # Lignes par page en navigation
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))             # Lignes par lot écrit à l'export
+CSV_DELIMITER = os.getenv("CSV_DELIMITER", ",")                              # Séparateur CSV par défaut
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(tempfile.gettempdir(), "sql_query_app_exports"))  # Fichiers d'export à télécharger
+EXCEL_MAX_ROWS = 1_048_576                                                   # Lignes max d'une feuille Excel (en-tête compris)
+EXCEL_SHEET_NAME = "Résultats"
+STRING_PARAM_TYPE = os.getenv("STRING_PARAM_TYPE", "nvarchar").lower()       # "nvarchar" ou "varchar" (selon les colonnes cibles)
+STRING_PARAM_TYPES = {
+    "nvarchar": (pyodbc.SQL_WVARCHAR, 4000),
+    "varchar": (pyodbc.SQL_VARCHAR, 8000),
+}
+
 # ==============================
 # Charger les requêtes selon le rôle et la base de données
 # ==============================
 def get_queries_by_db_and_role(db_id: int, role: str) -> List[Dict[str, Any]]:
     """
-    Retourne la liste des requêtes accessibles pour une base de données et un rôle donné
+    Retourne l'identifiant et le nom des requêtes accessibles pour une base de données
+    et un rôle donné (filtrage fait en SQL sur la table query_roles). Charger ensuite
+    la requête choisie avec load_query.
     """
-    all_queries = query_manager.get_all_queries()
-    
-    if role == "Admin":
-        # Pour les admins, toutes les requêtes de la base sélectionnée
-        return [q for q in all_queries if q["db_id"] == db_id]
-    
-    # Pour les autres rôles, filtrer par rôle ET base de données
-    role_lower = role.lower()
-    return [q for q in all_queries 
-            if q["db_id"] == db_id 
-            and role_lower in [r.strip().lower() for r in q["roles"].split(",")]]
+    # Pour les admins, toutes les requêtes de la base sélectionnée
+    return query_manager.list_queries_for_role(db_id, None if role == "Admin" else role)
+
+
+def load_query(query_id: int) -> Optional[Dict[str, Any]]:
+    """Requête complète (SQL, paramètres, options) de l'élément choisi dans la liste."""
+    return query_manager.get_query_by_id(query_id)
 
 # ==============================
 # Préparer les champs dynamiques
@@ -32,122 +77,1190 @@ def get_query_parameters(query: dict) -> List[str]:
     Transforme les paramètres d'une requête en liste utilisable
     Exemple: "start_date:date,end_date:date" → ["start_date", "end_date"]
     """
-    if not query["parameters"] or not query["parameters"].strip():
-        return []
-    
-    # Extraire seulement les noms des paramètres (avant le :)
-    parameters = []
-    for param in query["parameters"].split(','):
-        param = param.strip()
-        if ':' in param:
-            param_name = param.split(':')[0].strip()
-            parameters.append(param_name)
+    return list(query_compiler.compile_query(query).param_names)
+
+# ==============================
+# Lecture par lots (streaming)
+# ==============================
+class QueryPreparationError(Exception):
+    """Erreur détectée avant tout échange avec la base cible (connexion, paramètres...)."""
+
+
+class ResultStream:
+    """
+    Itère sur le résultat d'une requête par lots `fetchmany`, un DataFrame par lot.
+
+    La lecture s'arrête proprement dès que `max_rows` lignes ou environ `max_bytes`
+    octets ont été lus ; `truncated` indique alors que des lignes restaient à lire.
+    Avec `watermark_column`, `high_water` suit la plus grande valeur lue de cette colonne.
+    """
+
+    def __init__(self, connection, cursor, arraysize=FETCH_ARRAYSIZE,
+                 max_rows=MAX_RESULT_ROWS, max_bytes=MAX_RESULT_BYTES, watermark_column=None):
+        self.connection = connection
+        self.cursor = cursor
+        self.arraysize = max(int(arraysize or FETCH_ARRAYSIZE), 1)
+        self.max_rows = max_rows or 0
+        self.max_bytes = max_bytes or 0
+        self.columns = [desc[0] for desc in cursor.description] if cursor.description else None
+        self.type_codes = [desc[1] for desc in cursor.description] if cursor.description else None
+        self.truncated = False
+        self.row_count = 0
+        self.byte_count = 0
+        self.high_water = None
+        self._watermark_index = None
+        if watermark_column and self.columns is not None:
+            lowered = [c.lower() for c in self.columns]
+            if watermark_column.lower() not in lowered:
+                raise QueryPreparationError(f"Colonne de reprise '{watermark_column}' absente du résultat")
+            self._watermark_index = lowered.index(watermark_column.lower())
+        cursor.arraysize = self.arraysize
+
+    @property
+    def has_rows(self) -> bool:
+        """False pour une instruction d'écriture (pas de jeu de résultats)."""
+        return self.columns is not None
+
+    @property
+    def arrow_types(self) -> Optional[List]:
+        """Type Arrow de chaque colonne d'après cursor.description (None = à déduire des valeurs)."""
+        return result_builder.arrow_types(self.cursor.description) if self.has_rows else None
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        if not self.has_rows:
+            return
+        while True:
+            size = self.arraysize
+            if self.max_rows:
+                size = min(size, self.max_rows - self.row_count)
+                if size <= 0:
+                    self._mark_truncated()
+                    return
+
+            rows = self.cursor.fetchmany(size)
+            if not rows:
+                return
+            chunk = result_builder.build_chunk(rows, self.columns, self.type_codes)
+            del rows  # Libérer les objets Row avant de lire le lot suivant
+
+            self.row_count += len(chunk)
+            self.byte_count += int(chunk.memory_usage(deep=True).sum())
+            if self._watermark_index is not None:
+                self._track_high_water(chunk.iloc[:, self._watermark_index])
+            yield chunk
+
+            if self.max_bytes and self.byte_count >= self.max_bytes:
+                self._mark_truncated()
+                return
+
+    def record_batches(self):
+        """Variante Arrow : un `pyarrow.RecordBatch` par lot (pyarrow requis)."""
+        import pyarrow as pa
+        for chunk in self:
+            yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+
+    def to_dataframe(self, on_chunk: Optional[Callable] = None) -> pd.DataFrame:
+        """
+        Concatène tous les lots (respecte les plafonds de lignes/octets).
+        `on_chunk(self)` est appelé après chaque lot (progression, annulation).
+        """
+        chunks = []
+        for chunk in self:
+            chunks.append(chunk)
+            if on_chunk is not None:
+                on_chunk(self)
+        if not chunks:
+            return pd.DataFrame(columns=self.columns or [])
+        if len(chunks) == 1:
+            df = chunks[0]
         else:
-            # Fallback si le format n'est pas respecté
-            parameters.append(param)
-    
-    return parameters
+            df = pd.concat(chunks, ignore_index=True)
+        df.attrs["truncated"] = self.truncated
+        return df
+
+    def collect(self, on_chunk: Optional[Callable] = None,
+                spill_owner: Optional[str] = None) -> Union[pd.DataFrame, "result_store.SpilledResult"]:
+        """
+        Comme to_dataframe, mais un résultat dépassant le seuil de débordement est
+        écrit sur disque au fil de la lecture et retourné sous forme de SpilledResult
+        (quota disque de la session `spill_owner`).
+        """
+        store = result_store.get_store()
+        if spill_owner is None or not store.enabled or not self.has_rows:
+            return self.to_dataframe(on_chunk=on_chunk)
+
+        writer = store.open_writer(spill_owner, self.columns, result_builder.arrow_types(self.cursor.description))
+        try:
+            for chunk in self:
+                writer.add(chunk)
+                if on_chunk is not None:
+                    on_chunk(self)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish({"truncated": self.truncated})
+
+    def _track_high_water(self, values: pd.Series):
+        chunk_max = values.max()
+        if pd.isna(chunk_max):
+            return  # Lot sans valeur (NULL uniquement)
+        if self.high_water is None or chunk_max > self.high_water:
+            self.high_water = chunk_max
+
+    def _mark_truncated(self):
+        # Le plafond est atteint : on vérifie s'il restait réellement des lignes
+        self.truncated = self.cursor.fetchone() is not None
+
+
+def prepare_statement(query: dict, params: dict, watermark: Any = None) -> Tuple[str, List[Any]]:
+    """
+    Retourne le SQL compilé (`:nom` → `?`) et les valeurs dans l'ordre des `?`,
+    converties au type déclaré. Lève QueryPreparationError si un paramètre est
+    manquant ou invalide, avant tout échange avec la base cible.
+
+    Avec `watermark`, seules les lignes dont la colonne `watermark_column` dépasse
+    ce point de reprise sont demandées (valeur liée en dernier `?`).
+    """
+    compiled = query_compiler.compile_query(query)
+    try:
+        sql, values = compiled.sql, compiled.bind(params)
+        if watermark is not None:
+            sql = query_compiler.incremental_sql(sql, query["watermark_column"])
+            values = values + [watermark]
+        return sql, values
+    except ValueError as e:
+        raise QueryPreparationError(str(e))
+
+
+def get_input_sizes(query: dict, values: List[Any]) -> List[tuple]:
+    """
+    Types SQL des paramètres pour `cursor.setinputsizes` : le serveur reçoit toujours
+    le même type pour un paramètre donné (pas de conversion implicite, un seul plan).
+    """
+    sizes = []
+    for ptype, value in zip(query_compiler.compile_query(query).slot_types(), values):
+        if ptype == "int":
+            sizes.append((pyodbc.SQL_BIGINT, 0, 0))
+        elif ptype == "float":
+            sizes.append((pyodbc.SQL_DOUBLE, 0, 0))
+        elif ptype == "bool":
+            sizes.append((pyodbc.SQL_BIT, 0, 0))
+        elif ptype == "date":
+            sizes.append((pyodbc.SQL_TYPE_DATE, 0, 0))
+        else:
+            # Taille fixe pour réutiliser le plan ; 0 = (n)varchar(max) au-delà
+            sql_type, max_len = STRING_PARAM_TYPES.get(STRING_PARAM_TYPE, STRING_PARAM_TYPES["nvarchar"])
+            length = len(value) if isinstance(value, str) else 0
+            sizes.append((sql_type, max_len if length <= max_len else 0, 0))
+    # Point de reprise éventuel : type déduit de la valeur par le pilote
+    sizes.extend([None] * (len(values) - len(sizes)))
+    return sizes
+
+
+def get_target_connection_info(db_id: int) -> dict:
+    """Infos de connexion de la base cible, mot de passe déchiffré (cache en mémoire de db_connection)."""
+    try:
+        db_info = db_connection.get_credentials(db_id)
+    except Exception as e:
+        raise QueryPreparationError(f"Déchiffrement impossible: {str(e)}")
+    if not db_info:
+        raise QueryPreparationError("Connexion introuvable en base")
+    return db_info
+
+
+@contextmanager
+def open_result_stream(query: dict, params: dict, arraysize: Optional[int] = None,
+                       max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+                       on_cursor: Optional[Callable] = None, db_info: Optional[dict] = None,
+                       watermark: Any = None, watermark_column: Optional[str] = None):
+    """
+    Exécute la requête sur une connexion empruntée au pool et fournit un ResultStream.
+    La connexion reste empruntée tant que le bloc `with` n'est pas terminé.
+
+    `on_cursor(cursor)` est appelé juste avant l'exécution : il permet à un autre
+    thread d'annuler l'instruction en cours (`cursor.cancel()`). `db_info` évite de
+    relire la connexion cible quand l'appelant l'a déjà (exécution par lot).
+    `watermark` restreint le résultat aux lignes postérieures (voir prepare_statement) ;
+    `watermark_column` fait suivre au flux la plus grande valeur lue de cette colonne.
+    """
+    sql, values = prepare_statement(query, params, watermark)
+    if db_info is None:
+        db_info = get_target_connection_info(query["db_id"])
+
+    with db_connection.borrow_connection(db_info) as conn:
+        cursor = conn.cursor()
+        try:
+            if values:
+                cursor.setinputsizes(get_input_sizes(query, values))
+            if on_cursor is not None:
+                on_cursor(cursor)
+            cursor.execute(sql, values)
+            yield ResultStream(
+                conn, cursor,
+                arraysize=arraysize or FETCH_ARRAYSIZE,
+                max_rows=MAX_RESULT_ROWS if max_rows is None else max_rows,
+                max_bytes=MAX_RESULT_BYTES if max_bytes is None else max_bytes,
+                watermark_column=watermark_column,
+            )
+        finally:
+            cursor.close()
 
 # ==============================
 # Exécuter une requête
 # ==============================
-def execute_query(query: dict, params: dict) -> Optional[pd.DataFrame]:
+class QueryExecutionError(Exception):
+    """Échec d'exécution, déjà journalisé ; le message est destiné à l'utilisateur."""
+
+
+class QueryCancelledError(QueryExecutionError):
+    """Exécution annulée à la demande de l'utilisateur."""
+
+
+class QueryTimeoutError(QueryExecutionError):
+    """Exécution interrompue par le watchdog (délai de la requête dépassé)."""
+
+
+# Erreurs SQL Server d'une table dérivée (pagination, extraction incrémentale) dont une
+# colonne est sans nom (8155) ou nommée deux fois (8156)
+DERIVED_TABLE_ERRORS = ("(8155)", "(8156)")
+
+
+def database_error_message(error: pyodbc.Error) -> str:
+    """Message utilisateur d'une erreur pyodbc."""
+    if any(code in str(error) for code in DERIVED_TABLE_ERRORS):
+        return ("Chaque colonne du résultat doit avoir un nom unique pour la pagination ou l'extraction "
+                f"incrémentale : ajoutez un alias (AS nom) aux expressions et aux doublons. ({str(error)})")
+    return f"Erreur de base de données: {str(error)}"
+
+
+def get_query_timeout(query: dict) -> int:
+    """Délai max de la requête (colonne timeout_seconds), ou QUERY_TIMEOUT par défaut."""
+    timeout = query.get("timeout_seconds")
+    return QUERY_TIMEOUT if timeout is None else int(timeout)
+
+
+class _Watchdog:
+    """Annule l'instruction côté serveur (`cursor.cancel()`) au-delà de `timeout` secondes."""
+
+    def __init__(self, timeout: int):
+        self.timeout = timeout
+        self.fired = threading.Event()
+        self.started_at = time.monotonic()
+        self._cursor = None
+        self._timer = None
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def attach(self, cursor):
+        """Arme le minuteur sur le curseur qui va exécuter l'instruction."""
+        self._cursor = cursor
+        self.started_at = time.monotonic()
+        if self.timeout > 0:
+            self._timer = threading.Timer(self.timeout, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def _fire(self):
+        self.fired.set()
+        try:
+            self._cursor.cancel()
+        except pyodbc.Error:
+            pass
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Compaction des types après lecture (désactivable par RESULT_COMPACTION=0)."""
+    return result_compactor.compact(df) if result_compactor.RESULT_COMPACTION else df
+
+
+def _pending_watermark(result, stream: ResultStream, query_id: int, scope: str, column: str, previous: Any):
     """
-    Exécute la requête SQL prédéfinie avec pyodbc et retourne un DataFrame
-    + Journalisation dans la table logs
+    Décrit dans `attrs["watermark"]` le point de reprise atteint (plus grande valeur
+    lue), sans l'enregistrer : voir commit_watermark. Un résultat tronqué ne fait pas
+    avancer le point : les lignes non lues seraient perdues.
+    """
+    high_water = stream.high_water
+    if hasattr(high_water, "item") and not isinstance(high_water, pd.Timestamp):
+        high_water = high_water.item()  # Scalaire numpy → Python
+    advanced = not stream.truncated and high_water is not None and (previous is None or high_water > previous)
+    result.attrs["watermark"] = {
+        "column": column,
+        "from": previous,
+        "to": high_water if advanced else previous,
+        "incremental": previous is not None,
+        "query_id": query_id,
+        "scope": scope,
+        "pending": advanced,  # À enregistrer une fois le résultat livré
+    }
+
+
+def commit_watermark(result, username: str) -> bool:
+    """
+    Enregistre le point de reprise d'un résultat incrémental de run_query. À appeler
+    une fois le résultat livré (fichier écrit, résultat affiché) : en cas d'échec
+    avant, la prochaine extraction relit les mêmes lignes au lieu de les sauter.
+    Sans effet si le point est déjà enregistré ou n'avance pas ; True s'il a avancé.
+    """
+    watermark = getattr(result, "attrs", {}).get("watermark")
+    if not watermark or not watermark.get("pending"):
+        return False
+    query_id, column, previous = watermark["query_id"], watermark["column"], watermark["from"]
+    watermark_manager.set_watermark(query_id, watermark["scope"], column, watermark["to"])
+    watermark["pending"] = False
+    log_action(username, query_id, "watermark",
+               f"Point de reprise {column} : {previous if previous is not None else '(début)'} → {watermark['to']}")
+    return True
+
+
+def run_query(query: dict, params: dict, username: str, max_rows: Optional[int] = None,
+              max_bytes: Optional[int] = None, use_cache: bool = True,
+              on_cursor: Optional[Callable] = None, on_chunk: Optional[Callable] = None,
+              cancel_event: Optional[threading.Event] = None,
+              timeout: Optional[int] = None,
+              spill_owner: Optional[str] = None,
+              watermark_scope: Optional[str] = None,
+              full_refresh: bool = False) -> Union[pd.DataFrame, "result_store.SpilledResult"]:
+    """
+    Cœur d'exécution, sans interface : utilisable depuis la page comme depuis un thread.
+
+    Retourne un DataFrame (voir execute_query) ou lève QueryExecutionError après
+    journalisation. Avec `spill_owner` (identifiant de session), un résultat
+    volumineux est écrit sur disque et retourné sous forme de SpilledResult. `on_chunk(stream)` est appelé après chaque lot lu ; si
+    `cancel_event` est positionné, la lecture s'interrompt (QueryCancelledError).
+    Au-delà du délai de la requête, le watchdog annule l'instruction (QueryTimeoutError).
+
+    Pour une requête déclarant une `watermark_column`, `watermark_scope` (voir
+    watermark_manager) active l'extraction incrémentale : seules les lignes postérieures
+    au dernier point de reprise de ce consommateur sont lues. Le nouveau point (plus
+    grande valeur lue) n'est enregistré que par commit_watermark, une fois le résultat
+    livré. `full_refresh=True` relit tout l'historique et repositionne le point de
+    reprise. `attrs["watermark"]` décrit l'extraction (début, fin, mode).
     """
-    username = st.session_state.get("username", "unknown")  # Récupérer l’utilisateur
     query_id = query.get("id", None)
 
-    try:
-        # 1️⃣ Récupérer la connexion
-        db_info = db_connection.get_connection_by_id(query["db_id"])
-        if not db_info:
-            st.error("Connexion introuvable en base.")
-            log_action(username, query_id, "error", "Connexion introuvable en base")
-            return None
-
-        # Déchiffrer le mot de passe
-        try:
-            db_info["password"] = db_connection.decrypt_password(db_info["password"])
-        except Exception as e:
-            st.error(f"Erreur de déchiffrement du mot de passe: {str(e)}")
-            log_action(username, query_id, "error", f"Déchiffrement impossible: {str(e)}")
-            return None
-
-        # 2️⃣ Établir la connexion
-        db = db_connection.DatabaseConnection(db_info)
-        conn = db.get_connection()
-        
-        if not conn:
-            st.error("Échec de la connexion à la base de données.")
-            log_action(username, query_id, "error", "Échec connexion DB")
-            return None
+    # Extraction incrémentale : point de reprise de ce consommateur
+    watermark_column = (query.get("watermark_column") or "").strip() or None
+    if query_id is None or watermark_scope is None:
+        watermark_column = None
+    watermark = None
+    if watermark_column and not full_refresh:
+        watermark = watermark_manager.get_watermark(query_id, watermark_scope, watermark_column)
 
-        cursor = conn.cursor()
+    # 0️⃣ Résultat déjà en cache ?
+    cache = result_cache.get_cache()
+    cache_ttl = cache.ttl_for(query)
+    cache_key = None
+    # Pas de cache pour une extraction incrémentale (les nouvelles lignes doivent être lues)
+    # ni pour une écriture (INSERT ... OUTPUT retourne des lignes, mais doit être rejouée)
+    if use_cache and query_id is not None and cache_ttl > 0 and watermark_column is None \
+            and not is_write_query(query):
+        cache_key = result_cache.make_key(query, params)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            cached.attrs["from_cache"] = True
+            log_action(username, query_id, "cache_hit", "Résultat servi depuis le cache")
+            return cached
 
-        # 3️⃣ Préparer la requête SQL avec paramètres
-        sql = query["sql_text"]
-        param_names = get_query_parameters(query)
+    watchdog = _Watchdog(get_query_timeout(query) if timeout is None else timeout)
 
-        for param_name in param_names:
-            if param_name in params:
-                sql = re.sub(rf":{param_name}\b", "?", sql)
+    def check_cancelled(*_):
+        if watchdog.fired.is_set():
+            raise QueryTimeoutError(watchdog_message())
+        if cancel_event is not None and cancel_event.is_set():
+            raise QueryCancelledError("Exécution annulée par l'utilisateur")
 
-        values = []
-        for param_name in param_names:
-            if param_name in params:
-                values.append(params[param_name])
-            else:
-                msg = f"Paramètre manquant: {param_name}"
-                st.error(msg)
-                log_action(username, query_id, "error", msg)
-                return None
+    def watchdog_message():
+        return (f"Délai d'exécution dépassé ({watchdog.timeout} s) : "
+                f"instruction annulée après {watchdog.elapsed:.1f} s")
 
-        # 4️⃣ Exécuter la requête
-        cursor.execute(sql, values)
+    def before_execute(cursor):
+        check_cancelled()
+        watchdog.attach(cursor)
+        if on_cursor is not None:
+            on_cursor(cursor)
 
-        if cursor.description:
-            columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
-            df = pd.DataFrame.from_records(rows, columns=columns)
-            log_action(username, query_id, "success", "Requête exécutée avec succès")
-        else:
-            conn.commit()
-            df = pd.DataFrame({
-                "Status": [f"Query executed successfully. {cursor.rowcount} row(s) affected."]
-            })
-            log_action(username, query_id, "success", f"Écriture en DB : {cursor.rowcount} ligne(s) affectée(s)")
+    def after_chunk(stream):
+        if on_chunk is not None:
+            on_chunk(stream)
+        check_cancelled()
+
+    try:
+        with open_result_stream(query, params, max_rows=max_rows, max_bytes=max_bytes,
+                                on_cursor=before_execute, watermark=watermark,
+                                watermark_column=watermark_column) as stream:
+            if stream.has_rows:
+                df = stream.collect(on_chunk=after_chunk, spill_owner=spill_owner)
+                if watermark_column:
+                    _pending_watermark(df, stream, query_id, watermark_scope, watermark_column, watermark)
+                if isinstance(df, pd.DataFrame):
+                    df = _compact(df)
+                    if cache_key is not None and not stream.truncated:
+                        cache.put(cache_key, df, cache_ttl)
+                if stream.truncated:
+                    log_action(username, query_id, "success",
+                               f"Requête exécutée avec succès (résultat tronqué à {stream.row_count} ligne(s))")
+                else:
+                    log_action(username, query_id, "success", "Requête exécutée avec succès")
+            else:
+                stream.connection.commit()
+                rowcount = stream.cursor.rowcount
+                df = pd.DataFrame({
+                    "Status": [f"Query executed successfully. {rowcount} row(s) affected."]
+                })
+                log_action(username, query_id, "success", f"Écriture en DB : {rowcount} ligne(s) affectée(s)")
 
-        conn.close()
         return df
 
+    except QueryTimeoutError as e:
+        log_action(username, query_id, "timeout", str(e))
+        raise
+
+    except QueryCancelledError as e:
+        log_action(username, query_id, "cancelled", str(e))
+        raise
+
+    except QueryPreparationError as e:
+        msg = str(e)
+        log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg) from e
+
+    except PoolTimeoutError as e:
+        msg = f"Base de données saturée: {str(e)}"
+        log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg) from e
+
+    except result_store.SpillQuotaError as e:
+        msg = str(e)
+        log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg) from e
+
     except pyodbc.Error as e:
-        msg = f"Erreur de base de données: {str(e)}"
-        st.error(msg)
+        if watchdog.fired.is_set():
+            msg = watchdog_message()
+            log_action(username, query_id, "timeout", msg)
+            raise QueryTimeoutError(msg) from e
+        if cancel_event is not None and cancel_event.is_set():
+            # cursor.cancel() fait échouer l'instruction en cours côté pilote
+            msg = "Exécution annulée par l'utilisateur"
+            log_action(username, query_id, "cancelled", msg)
+            raise QueryCancelledError(msg) from e
+        msg = database_error_message(e)
         log_action(username, query_id, "error", msg)
-        return None
+        raise QueryExecutionError(msg) from e
 
     except Exception as e:
         msg = f"Erreur inattendue: {str(e)}"
-        st.error(msg)
         log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg) from e
+
+    finally:
+        watchdog.stop()
+
+
+def current_session_id() -> str:
+    """Identifiant de la session Streamlit courante (quota disque des résultats)."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else st.session_state.get("username", "unknown")
+
+
+def execute_query(query: dict, params: dict, max_rows: Optional[int] = None,
+                  max_bytes: Optional[int] = None, use_cache: bool = True,
+                  spill: bool = False) -> Optional[Union[pd.DataFrame, "result_store.SpilledResult"]]:
+    """
+    Exécute la requête SQL prédéfinie avec pyodbc et retourne un DataFrame
+    + Journalisation dans la table logs
+
+    Les lignes sont lues par lots ; si un plafond est atteint, le DataFrame est
+    partiel et `df.attrs["truncated"]` vaut True. Un résultat encore valide dans
+    le cache est renvoyé sans aller sur SQL Server (`df.attrs["from_cache"]`).
+    Avec `spill=True`, un résultat volumineux est conservé sur disque et retourné
+    sous forme de SpilledResult (itérable par lots, `head()`, `to_dataframe()`).
+    """
+    username = st.session_state.get("username", "unknown")  # Récupérer l’utilisateur
+
+    try:
+        return run_query(query, params, username, max_rows=max_rows,
+                         max_bytes=max_bytes, use_cache=use_cache,
+                         spill_owner=current_session_id() if spill else None)
+    except QueryExecutionError as e:
+        st.error(str(e))
         return None
 
+# ==============================
+# Exécution par lot
+# ==============================
+WRITE_KEYWORDS = {"INSERT", "UPDATE", "DELETE", "MERGE"}
+
+
+class BatchProgress:
+    """Avancement d'un lot, transmis à `on_chunk` après chaque exécution."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.completed = 0
+        self.row_count = 0
+
+
+def is_write_query(query: dict) -> bool:
+    """Vrai si l'instruction modifie des données (INSERT/UPDATE/DELETE/MERGE)."""
+    return query_compiler.leading_keyword(query["sql_text"]) in WRITE_KEYWORDS
+
+
+def run_batch(query: dict, param_rows: List[dict], username: str, max_workers: Optional[int] = None,
+              on_cursor: Optional[Callable] = None, on_chunk: Optional[Callable] = None,
+              cancel_event: Optional[threading.Event] = None,
+              timeout: Optional[int] = None) -> pd.DataFrame:
+    """
+    Exécute la requête pour chaque jeu de paramètres de `param_rows`.
+
+    Toutes les lignes sont converties avant le premier échange avec la base. Une
+    lecture s'exécute en parallèle (au plus `max_workers` connexions du pool) et les
+    résultats sont concaténés dans l'ordre, marqués par la colonne BATCH_ROW_COLUMN
+    (suffixée si le résultat a déjà une colonne de ce nom, cf. insert_marker_column) ;
+    une écriture part en un seul `executemany` (fast_executemany). Une seule entrée
+    est journalisée pour tout le lot ; les erreurs par ligne sont dans
+    `df.attrs["batch_errors"]`.
+    """
+    query_id = query.get("id", None)
+    started = time.monotonic()
+
+    if not param_rows:
+        raise QueryExecutionError("Aucune ligne de paramètres à exécuter")
+    if BATCH_MAX_ROWS and len(param_rows) > BATCH_MAX_ROWS:
+        msg = f"Lot refusé : {len(param_rows)} lignes (maximum {BATCH_MAX_ROWS})"
+        log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg)
+
+    # 1️⃣ Conversion de toutes les lignes avant tout aller-retour
+    compiled = query_compiler.compile_query(query)
+    bound = []
+    for index, row in enumerate(param_rows, start=1):
+        try:
+            bound.append(compiled.bind(row))
+        except ValueError as e:
+            msg = f"Lot refusé, ligne {index} : {str(e)}"
+            log_action(username, query_id, "error", msg)
+            raise QueryExecutionError(msg) from e
+
+    try:
+        db_info = get_target_connection_info(query["db_id"])
+    except QueryPreparationError as e:
+        log_action(username, query_id, "error", str(e))
+        raise QueryExecutionError(str(e)) from e
+
+    progress = BatchProgress(len(bound))
+    try:
+        if is_write_query(query):
+            df, errors = _run_batch_write(query, compiled, bound, db_info, progress,
+                                          on_cursor, on_chunk, cancel_event, timeout)
+        else:
+            df, errors = _run_batch_read(query, param_rows, db_info, progress, max_workers,
+                                         on_cursor, on_chunk, cancel_event, timeout)
+    except QueryCancelledError as e:
+        log_action(username, query_id, "cancelled", str(e))
+        raise
+    except QueryTimeoutError as e:
+        log_action(username, query_id, "timeout", str(e))
+        raise
+    except QueryExecutionError as e:
+        log_action(username, query_id, "error", str(e))
+        raise
+    except PoolTimeoutError as e:
+        msg = f"Base de données saturée: {str(e)}"
+        log_action(username, query_id, "error", msg)
+        raise QueryExecutionError(msg) from e
+
+    elapsed = time.monotonic() - started
+    summary = (f"Lot de {len(bound)} exécution(s) : {len(bound) - len(errors)} réussie(s), "
+               f"{len(errors)} en erreur, {progress.row_count} ligne(s) en {elapsed:.1f} s")
+    log_action(username, query_id, "error" if errors else "success", summary)
+
+    df = _compact(df)
+    df.attrs["batch_size"] = len(bound)
+    df.attrs["batch_errors"] = errors
+    return df
+
+
+def insert_marker_column(df: pd.DataFrame, column: str, value) -> str:
+    """
+    Ajoute en tête la colonne de rattachement `column` (ligne du lot, base d'origine)
+    et retourne son nom : `column_2`, `column_3`... si le résultat a déjà une colonne
+    de ce nom, qui reste intacte.
+    """
+    name, suffix = column, 1
+    while name in df.columns:
+        suffix += 1
+        name = f"{column}_{suffix}"
+    df.insert(0, name, value)
+    return name
+
+
+def _fetch_dataframe(query, params, db_info, on_cursor, cancel_event, timeout) -> Optional[pd.DataFrame]:
+    """
+    Une exécution complète pour les lots et le multi-bases : résultat entier ou
+    None (instruction sans jeu de résultats), sous watchdog, sans journalisation.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise QueryCancelledError("Exécution annulée par l'utilisateur")
+    watchdog = _Watchdog(timeout)
+
+    def attach(cursor):
+        watchdog.attach(cursor)
+        if on_cursor is not None:
+            on_cursor(cursor)
+
+    try:
+        with open_result_stream(query, params, on_cursor=attach, db_info=db_info) as stream:
+            if not stream.has_rows:
+                stream.connection.commit()
+                return None
+            return stream.to_dataframe()
+    except pyodbc.Error as e:
+        if watchdog.fired.is_set():
+            raise QueryTimeoutError(f"Délai d'exécution dépassé ({watchdog.timeout} s)") from e
+        raise
+    finally:
+        watchdog.stop()
+
+
+def _run_batch_read(query, param_rows, db_info, progress, max_workers,
+                    on_cursor, on_chunk, cancel_event, timeout):
+    """Lectures parallèles sur des connexions du pool ; une erreur n'arrête pas le lot."""
+    workers = min(max_workers or BATCH_MAX_WORKERS, connection_pool.POOL_MAX_SIZE, len(param_rows))
+    statement_timeout = get_query_timeout(query) if timeout is None else timeout
+
+    def run_one(index, params):
+        df = _fetch_dataframe(query, params, db_info, on_cursor, cancel_event, statement_timeout)
+        if df is None:
+            return pd.DataFrame({BATCH_ROW_COLUMN: [index]})
+        insert_marker_column(df, BATCH_ROW_COLUMN, index)
+        return df
+
+    frames, errors = {}, []
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-batch")
+    try:
+        futures = {executor.submit(run_one, index, params): index
+                   for index, params in enumerate(param_rows, start=1)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                frames[index] = future.result()
+                progress.row_count += len(frames[index])
+            except Exception as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise QueryCancelledError("Exécution annulée par l'utilisateur") from e
+                errors.append((index, str(e)))
+            progress.completed += 1
+            if on_chunk is not None:
+                on_chunk(progress)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    ordered = [frames[i] for i in sorted(frames)]
+    df = pd.concat(ordered, ignore_index=True) if ordered else pd.DataFrame(columns=[BATCH_ROW_COLUMN])
+    return df, sorted(errors)
+
+
+def _run_batch_write(query, compiled, bound, db_info, progress, on_cursor, on_chunk, cancel_event, timeout):
+    """Un seul executemany (fast_executemany) dans une transaction, sous watchdog."""
+    watchdog = _Watchdog(get_query_timeout(query) if timeout is None else timeout)
+    try:
+        with db_connection.borrow_connection(db_info) as conn:
+            cursor = conn.cursor()
+            try:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise QueryCancelledError("Exécution annulée par l'utilisateur")
+                watchdog.attach(cursor)
+                if on_cursor is not None:
+                    on_cursor(cursor)
+                cursor.fast_executemany = True
+                if bound[0]:
+                    cursor.setinputsizes(get_input_sizes(query, _widest_row(bound)))
+                cursor.executemany(compiled.sql, bound)
+                conn.commit()
+                rowcount = cursor.rowcount
+            finally:
+                cursor.close()
+    except pyodbc.Error as e:
+        if watchdog.fired.is_set():
+            raise QueryTimeoutError(f"Délai d'exécution dépassé ({watchdog.timeout} s), lot annulé") from e
+        if cancel_event is not None and cancel_event.is_set():
+            raise QueryCancelledError("Exécution annulée par l'utilisateur") from e
+        raise QueryExecutionError(f"Erreur de base de données: {str(e)}") from e
+    finally:
+        watchdog.stop()
+
+    progress.completed = len(bound)
+    progress.row_count = max(rowcount, 0)
+    if on_chunk is not None:
+        on_chunk(progress)
+    affected = f"{rowcount} ligne(s) affectée(s)" if rowcount >= 0 else "lignes affectées non communiquées"
+    df = pd.DataFrame({"Status": [f"Lot exécuté : {len(bound)} exécution(s), {affected}."]})
+    return df, []
+
+
+def _widest_row(rows: List[List[Any]]) -> List[Any]:
+    """Pour chaque colonne, la chaîne la plus longue : les tailles déclarées couvrent tout le lot."""
+    widest = list(rows[0])
+    for row in rows[1:]:
+        for i, value in enumerate(row):
+            if isinstance(value, str) and len(value) > len(widest[i] if isinstance(widest[i], str) else ""):
+                widest[i] = value
+    return widest
+
+# ==============================
+# Exécution multi-bases
+# ==============================
+class FanoutProgress(BatchProgress):
+    """Avancement d'une exécution multi-bases ; `frames` contient les résultats déjà reçus."""
+
+    def __init__(self, total: int):
+        super().__init__(total)
+        self.frames = []
+
+
+def run_fanout(query: dict, params: dict, username: str, conn_ids: List[int],
+               max_workers: Optional[int] = None, on_cursor: Optional[Callable] = None,
+               on_chunk: Optional[Callable] = None, cancel_event: Optional[threading.Event] = None,
+               timeout: Optional[int] = None) -> pd.DataFrame:
+    """
+    Exécute la même requête sur plusieurs bases enregistrées (au plus `max_workers`
+    à la fois) et retourne l'union des résultats avec la colonne FANOUT_SOURCE_COLUMN
+    (suffixée si le résultat a déjà une colonne de ce nom, cf. insert_marker_column).
+
+    L'échec d'une base n'interrompt pas les autres : durée, nombre de lignes et erreur
+    de chaque base sont dans `df.attrs["fanout_report"]`. Une seule entrée est journalisée.
+    """
+    query_id = query.get("id", None)
+    started = time.monotonic()
+
+    if not conn_ids:
+        raise QueryExecutionError("Aucune base de données sélectionnée")
+    try:
+        prepare_statement(query, params)  # Paramètres vérifiés une fois, avant tout échange
+    except QueryPreparationError as e:
+        log_action(username, query_id, "error", str(e))
+        raise QueryExecutionError(str(e)) from e
+
+    names = {c[0]: c[1] for c in db_connection.get_all_connections()}
+    statement_timeout = get_query_timeout(query) if timeout is None else timeout
+    workers = min(max_workers or FANOUT_MAX_WORKERS, len(conn_ids))
+    progress = FanoutProgress(len(conn_ids))
+    results, report = {}, {}
+
+    def run_one(conn_id):
+        conn_started = time.monotonic()
+        db_info = get_target_connection_info(conn_id)
+        df = _fetch_dataframe({**query, "db_id": conn_id}, params, db_info,
+                              on_cursor, cancel_event, statement_timeout)
+        if df is None:
+            df = pd.DataFrame()
+        insert_marker_column(df, FANOUT_SOURCE_COLUMN, names.get(conn_id, str(conn_id)))
+        return df, time.monotonic() - conn_started
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query-fanout")
+    try:
+        futures = {executor.submit(run_one, conn_id): conn_id for conn_id in conn_ids}
+        for future in as_completed(futures):
+            conn_id = futures[future]
+            name = names.get(conn_id, str(conn_id))
+            try:
+                df, duration = future.result()
+                results[conn_id] = df
+                progress.frames.append(df)
+                progress.row_count += len(df)
+                report[conn_id] = {"Base": name, "Statut": "success", "Lignes": len(df),
+                                   "Durée (s)": round(duration, 2), "Erreur": ""}
+            except Exception as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    log_action(username, query_id, "cancelled", "Exécution multi-bases annulée par l'utilisateur")
+                    raise QueryCancelledError("Exécution annulée par l'utilisateur") from e
+                report[conn_id] = {"Base": name, "Statut": "error", "Lignes": 0,
+                                   "Durée (s)": None, "Erreur": str(e)}
+            progress.completed += 1
+            if on_chunk is not None:
+                on_chunk(progress)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # Union dans l'ordre de sélection des bases ; sans aucune ligne, les colonnes du
+    # premier résultat reçu sont conservées (le compte rendu reste attaché au tableau vide)
+    frames = [results[c] for c in conn_ids if c in results and len(results[c])]
+    frames = frames or [results[c] for c in conn_ids if c in results][:1]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=[FANOUT_SOURCE_COLUMN])
+
+    failed = [r for r in report.values() if r["Statut"] == "error"]
+    elapsed = time.monotonic() - started
+    log_action(username, query_id, "error" if failed else "success",
+               f"Exécution multi-bases sur {len(conn_ids)} base(s) : {len(conn_ids) - len(failed)} réussie(s), "
+               f"{len(failed)} en erreur, {len(df)} ligne(s) en {elapsed:.1f} s")
+
+    df = _compact(df)
+    df.attrs["fanout_report"] = [report[c] for c in conn_ids if c in report]
+    return df
+
+# ==============================
+# Navigation page par page
+# ==============================
+BROWSE_KEYSET = "keyset"
+BROWSE_OFFSET = "offset"
+
+
+class ResultBrowser:
+    """
+    Parcours d'un résultat page par page : seule la page affichée est lue sur SQL Server.
+
+    Avec une colonne clé déclarée (`page_key`), chaque page reprend après la dernière
+    clé lue (pagination par clé, coût constant) ; sinon OFFSET/FETCH. Les paramètres
+    sont liés et la connexion cible résolue une seule fois : chaque page réutilise une
+    connexion ouverte du pool. L'objet se conserve dans la session Streamlit.
+    """
+
+    def __init__(self, query: dict, params: dict, username: str, page_size: Optional[int] = None):
+        self.query = query
+        self.username = username
+        self.page_size = page_size or BROWSE_PAGE_SIZE
+        self.sql, self.values = prepare_statement(query, params)
+        self.input_sizes = get_input_sizes(query, self.values) if self.values else []
+        self.db_info = get_target_connection_info(query["db_id"])
+        self.key_column = (query.get("page_key") or "").strip() or None
+        if self.key_column and query_compiler.leading_keyword(self.sql) == "SELECT":
+            self.mode = BROWSE_KEYSET
+        else:
+            self.mode = BROWSE_OFFSET  # Pas de clé, ou CTE impossible à encapsuler
+        self.page = 0
+        self.has_next = False
+        self._last_keys = []  # Dernière clé de chaque page lue (reprise en mode clé)
+
+    def fetch_page(self, page: int) -> pd.DataFrame:
+        """Lit la page `page` (0 = première) ; lève QueryExecutionError après journalisation."""
+        if page < 0 or (self.mode == BROWSE_KEYSET and page > len(self._last_keys)):
+            raise ValueError(f"Page {page + 1} inaccessible")
+        query_id = self.query.get("id")
+        watchdog = _Watchdog(get_query_timeout(self.query))
+        try:
+            sql, values, sizes = self._page_statement(page)
+            with db_connection.borrow_connection(self.db_info) as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.setinputsizes(sizes)
+                    watchdog.attach(cursor)
+                    cursor.execute(sql, values)
+                    if cursor.description is None:
+                        raise QueryPreparationError("La requête ne retourne pas de résultat à parcourir")
+                    columns = [desc[0] for desc in cursor.description]
+                    type_codes = [desc[1] for desc in cursor.description]
+                    rows = cursor.fetchmany(self.page_size + 1)  # Une ligne de plus : existe-t-il une page suivante ?
+                finally:
+                    cursor.close()
+        except QueryPreparationError as e:
+            log_action(self.username, query_id, "error", str(e))
+            raise QueryExecutionError(str(e)) from e
+        except PoolTimeoutError as e:
+            msg = f"Base de données saturée: {str(e)}"
+            log_action(self.username, query_id, "error", msg)
+            raise QueryExecutionError(msg) from e
+        except pyodbc.Error as e:
+            if watchdog.fired.is_set():
+                msg = f"Délai d'exécution dépassé ({watchdog.timeout} s)"
+                log_action(self.username, query_id, "timeout", msg)
+                raise QueryTimeoutError(msg) from e
+            msg = database_error_message(e)
+            log_action(self.username, query_id, "error", msg)
+            raise QueryExecutionError(msg) from e
+        finally:
+            watchdog.stop()
+
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        df = result_builder.build_chunk(rows, columns, type_codes)
+        if self.mode == BROWSE_KEYSET and rows:
+            key_index = self._key_index(columns)
+            del self._last_keys[page:]
+            self._last_keys.append(rows[-1][key_index])
+        self.page = page
+        if page == 0:
+            mode = "par clé" if self.mode == BROWSE_KEYSET else "OFFSET/FETCH"
+            log_action(self.username, query_id, "success", f"Navigation paginée ({mode}, {self.page_size} lignes par page)")
+        return df
+
+    def _page_statement(self, page: int):
+        """SQL, valeurs et types des paramètres pour une page ; QueryPreparationError si non paginable."""
+        bigint = (pyodbc.SQL_BIGINT, 0, 0)
+        try:
+            if self.mode == BROWSE_KEYSET:
+                sql = query_compiler.paginate_keyset(self.sql, self.key_column, page > 0)
+            else:
+                sql = query_compiler.paginate_offset(self.sql)
+        except ValueError as e:
+            raise QueryPreparationError(str(e))
+        if self.mode == BROWSE_KEYSET:
+            after_key = page > 0
+            values = [self.page_size + 1] + self.values
+            sizes = [bigint] + self.input_sizes
+            if after_key:
+                values.append(self._last_keys[page - 1])
+                sizes.append(None)  # Type de la clé : déduit de la valeur par le pilote
+            return sql, values, sizes
+        return sql, self.values + [page * self.page_size, self.page_size + 1], self.input_sizes + [bigint, bigint]
+
+    def _key_index(self, columns: List[str]) -> int:
+        lowered = [c.lower() for c in columns]
+        if self.key_column.lower() not in lowered:
+            raise QueryExecutionError(f"Colonne clé '{self.key_column}' absente du résultat")
+        return lowered.index(self.key_column.lower())
+
+
+def open_browser(query: dict, params: dict, username: str, page_size: Optional[int] = None) -> ResultBrowser:
+    """Prépare la navigation ; lève QueryExecutionError (paramètres, connexion) après journalisation."""
+    try:
+        return ResultBrowser(query, params, username, page_size=page_size)
+    except QueryPreparationError as e:
+        log_action(username, query.get("id"), "error", str(e))
+        raise QueryExecutionError(str(e)) from e
+
 # ==============================
 # Export CSV
 # ==============================
-def export_csv(df: pd.DataFrame) -> bytes:
-    """Exporte un DataFrame en CSV"""
-    return df.to_csv(index=False, encoding='utf-8').encode('utf-8')
+def iter_chunks(data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Normalise un DataFrame ou un flux de lots (ou un SpilledResult) en itérateur de
+    DataFrames ; un DataFrame est découpé en tranches de `chunk_rows` lignes (vues).
+    """
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, max(len(data), 1), chunk_rows):
+            yield data.iloc[start:start + chunk_rows]
+    else:
+        yield from data
+
+
+def _compressor(compression: Optional[str]):
+    """Compresseur incrémental (compress/flush) : gzip via zlib, zstd via zstandard."""
+    if not compression:
+        return None
+    if compression == "gzip":
+        return zlib.compressobj(wbits=31)  # wbits=31 : format gzip
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Compression zstd indisponible (paquet zstandard non installé)")
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError(f"Compression inconnue : {compression}")
+
+
+def iter_csv(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], delimiter: Optional[str] = None,
+             compression: Optional[str] = None) -> Iterator[bytes]:
+    """
+    CSV encodé en UTF-8 produit lot par lot (gzip ou zstd en option) : seul le lot en
+    cours est en mémoire, quel que soit le nombre de lignes (DataFrame, SpilledResult
+    ou tout itérable de lots).
+    """
+    compressor = _compressor(compression)
+    buffer = io.StringIO()
+    for i, chunk in enumerate(iter_chunks(data)):
+        chunk.to_csv(buffer, index=False, header=(i == 0), sep=delimiter or CSV_DELIMITER)
+        encoded = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        if compressor is not None:
+            encoded = compressor.compress(encoded)
+        if encoded:
+            yield encoded
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def write_csv(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], target, delimiter: Optional[str] = None,
+              compression: Optional[str] = None) -> int:
+    """Écrit le CSV dans un fichier binaire ouvert ou un chemin ; retourne le nombre d'octets écrits."""
+    written = 0
+    with (open(target, "wb") if isinstance(target, (str, os.PathLike)) else nullcontext(target)) as output:
+        for part in iter_csv(data, delimiter=delimiter, compression=compression):
+            output.write(part)
+            written += len(part)
+    return written
+
+
+# ==============================
+# Export Parquet
+# ==============================
+def _unique_names(columns) -> List[str]:
+    """Parquet exige des noms de colonnes uniques : les doublons reçoivent un suffixe."""
+    seen, names = {}, []
+    for column in map(str, columns):
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        names.append(column if count == 0 else f"{column}_{count + 1}")
+    return names
+
+
+def _parquet_schema(reference: pd.DataFrame, names: List[str], arrow_types: Optional[List]):
+    """
+    Schéma du fichier : types annoncés par la source (`arrow_types`, cursor.description
+    ou schéma d'un résultat sur disque), sinon déduits de `reference`. Une colonne vide
+    dont le type reste inconnu est écrite en texte ; retourne aussi leurs positions.
+    """
+    schema = pa.Schema.from_pandas(reference.set_axis(names, axis=1), preserve_index=False)
+    text_columns = []
+    for i, field in enumerate(schema):
+        known = arrow_types[i] if arrow_types and i < len(arrow_types) else None
+        if known is not None:
+            schema = schema.set(i, pa.field(field.name, known))
+        elif field.type == pa.null():
+            schema = schema.set(i, pa.field(field.name, pa.string()))
+            text_columns.append(i)
+    return schema.remove_metadata(), text_columns
+
+
+def _as_text(chunk: pd.DataFrame, positions: List[int]) -> pd.DataFrame:
+    """Colonnes écrites en texte : les valeurs des lots suivants sont converties en chaînes."""
+    chunk = chunk.copy(deep=False)
+    for i in positions:
+        values = chunk.iloc[:, i]
+        chunk.isetitem(i, values.astype(object).map(str).where(values.notna(), None))
+    return chunk
+
+
+def write_parquet(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], target,
+                  compression: str = "snappy") -> int:
+    """
+    Écrit un fichier Parquet lot par lot (un groupe de lignes par lot) ; le schéma vient
+    des types de la source quand elle les connaît (ResultStream, SpilledResult), sinon
+    du premier lot (ou du DataFrame entier). Retourne le nombre de lignes.
+    """
+    if pa is None:
+        raise ValueError("Export Parquet indisponible (paquet pyarrow non installé)")
+    writer, schema, names, text_columns, rows = None, None, None, [], 0
+    try:
+        for chunk in iter_chunks(data):
+            if writer is None:
+                names = _unique_names(chunk.columns)
+                reference = data if isinstance(data, pd.DataFrame) else chunk
+                known = None if isinstance(data, pd.DataFrame) else getattr(data, "arrow_types", None)
+                schema, text_columns = _parquet_schema(reference, names, known)
+                writer = pq.ParquetWriter(target, schema, compression=compression)
+            if text_columns:
+                chunk = _as_text(chunk, text_columns)
+            table = pa.Table.from_pandas(chunk.set_axis(names, axis=1), schema=schema,
+                                         preserve_index=False, safe=False)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
 
 # ==============================
 # Export Excel
 # ==============================
-def export_excel(df: pd.DataFrame) -> bytes:
-    """Exporte un DataFrame en Excel"""
-    from io import BytesIO
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Résultats')
-    return output.getvalue()
\ No newline at end of file
+def _excel_column(values: pd.Series) -> list:
+    """
+    Valeurs d'une colonne en types natifs openpyxl : nombres, dates (sans fuseau),
+    chaînes sans caractères interdits ; NaN/NaT/NA deviennent des cellules vides.
+    """
+    if isinstance(values.dtype, pd.DatetimeTZDtype):
+        values = values.dt.tz_localize(None)
+    converted = values.astype(object).where(values.notna(), None).tolist()
+    if values.dtype == object or isinstance(values.dtype, (pd.StringDtype, pd.CategoricalDtype)):
+        for i, value in enumerate(converted):
+            if isinstance(value, str):
+                converted[i] = ILLEGAL_CHARACTERS_RE.sub("", value)
+            elif isinstance(value, (bytes, bytearray)):
+                converted[i] = value.hex()
+    return converted
+
+
+def write_excel(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], target,
+                max_rows: int = EXCEL_MAX_ROWS) -> int:
+    """
+    Écrit un classeur openpyxl en mode write-only (mémoire constante) à partir des lots.
+    Au-delà de `max_rows` lignes (en-tête compris), une nouvelle feuille est ouverte
+    avec le même en-tête. Retourne le nombre de feuilles écrites.
+    """
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, header = None, 0, None
+
+    def new_sheet():
+        number = len(workbook.worksheets) + 1
+        created = workbook.create_sheet(EXCEL_SHEET_NAME if number == 1 else f"{EXCEL_SHEET_NAME} ({number})")
+        created.append(header or [])
+        return created
+
+    for chunk in iter_chunks(data):
+        if header is None:
+            header = [str(c) for c in chunk.columns]
+        columns = [_excel_column(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        for row in zip(*columns):
+            if sheet is None or sheet_rows >= max_rows:
+                sheet, sheet_rows = new_sheet(), 1
+            sheet.append(row)
+            sheet_rows += 1
+    if sheet is None:
+        new_sheet()  # Résultat vide : l'en-tête seul
+    workbook.save(target)
+    return len(workbook.worksheets)
+
+
+# ==============================
+# Formats d'export proposés
+# ==============================
+EXPORT_FORMATS = {
+    "csv": {"label": "CSV", "extension": "csv", "mime": "text/csv"},
+    "csv_gzip": {"label": "CSV compressé (gzip)", "extension": "csv.gz", "mime": "application/gzip"},
+    "csv_zstd": {"label": "CSV compressé (zstd)", "extension": "csv.zst", "mime": "application/zstd"},
+    "xlsx": {"label": "Excel", "extension": "xlsx",
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "parquet_snappy": {"label": "Parquet (snappy)", "extension": "parquet", "mime": "application/vnd.apache.parquet"},
+    "parquet_zstd": {"label": "Parquet (zstd)", "extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def get_export_formats() -> List[str]:
+    """Formats utilisables avec les paquets installés."""
+    formats = list(EXPORT_FORMATS)
+    if zstandard is None:
+        formats.remove("csv_zstd")
+    if pa is None:
+        formats = [f for f in formats if not f.startswith("parquet")]
+    return formats
+
+
+def write_export(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], target, fmt: str,
+                 delimiter: Optional[str] = None):
+    """Écrit l'export au format `fmt` (clé de EXPORT_FORMATS) dans un fichier binaire ouvert ou un chemin."""
+    if fmt == "csv":
+        write_csv(data, target, delimiter=delimiter)
+    elif fmt in ("csv_gzip", "csv_zstd"):
+        write_csv(data, target, delimiter=delimiter, compression=fmt.split("_")[1])
+    elif fmt == "xlsx":
+        write_excel(data, target)
+    elif fmt in ("parquet_snappy", "parquet_zstd"):
+        write_parquet(data, target, compression=fmt.split("_")[1])
+    else:
+        raise ValueError(f"Format d'export inconnu : {fmt}")
+
+
+def export_result_file(data: Union[pd.DataFrame, Iterable[pd.DataFrame]], fmt: str,
+                       delimiter: Optional[str] = None) -> str:
+    """
+    Écrit l'export dans un fichier temporaire de EXPORT_DIR et retourne son chemin (à
+    supprimer par l'appelant) : seul le lot en cours est en mémoire pendant l'écriture,
+    jamais le fichier entier ni sa version compressée.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=EXPORT_DIR, prefix="export_", suffix="." + EXPORT_FORMATS[fmt]["extension"])
+    try:
+        with os.fdopen(fd, "wb") as output:
+            write_export(data, output, fmt, delimiter=delimiter)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
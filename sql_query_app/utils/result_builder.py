@@ -0,0 +1,114 @@
+import os
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow est normalement installé avec streamlit
+    pa = None
+
+# ==============================
+# Configuration
+# ==============================
+RESULT_BUILDER = os.getenv("RESULT_BUILDER", "pandas").lower()  # "pandas" ou "arrow"
+
+# ==============================
+# Construction d'un lot de lignes en DataFrame
+# ==============================
+def build_pandas_chunk(rows: Sequence, columns: List[str]) -> pd.DataFrame:
+    """Chemin historique : DataFrame.from_records sur les objets Row (colonnes object)."""
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _arrow_type(type_code):
+    """Type Arrow correspondant au type Python annoncé par cursor.description."""
+    if pa is None:
+        return None
+    mapping = {
+        str: pa.string(),
+        int: pa.int64(),
+        float: pa.float64(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp("us"),
+        date: pa.date32(),
+        dt_time: pa.time64("us"),
+        bytes: pa.binary(),
+        bytearray: pa.binary(),
+    }
+    return mapping.get(type_code)  # Decimal et inconnus : type déduit des valeurs
+
+
+def arrow_types(description) -> List:
+    """
+    Type Arrow de chaque colonne d'après cursor.description (None = à déduire des
+    valeurs). Les Decimal prennent la précision et l'échelle annoncées par le pilote.
+    """
+    types = []
+    for desc in description:
+        type_code, precision, scale = desc[1], desc[4], desc[5]
+        if pa is not None and type_code is Decimal and precision and 0 < precision <= 38:
+            types.append(pa.decimal128(precision, scale or 0))
+        else:
+            types.append(_arrow_type(type_code))
+    return types
+
+
+def _arrow_types_mapper(arrow_type):
+    # Chaînes conservées en mémoire Arrow : pas de colonnes object, sérialisation directe
+    if arrow_type == pa.string() or arrow_type == pa.large_string():
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _to_object_matrix(rows: Sequence, width: int) -> np.ndarray:
+    """Transpose les lignes en une matrice object (une seule passe, en C)."""
+    matrix = np.empty((len(rows), width), dtype=object)
+    matrix[:] = [tuple(row) for row in rows] if rows and not isinstance(rows[0], tuple) else rows
+    return matrix
+
+
+def build_arrow_columns(rows: Sequence, columns: List[str], type_codes: Optional[List] = None) -> list:
+    """
+    Une colonne typée par colonne du résultat : tableau Arrow pour les types connus
+    (entiers, flottants, chaînes, dates...), tableau object sinon (Decimal, inconnus).
+    """
+    type_codes = type_codes or [None] * len(columns)
+    matrix = _to_object_matrix(rows, len(columns))
+    result = []
+    for i, type_code in enumerate(type_codes):
+        values = matrix[:, i]
+        arrow_type = _arrow_type(type_code)
+        if arrow_type is None:
+            result.append(values)
+            continue
+        try:
+            result.append(pa.array(values, type=arrow_type, from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            result.append(values)  # Type annoncé incorrect : colonne laissée en object
+    return result
+
+
+def build_arrow_chunk(rows: Sequence, columns: List[str], type_codes: Optional[List] = None) -> pd.DataFrame:
+    """Lot construit via Arrow : colonnes numériques/dates typées, chaînes Arrow."""
+    data = {}
+    for i, column in enumerate(build_arrow_columns(rows, columns, type_codes)):
+        if isinstance(column, np.ndarray):
+            data[i] = column
+        else:
+            data[i] = column.to_pandas(types_mapper=_arrow_types_mapper)
+    df = pd.DataFrame(data, copy=False)
+    df.columns = columns  # Affectation après coup : tolère les noms de colonnes en double
+    return df
+
+
+def build_chunk(rows: Sequence, columns: List[str], type_codes: Optional[List] = None,
+                builder: Optional[str] = None) -> pd.DataFrame:
+    """Construit le DataFrame d'un lot selon RESULT_BUILDER (repli sur pandas sans pyarrow)."""
+    builder = (builder or RESULT_BUILDER).lower()
+    if builder == "arrow" and pa is not None:
+        return build_arrow_chunk(rows, columns, type_codes)
+    return build_pandas_chunk(rows, columns)
@@ -0,0 +1,115 @@
+import os
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# ==============================
+# Configuration
+# ==============================
+RESULT_COMPACTION = os.getenv("RESULT_COMPACTION", "1") == "1"                 # Compacter les résultats après lecture
+CATEGORY_MAX_RATIO = float(os.getenv("CATEGORY_MAX_RATIO", "0.5"))           # Valeurs distinctes / lignes max pour une catégorie
+CATEGORY_MIN_ROWS = 100                                                       # En dessous, une catégorie ne fait rien gagner
+
+_INT64_MIN, _INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+
+
+# ==============================
+# Mesure
+# ==============================
+def memory_bytes(df: pd.DataFrame) -> int:
+    """Empreinte mémoire réelle (chaînes et objets compris)."""
+    return int(df.memory_usage(deep=True).sum())
+
+# ==============================
+# Conversions par colonne
+# ==============================
+def _compact_decimal(values: pd.Series) -> pd.Series:
+    """
+    Decimal → entier si toutes les valeurs sont entières, sinon float64 si chaque
+    valeur se relit à l'identique depuis le float ; colonne inchangée sinon.
+    """
+    present = values.dropna()
+    if all(d == d.to_integral_value() and _INT64_MIN <= d <= _INT64_MAX for d in present):
+        if present.size == values.size:
+            return _downcast_integer(pd.Series([int(d) for d in values], index=values.index, dtype="int64"))
+        return pd.Series([None if pd.isna(d) else int(d) for d in values], index=values.index, dtype="Int64")
+    if all(Decimal(repr(float(d))) == d for d in present):
+        return values.astype("float64")
+    return values
+
+
+def _downcast_integer(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, downcast="integer")
+
+
+def _downcast_float(values: pd.Series) -> pd.Series:
+    """float32 seulement si aucune valeur n'est altérée."""
+    narrowed = values.astype("float32")
+    widened = narrowed.astype("float64")
+    if ((widened == values) | (values.isna() & widened.isna())).all():
+        return narrowed
+    return values
+
+
+def _to_category(values: pd.Series) -> pd.Series:
+    """Chaînes répétitives (pays, statuts...) en catégorie."""
+    if len(values) < CATEGORY_MIN_ROWS:
+        return values
+    if values.nunique(dropna=True) / len(values) > CATEGORY_MAX_RATIO:
+        return values
+    return values.astype("category")
+
+
+def _compact_object(values: pd.Series) -> pd.Series:
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    try:
+        if kind == "decimal":
+            return _compact_decimal(values)
+        if kind in ("date", "datetime", "datetime64"):
+            return pd.to_datetime(values)
+        if kind == "integer":
+            return _downcast_integer(values.astype("Int64"))
+        if kind == "boolean":
+            return values.astype("boolean")
+        if kind == "string":
+            return _to_category(values)
+    except (ValueError, TypeError, ArithmeticError, pd.errors.OutOfBoundsDatetime):
+        pass  # Valeurs hors limites (dates < 1677...) : colonne laissée telle quelle
+    return values
+
+
+def compact_column(values: pd.Series) -> pd.Series:
+    dtype = values.dtype
+    if dtype == object:
+        return _compact_object(values)
+    if isinstance(dtype, pd.StringDtype):
+        return _to_category(values)
+    if pd.api.types.is_bool_dtype(dtype):
+        return values
+    if pd.api.types.is_integer_dtype(dtype):
+        return _downcast_integer(values)
+    if pd.api.types.is_float_dtype(dtype):
+        return _downcast_float(values)
+    return values
+
+# ==============================
+# Compaction d'un résultat
+# ==============================
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Réduit l'empreinte mémoire d'un résultat sans perte : catégories pour les chaînes
+    peu variées, entiers/flottants réduits, Decimal en entier ou float64 quand c'est
+    exact, dates en datetime64. Les tailles avant/après sont dans
+    `df.attrs["memory_before"]` et `df.attrs["memory_after"]` (octets).
+    """
+    attrs = dict(df.attrs)
+    before = memory_bytes(df)
+    if not df.empty:
+        columns = df.columns
+        df = pd.DataFrame({i: compact_column(df.iloc[:, i]) for i in range(len(columns))}, copy=False)
+        df.columns = columns  # Noms réaffectés après coup : tolère les doublons
+    df.attrs.update(attrs)
+    df.attrs["memory_before"] = before
+    df.attrs["memory_after"] = memory_bytes(df)
+    return df
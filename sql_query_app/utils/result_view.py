@@ -0,0 +1,355 @@
+import csv
+import io
+import os
+import time
+from datetime import datetime
+from typing import List, Optional, Union
+
+import pandas as pd
+import streamlit as st
+
+from modules import result_store, watermark_manager
+from utils import query_executor, job_manager
+
+JOB_POLL_INTERVAL = 1.0  # Secondes entre deux rafraîchissements d'un job en cours
+PREVIEW_ROWS = 200       # Lignes affichées des résultats partiels d'une exécution multi-bases
+SPILLED_PREVIEW_ROWS = 10000  # Lignes affichées d'un résultat conservé sur disque
+CSV_DELIMITERS = {"Virgule (,)": ",", "Point-virgule (;)": ";", "Tabulation": "\t", "Barre verticale (|)": "|"}
+
+# ==============================
+# Affichage d'un résultat
+# ==============================
+def render_result(df: Union[pd.DataFrame, result_store.SpilledResult], query_name: str, show_size: bool = False,
+                  job: Optional[job_manager.Job] = None):
+    """
+    Affiche un résultat (tableau, métriques, exports) commun aux pages d'exécution.
+    Les exports sont générés à la demande et mémorisés sur le job quand il est fourni.
+    """
+    watermark = df.attrs.get("watermark")
+    render_reports(df)  # Avant le test du résultat vide : un lot entièrement en erreur n'a aucune ligne
+    if df.empty:
+        if watermark and watermark["incremental"]:
+            st.info(f"🆕 Aucune nouvelle ligne depuis la dernière extraction "
+                    f"({watermark['column']} > {watermark['from']}).")
+        else:
+            st.warning("⚠️ La requête s'est exécutée mais n'a retourné aucun résultat.")
+        return
+
+    spilled = isinstance(df, result_store.SpilledResult)
+    if spilled and not df.available:
+        st.info("Le résultat conservé sur disque a expiré. Relancez la requête.")
+        return
+
+    st.success(f"✅ Requête exécutée avec succès! {len(df)} ligne(s) retournée(s).")
+    if spilled:
+        st.info(f"💽 Résultat volumineux conservé sur disque ({df.size_bytes / (1024 * 1024):.1f} Mo) : "
+                f"aperçu des {min(len(df), SPILLED_PREVIEW_ROWS)} premières lignes, export complet.")
+    if df.attrs.get("truncated"):
+        st.warning(f"⚠️ Résultat tronqué : seules les {len(df)} premières lignes ont été lues (plafond configuré).")
+    if df.attrs.get("from_cache"):
+        st.info("♻️ Résultat servi depuis le cache (requête et paramètres identiques).")
+    if watermark:
+        if watermark["incremental"]:
+            st.info(f"🆕 Nouvelles lignes uniquement : {watermark['column']} > {watermark['from']} "
+                    f"(jusqu'à {watermark['to']}).")
+        else:
+            st.info(f"📚 Historique complet : prochaine extraction incrémentale à partir de "
+                    f"{watermark['column']} > {watermark['to']}.")
+
+    # Affichage des résultats
+    st.dataframe(df.head(SPILLED_PREVIEW_ROWS) if spilled else df, use_container_width=True)
+
+    # Métriques
+    columns = st.columns(3 if show_size else 2)
+    columns[0].metric("Lignes retournées", len(df))
+    columns[1].metric("Colonnes", len(df.columns))
+    if show_size and spilled:
+        columns[2].metric("Taille sur disque", f"{df.size_bytes / 1024:.2f} Ko")
+    elif show_size:
+        before = df.attrs.get("memory_before")
+        after = df.attrs.get("memory_after")
+        if after is None:
+            after = df.memory_usage(deep=True).sum()
+        if before is not None and before != after:
+            # Empreinte après compaction des types, et gain par rapport au résultat brut
+            columns[2].metric("Taille", f"{after / 1024:.2f} Ko",
+                              delta=f"{(after - before) / 1024:.2f} Ko (brut : {before / 1024:.2f} Ko)",
+                              delta_color="inverse")
+        else:
+            columns[2].metric("Taille", f"{after / 1024:.2f} Ko")
+
+    # Options d'export
+    st.subheader("💾 Export des résultats")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename_base = f"{query_name.replace(' ', '_')}_{timestamp}"
+
+    formats = query_executor.get_export_formats()
+    col1, col2 = st.columns(2)
+    fmt = col1.selectbox("Format", formats, key=f"{query_name}_export_format",
+                         format_func=lambda f: query_executor.EXPORT_FORMATS[f]["label"])
+    delimiter = None
+    if fmt.startswith("csv"):
+        delimiter = CSV_DELIMITERS[col2.selectbox("Séparateur", list(CSV_DELIMITERS), key=f"{query_name}_csv_sep")]
+
+    export = query_executor.EXPORT_FORMATS[fmt]
+    ready = job is not None and job.has_export(fmt, delimiter)
+    if not ready:
+        if not st.button(f"⚙️ Préparer le fichier {export['label']}", key=f"{query_name}_export_prepare",
+                         use_container_width=True):
+            return
+        with st.spinner("Génération du fichier..."):
+            path = job.get_export(fmt, delimiter) if job is not None else \
+                query_executor.export_result_file(df, fmt, delimiter=delimiter)
+    else:
+        path = job.get_export(fmt, delimiter)  # Déjà généré : réutilisé à chaque rerun
+
+    # Le fichier est passé ouvert : le contenu n'est pas recopié dans une chaîne d'octets
+    # intermédiaire avant d'être remis à Streamlit.
+    try:
+        with open(path, "rb") as data:
+            st.download_button(
+                label=f"💾 Télécharger en {export['label']} ({format_size(os.path.getsize(path))})",
+                data=data,
+                file_name=f"{filename_base}.{export['extension']}",
+                mime=export["mime"],
+                use_container_width=True
+            )
+    finally:
+        if job is None:  # Sans job, personne d'autre ne supprimera le fichier
+            os.remove(path)
+
+
+def render_reports(df: pd.DataFrame):
+    """Erreurs par ligne d'un lot et compte rendu par base d'une exécution multi-bases."""
+    batch_errors = df.attrs.get("batch_errors")
+    if batch_errors:
+        st.warning(f"⚠️ {len(batch_errors)} exécution(s) du lot en erreur sur {df.attrs.get('batch_size')}.")
+        with st.expander("Détail des erreurs du lot"):
+            st.dataframe(pd.DataFrame(batch_errors, columns=["Ligne", "Erreur"]), use_container_width=True)
+
+    fanout_report = df.attrs.get("fanout_report")
+    if fanout_report:
+        failed = [r for r in fanout_report if r["Statut"] == "error"]
+        if failed:
+            st.warning(f"⚠️ {len(failed)} base(s) en erreur sur {len(fanout_report)}.")
+        with st.expander("📡 Détail par base de données", expanded=bool(failed)):
+            st.dataframe(pd.DataFrame(fanout_report), use_container_width=True)
+
+
+def format_size(size: int) -> str:
+    """Taille lisible d'un fichier : Ko jusqu'à 1 Mo, Mo au-delà."""
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} Ko"
+    return f"{size / (1024 * 1024):.1f} Mo"
+
+# ==============================
+# Suivi d'une exécution en arrière-plan
+# ==============================
+def submit_job(session_key: str, query: dict, params: dict, **options):
+    """Lance la requête dans le pool de jobs et mémorise le job dans la session."""
+    manager = job_manager.get_manager()
+    previous = st.session_state.get(session_key)
+    if previous:
+        manager.forget(previous)  # Un seul job par page : l'ancien résultat est libéré
+    st.session_state.pop(f"{session_key}_browser", None)
+    username = st.session_state.get("username", "unknown")
+    if options.get("runner") is None:
+        options["spill_owner"] = query_executor.current_session_id()  # Gros résultats sur disque
+    st.session_state[session_key] = manager.submit(query, params, username, **options)
+    st.session_state[f"{session_key}_name"] = query["name"]
+
+
+def render_job(session_key: str, show_size: bool = False):
+    """Affiche l'état du job de la session : progression, annulation puis résultat."""
+    if f"{session_key}_browser" in st.session_state:
+        render_browser(session_key)
+        return
+    job_id = st.session_state.get(session_key)
+    if not job_id:
+        return
+
+    manager = job_manager.get_manager()
+    job = manager.get(job_id)
+    if job is None:
+        st.info("Le résultat de la dernière exécution a expiré. Relancez la requête.")
+        st.session_state.pop(session_key, None)
+        return
+
+    if not job.is_finished:
+        status_label = "En attente d'un worker..." if job.status == job_manager.PENDING else "Exécution en cours..."
+        col1, col2, col3 = st.columns([2, 2, 1])
+        col1.metric("Lignes lues", job.rows_fetched)
+        col2.metric("Temps écoulé", f"{job.elapsed:.1f} s")
+        if job.batch_progress:
+            done, total = job.batch_progress
+            st.progress(done / total if total else 0.0, text=f"Avancement : {done} / {total} exécution(s)")
+        if col3.button("⏹️ Annuler", key=f"{session_key}_cancel", use_container_width=True):
+            manager.cancel(job_id)
+        st.info(f"⏳ {status_label}")
+        if job.partial_frames:
+            st.caption("Aperçu des résultats déjà reçus")
+            st.dataframe(pd.concat(job.partial_frames, ignore_index=True).head(PREVIEW_ROWS),
+                         use_container_width=True)
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+    if job.status == job_manager.CANCELLED:
+        st.warning(f"⏹️ Exécution annulée après {job.elapsed:.1f} s ({job.rows_fetched} ligne(s) lue(s)).")
+    elif job.status == job_manager.ERROR:
+        st.error(job.error)
+        st.error("❌ Erreur lors de l'exécution de la requête. Veuillez vérifier les paramètres et réessayer.")
+    else:
+        st.caption(f"⏱️ Exécutée en {job.elapsed:.2f} s")
+        render_result(job.result, st.session_state.get(f"{session_key}_name", "resultat"), show_size=show_size,
+                      job=job)
+        # Extraction incrémentale : le point de reprise n'avance qu'une fois le résultat affiché
+        if not (isinstance(job.result, result_store.SpilledResult) and not job.result.available):
+            query_executor.commit_watermark(job.result, job.username)
+
+# ==============================
+# Extraction incrémentale
+# ==============================
+WATERMARK_DELTA = "🆕 Nouvelles lignes depuis ma dernière extraction"
+WATERMARK_FULL = "📚 Historique complet"
+
+
+def render_watermark_choice(session_key: str, query: dict) -> dict:
+    """
+    Choix delta / complet pour une requête déclarant une colonne de reprise.
+    Retourne les options à passer à submit_job (vide pour une requête classique).
+    """
+    column = (query.get("watermark_column") or "").strip()
+    if not column or query.get("id") is None:
+        return {}
+    scope = watermark_manager.user_scope(st.session_state.get("username", "unknown"))
+    current = watermark_manager.get_watermark(query["id"], scope, column)
+    if current is None:
+        st.caption(f"🆕 Extraction incrémentale sur **{column}** : aucune extraction précédente, "
+                   f"la première exécution lit tout l'historique.")
+        return {"watermark_scope": scope}
+    mode = st.radio("Lignes à extraire", [WATERMARK_DELTA, WATERMARK_FULL], key=f"{session_key}_watermark",
+                    horizontal=True)
+    st.caption(f"Dernier point de reprise : {column} = {current}")
+    return {"watermark_scope": scope, "full_refresh": mode == WATERMARK_FULL}
+
+# ==============================
+# Navigation page par page
+# ==============================
+def start_browser(session_key: str, query: dict, params: dict):
+    """Ouvre la navigation paginée à la place d'une exécution complète."""
+    previous = st.session_state.pop(session_key, None)
+    if previous:
+        job_manager.get_manager().forget(previous)
+    username = st.session_state.get("username", "unknown")
+    try:
+        browser = query_executor.open_browser(query, params, username)
+        page = browser.fetch_page(0)
+    except query_executor.QueryExecutionError as e:
+        st.error(str(e))
+        return
+    st.session_state[f"{session_key}_browser"] = browser
+    st.session_state[f"{session_key}_page"] = page
+    st.session_state[f"{session_key}_name"] = query["name"]
+
+
+def render_browser(session_key: str):
+    """Page courante, boutons précédent/suivant ; chaque clic lit une seule page."""
+    browser = st.session_state[f"{session_key}_browser"]
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    move = None
+    if col1.button("◀️ Page précédente", key=f"{session_key}_prev", disabled=browser.page == 0,
+                   use_container_width=True):
+        move = browser.page - 1
+    if col3.button("Page suivante ▶️", key=f"{session_key}_next", disabled=not browser.has_next,
+                   use_container_width=True):
+        move = browser.page + 1
+    if move is not None:
+        try:
+            st.session_state[f"{session_key}_page"] = browser.fetch_page(move)
+            st.rerun()  # Boutons réaffichés avec l'état de la nouvelle page
+        except query_executor.QueryExecutionError as e:
+            st.error(str(e))
+
+    page = st.session_state[f"{session_key}_page"]
+    first = browser.page * browser.page_size
+    mode = "par clé" if browser.mode == query_executor.BROWSE_KEYSET else "OFFSET/FETCH"
+    col2.markdown(f"**Page {browser.page + 1}** : lignes {first + 1 if len(page) else 0} à {first + len(page)}")
+    st.caption(f"🔎 Navigation paginée ({mode}) : seule la page affichée est lue sur le serveur. "
+               f"Exécutez la requête pour obtenir le résultat complet et l'exporter.")
+    st.dataframe(page, use_container_width=True)
+
+# ==============================
+# Mode lot
+# ==============================
+def parse_batch_input(text: str, uploaded_file, param_list: List[str]) -> List[dict]:
+    """
+    Lignes de paramètres d'un lot : fichier CSV avec une colonne par paramètre,
+    ou texte collé avec une ligne par exécution (valeurs dans l'ordre des paramètres,
+    séparées par ';' ou ','). Lève ValueError si le format est incorrect.
+    """
+    if uploaded_file is not None:
+        content = uploaded_file.getvalue().decode("utf-8-sig")
+        header = content.splitlines()[0] if content.strip() else ""
+        reader = csv.DictReader(io.StringIO(content), delimiter=";" if ";" in header else ",")
+        fields = [f.strip() for f in reader.fieldnames or []]
+        missing = [p for p in param_list if p not in fields]
+        if missing:
+            raise ValueError(f"Colonne(s) manquante(s) dans le fichier : {', '.join(missing)}")
+        reader.fieldnames = fields
+        return [{p: (row[p] or "").strip() for p in param_list} for row in reader]
+
+    lines = [line for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        return []
+    delimiter = ";" if ";" in lines[0] or len(param_list) == 1 else ","
+    rows = []
+    for number, values in enumerate(csv.reader(io.StringIO("\n".join(lines)), delimiter=delimiter), start=1):
+        values = [v.strip() for v in values]
+        if len(values) != len(param_list):
+            raise ValueError(f"Ligne {number} : {len(values)} valeur(s) pour {len(param_list)} paramètre(s)")
+        rows.append(dict(zip(param_list, values)))
+    return rows
+
+
+def render_batch_form(session_key: str, query: dict, param_list: List[str]):
+    """Formulaire du mode lot : exécute la requête pour chaque ligne de paramètres."""
+    if not param_list:
+        return
+    with st.expander("📦 Mode lot : exécuter pour plusieurs jeux de paramètres"):
+        st.caption(f"Une ligne par exécution, valeurs dans l'ordre : {', '.join(param_list)} "
+                   f"(séparateur ';' ou ','), ou un fichier CSV avec ces colonnes.")
+        text = st.text_area("Valeurs", key=f"{session_key}_batch_text", height=120)
+        uploaded_file = st.file_uploader("Fichier CSV", type=["csv", "txt"], key=f"{session_key}_batch_file")
+        if st.button("▶️ Exécuter le lot", key=f"{session_key}_batch_run"):
+            try:
+                rows = parse_batch_input(text, uploaded_file, param_list)
+            except ValueError as e:
+                st.error(str(e))
+                return
+            if not rows:
+                st.error("Aucune ligne de paramètres fournie.")
+                return
+            submit_job(session_key, query, rows, runner=query_executor.run_batch)
+
+# ==============================
+# Exécution multi-bases
+# ==============================
+def render_fanout_form(session_key: str, query: dict, params: dict, connection_map: dict,
+                       params_ready: bool = True):
+    """Formulaire multi-bases : la même requête sur plusieurs connexions enregistrées."""
+    with st.expander("📡 Exécution multi-bases : même requête sur plusieurs bases"):
+        selected = st.multiselect(
+            "Bases de données cibles",
+            list(connection_map.keys()),
+            key=f"{session_key}_fanout_dbs",
+            help="Les bases doivent avoir le même schéma que la base associée à la requête."
+        )
+        if st.button("▶️ Exécuter sur les bases sélectionnées", key=f"{session_key}_fanout_run"):
+            if not selected:
+                st.error("Sélectionnez au moins une base de données.")
+            elif not params_ready:
+                st.error("Veuillez renseigner tous les paramètres requis avant d'exécuter la requête.")
+            else:
+                submit_job(session_key, query, params, runner=query_executor.run_fanout,
+                           conn_ids=[connection_map[name] for name in selected])
@@ -0,0 +1,158 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from modules import query_manager, result_store, schedule_manager, watermark_manager
+from modules.logger import log_action
+from utils import query_executor
+
+load_dotenv()
+
+# ==============================
+# Configuration du planificateur
+# ==============================
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"                 # Démarrer le worker avec l'application
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", "2"))          # Extractions planifiées simultanées
+SCHEDULER_POLL_INTERVAL = int(os.getenv("SCHEDULER_POLL_INTERVAL", "30"))     # Période (s) de recherche des échéances
+SCHEDULER_USERNAME = "planificateur"                                           # Utilisateur inscrit dans les logs
+
+
+def output_path(schedule: dict, query: dict, started: datetime) -> str:
+    """Fichier de sortie : <destination>/<requête>_<horodatage>.<extension>."""
+    extension = query_executor.EXPORT_FORMATS[schedule["output_format"]]["extension"]
+    name = re.sub(r"[^\w\-]+", "_", query["name"]).strip("_") or f"requete_{query['id']}"
+    return os.path.join(schedule["destination"], f"{name}_{started.strftime('%Y%m%d_%H%M%S')}.{extension}")
+
+
+def write_atomically(data, path: str, fmt: str):
+    """
+    Écrit dans un fichier temporaire du même dossier puis le renomme : un
+    consommateur ne voit jamais de fichier partiel.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as output:
+            query_executor.write_export(data, output, fmt)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class Scheduler:
+    """
+    Worker en arrière-plan : cherche les échéances atteintes toutes les
+    `poll_interval` secondes et les exécute dans un pool borné.
+    """
+
+    def __init__(self, max_workers=SCHEDULER_MAX_WORKERS, poll_interval=SCHEDULER_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="schedule-run")
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._running = set()  # Planifications en cours : pas de chevauchement d'une même extraction
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.is_running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def tick(self):
+        """Un passage : réserve les échéances atteintes et les soumet au pool."""
+        for schedule in schedule_manager.claim_due_schedules():
+            with self._lock:
+                if schedule["id"] in self._running:
+                    continue  # L'exécution précédente n'est pas terminée : ce créneau est sauté
+                self._running.add(schedule["id"])
+            self._executor.submit(self._run, schedule)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Planificateur : {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def _run(self, schedule: dict):
+        run_id = schedule_manager.start_run(schedule)
+        started = datetime.now()
+        start = time.monotonic()
+        result = None
+        try:
+            query = query_manager.get_query_by_id(schedule["query_id"])
+            if query is None:
+                raise query_executor.QueryExecutionError("Requête introuvable (supprimée ?)")
+            # Résultat sur disque au-delà du seuil : mémoire bornée même pour les gros extraits.
+            # Requête à colonne de reprise : seules les lignes apparues depuis l'exécution précédente.
+            result = query_executor.run_query(query, schedule["parameters"], SCHEDULER_USERNAME,
+                                              use_cache=False, spill_owner=f"schedule-{schedule['id']}",
+                                              watermark_scope=watermark_manager.schedule_scope(schedule["id"]))
+            path = output_path(schedule, query, started)
+            write_atomically(result, path, schedule["output_format"])
+            # Point de reprise avancé seulement une fois le fichier en place
+            query_executor.commit_watermark(result, SCHEDULER_USERNAME)
+            duration = time.monotonic() - start
+            schedule_manager.finish_run(run_id, schedule_manager.RUN_SUCCESS, duration,
+                                        row_count=len(result), file_path=path)
+            log_action(SCHEDULER_USERNAME, schedule["query_id"], "success",
+                       f"Extraction planifiée #{schedule['id']} : {len(result)} ligne(s) écrite(s) "
+                       f"dans {path} en {duration:.1f} s")
+        except Exception as e:
+            duration = time.monotonic() - start
+            schedule_manager.finish_run(run_id, schedule_manager.RUN_ERROR, duration, message=str(e))
+            if not isinstance(e, query_executor.QueryExecutionError):
+                # Les erreurs d'exécution sont déjà journalisées par run_query
+                log_action(SCHEDULER_USERNAME, schedule["query_id"], "error",
+                           f"Extraction planifiée #{schedule['id']} : {str(e)}")
+        finally:
+            if isinstance(result, result_store.SpilledResult):
+                result.release()
+            with self._lock:
+                self._running.discard(schedule["id"])
+
+
+# Planificateur unique du processus
+_scheduler = Scheduler()
+
+
+def get_scheduler() -> Scheduler:
+    return _scheduler
+
+
+def ensure_started():
+    """Démarre le worker s'il est activé (idempotent : appelé à chaque rerun)."""
+    if SCHEDULER_ENABLED:
+        _scheduler.start()
+
+
+if __name__ == "__main__":
+    # Worker autonome, sans interface : python -m utils.scheduler
+    _scheduler.start()
+    try:
+        while _scheduler.is_running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        _scheduler.stop()